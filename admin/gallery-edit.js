@@ -68,6 +68,19 @@ class GalleryAPI {
         return await response.json();
     }
 
+    async deletePhotos(galleryId, photoIds) {
+        const response = await fetch(`${this.baseUrl}/galleries?id=${encodeURIComponent(galleryId)}&action=delete_photos`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ photoIds })
+        });
+        if (!response.ok) {
+            const error = await response.json().catch(() => ({}));
+            throw new Error(error.error || 'Failed to delete photos');
+        }
+        return await response.json();
+    }
+
     async getUploadUrls(galleryId, photosData) {
         try {
             const response = await fetch(`${this.baseUrl}/galleries?id=${galleryId}&action=get_upload_urls`, {
@@ -125,6 +138,7 @@ let currentGalleryYears = [];
 let currentPhotoYears = [];
 let photos = [];
 let originalPhotos = []; // Store original photo data to detect changes
+let selectedPhotoIds = new Set(); // Photos ticked for bulk deletion
 let isFormModified = false; // Track form modification state
 
 // ==================== UTILITY FUNCTIONS ====================
@@ -208,6 +222,18 @@ async function generateThumbnail(file, maxWidth = 2000, quality = 0.4) {
     });
 }
 
+// Compute the sha256 hex digest of a blob (used to skip photos already stored)
+async function computeSha256(blob) {
+    try {
+        const buffer = await blob.arrayBuffer();
+        const digest = await crypto.subtle.digest('SHA-256', buffer);
+        return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+    } catch (error) {
+        console.warn('Could not compute content hash:', error);
+        return null;
+    }
+}
+
 // Upload file to S3 using presigned URL
 async function uploadToS3(presignedUrl, file) {
     try {
@@ -535,6 +561,7 @@ function updatePhotosGrid() {
                 <p><strong>Note:</strong> Photo upload functionality will be added in a future update.</p>
             </div>
         `;
+        updateSelectionDisplay();
         return;
     }
 
@@ -545,7 +572,10 @@ function updatePhotosGrid() {
                 <i class="fas fa-grip-vertical" style="color: #6c757d; font-size: 12px;"></i>
             </div>
             
-            <!-- Sort Order Indicator - positioned at top right -->
+            <!-- Bulk selection checkbox - positioned at top right -->
+            <input type="checkbox" class="photo-select" data-index="${index}" title="Select for deletion" ${selectedPhotoIds.has(photo.photoId || photo.id) ? 'checked' : ''}>
+            
+            <!-- Sort Order Indicator - positioned at bottom right -->
             <div class="sort-order-indicator">
                 #${photo.sortOrder || index + 1}
             </div>
@@ -610,6 +640,23 @@ function updatePhotosGrid() {
         });
     });
 
+    // Bulk selection
+    photosGrid.querySelectorAll('.photo-select').forEach(checkbox => {
+        checkbox.addEventListener('change', (e) => {
+            const photo = photos[parseInt(e.target.getAttribute('data-index'), 10)];
+            if (!photo) return;
+            const photoId = photo.photoId || photo.id;
+            if (e.target.checked) {
+                selectedPhotoIds.add(photoId);
+            } else {
+                selectedPhotoIds.delete(photoId);
+            }
+            e.target.closest('.photo-item-enhanced').classList.toggle('selected', e.target.checked);
+            updateSelectionDisplay();
+        });
+    });
+    updateSelectionDisplay();
+
     // Populate resolution if unknown
     photos.forEach((photo, index) => {
         if (!(photo.width && photo.height)) {
@@ -753,6 +800,9 @@ async function uploadPhotos() {
                 // Generate thumbnail
                 const thumbnailBlob = await generateThumbnail(photo);
                 
+                // Hash the bytes that will be stored so the backend can detect duplicates
+                const contentHash = await computeSha256(webpBlob);
+                
                 // Calculate total size
                 totalSize += webpBlob.size + thumbnailBlob.size;
                 
@@ -760,6 +810,7 @@ async function uploadPhotos() {
                     originalFile: photo,
                     webpBlob: webpBlob,
                     thumbnailBlob: thumbnailBlob,
+                    contentHash: contentHash,
                     filename: photo.name.replace(/\.[^/.]+$/, '.webp'),
                     thumbnailFilename: photo.name.replace(/\.[^/.]+$/, '_thumb.webp')
                 });
@@ -785,7 +836,8 @@ async function uploadPhotos() {
         const photosData = processedPhotos.map(photo => ({
             filename: photo.filename,
             thumbnailFilename: photo.thumbnailFilename,
-            contentType: 'image/webp'
+            contentType: 'image/webp',
+            contentHash: photo.contentHash
         }));
         
         console.log('Getting presigned URLs for', photosData.length, 'photos');
@@ -801,11 +853,19 @@ async function uploadPhotos() {
         }
         
         const uploadedPhotos = [];
+        let duplicateCount = 0;
         
         for (let i = 0; i < processedPhotos.length; i++) {
             const photo = processedPhotos[i];
             const urls = uploadUrls.upload_urls[i];
             
+            // Already stored in this gallery - nothing to upload
+            if (urls.duplicate) {
+                console.log(`Skipping ${photo.filename}: already in gallery as ${urls.photo_id}`);
+                duplicateCount++;
+                continue;
+            }
+            
             try {
                 // Update progress
                 const progress = ((i + 0.7) / processedPhotos.length) * 100;
@@ -820,11 +880,13 @@ async function uploadPhotos() {
                 
                 // Prepare photo data for DynamoDB
                 uploadedPhotos.push({
+                    photoId: urls.photo_id,
                     filename: photo.filename,
                     thumbnailFilename: photo.thumbnailFilename,
                     s3Key: urls.original_key,
                     thumbnailKey: urls.thumbnail_key,
                     contentType: 'image/webp',
+                    contentHash: photo.contentHash,
                     fileSize: photo.webpBlob.size,
                     thumbnailSize: photo.thumbnailBlob.size,
                     width: photo.webpBlob.width || photo.originalFile.naturalWidth,
@@ -840,6 +902,11 @@ async function uploadPhotos() {
         }
         
         if (uploadedPhotos.length === 0) {
+            if (duplicateCount > 0) {
+                showMessage(`All ${duplicateCount} photo${duplicateCount > 1 ? 's are' : ' is'} already in this gallery`, 'info');
+                closeUploadModal();
+                return;
+            }
             throw new Error('No photos were uploaded successfully');
         }
         
@@ -955,6 +1022,64 @@ async function performDeletePhoto(photoIndex) {
     showMessage('Photo deleted successfully', 'success');
 }
 
+// Show the bulk delete button with the number of selected photos
+function updateSelectionDisplay() {
+    // Forget selections of photos that are no longer in the gallery
+    const present = new Set(photos.map(photo => photo.photoId || photo.id));
+    selectedPhotoIds.forEach(photoId => { if (!present.has(photoId)) selectedPhotoIds.delete(photoId); });
+
+    document.querySelectorAll('.photo-select').forEach(checkbox => {
+        checkbox.closest('.photo-item-enhanced').classList.toggle('selected', checkbox.checked);
+    });
+    const button = document.getElementById('deleteSelectedBtn');
+    const count = document.getElementById('selectedPhotoCount');
+    if (count) count.textContent = selectedPhotoIds.size;
+    if (button) button.style.display = selectedPhotoIds.size ? 'inline-block' : 'none';
+}
+
+// Delete every selected photo with one request
+function deleteSelectedPhotosConfirm() {
+    if (!selectedPhotoIds.size) return;
+
+    const confirmDelete = confirm(
+        `Are you sure you want to delete ${selectedPhotoIds.size} selected photo(s)?\n\n` +
+        `This action cannot be undone!`
+    );
+
+    if (confirmDelete) {
+        performDeleteSelectedPhotos().catch(err => {
+            console.error('Delete photos error:', err);
+            showMessage('Delete failed: ' + err.message, 'error');
+        });
+    }
+}
+
+async function performDeleteSelectedPhotos() {
+    if (!currentGallery || !selectedPhotoIds.size) return;
+
+    const photoIds = Array.from(selectedPhotoIds);
+    showMessage(`Deleting ${photoIds.length} photos...`, 'info');
+    const result = await galleryAPI.deletePhotos(currentGallery.id || currentGallery.galleryId, photoIds);
+
+    // Photos the server no longer has are removed locally; failed ones stay selected for a retry
+    const removed = new Set([...(result.deleted || []), ...(result.notFound || [])]);
+    photos = photos.filter(photo => !removed.has(photo.photoId || photo.id));
+    removed.forEach(photoId => selectedPhotoIds.delete(photoId));
+    if (result.coverPhotoURL !== undefined) {
+        currentGallery.coverPhotoURL = result.coverPhotoURL;
+    }
+    updatePhotosGrid();
+    updateGalleryInfo();
+    updatePhotoCountDisplay();
+
+    const failed = result.failed || [];
+    if (failed.length) {
+        showMessage(`${result.deleted.length} photos deleted, ${failed.length} could not be deleted`, 'error');
+    } else {
+        showMessage(`${result.deleted.length} photos deleted successfully`, 'success');
+    }
+}
+
 // ==================== YEAR MANAGEMENT ====================
 
 // Add year functionality
@@ -1394,6 +1519,7 @@ window.handleFileSelect = handleFileSelect;
 window.uploadPhotos = uploadPhotos;
 window.editPhotoInfo = editPhotoInfo;
 window.deletePhotoConfirm = deletePhotoConfirm;
+window.deleteSelectedPhotosConfirm = deleteSelectedPhotosConfirm;
 window.selectCoverPhoto = selectCoverPhoto;
 window.setCoverPhoto = setCoverPhoto;
 window.closeCoverPhotoModal = closeCoverPhotoModal;
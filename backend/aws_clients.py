@@ -0,0 +1,123 @@
+"""
+Shared AWS clients and resources with an explicit botocore configuration.
+
+boto3's defaults give each client a pool of 10 connections, legacy retries
+and 60 second connect and read timeouts. Once handlers fan out over worker
+pools (reconcile, move, delete) the pool is the bottleneck: threads queue
+for a connection and urllib3 logs "Connection pool is full, discarding
+connection" while the next request opens a new TLS session. Clients from
+here are built once per container on one boto3 session, sized for the
+largest worker pool, keep their TCP connections alive, retry in adaptive
+mode (which also rate-limits the whole client after throttling, across every
+thread sharing it) and fail fast instead of hanging on a stuck connection.
+
+Botocore clients are thread-safe and shared as they are. Resources are not,
+so thread_resource() gives each thread its own resource object over the same
+shared client and connection pool.
+
+Profiles set timeouts and retries per kind of operation:
+    default   API requests: short timeouts, so a request fails well inside API Gateway's 29 s
+    bulk      background copies, deletes and scans: long reads and more attempts
+    async     fire-and-forget Lambda invokes: fail fast, the caller has a fallback
+
+Environment:
+    AWS_MAX_POOL_CONNECTIONS  connections per client (default: twice the largest worker pool, at least 10)
+    AWS_RETRY_MODE            adaptive (default) | standard | legacy
+    AWS_MAX_ATTEMPTS          attempts per call, first one included, for the default profile (default 4)
+    AWS_CONNECT_TIMEOUT       seconds, default profile (default 2)
+    AWS_READ_TIMEOUT          seconds, default profile (default 10)
+"""
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+# Worker pools of the gallery manager (see lambda.py); the pool has room for the largest one twice
+# over, for nested work such as a multipart copy's part threads
+_WORKER_POOLS = (int(os.getenv('RECONCILE_WORKERS', '8')), int(os.getenv('MOVE_WORKERS', '16')),
+                 int(os.getenv('DELETE_WORKERS', '4')))
+MAX_POOL_CONNECTIONS = int(os.getenv('AWS_MAX_POOL_CONNECTIONS', '0')) or max(10, 2 * max(_WORKER_POOLS))
+RETRY_MODE = os.getenv('AWS_RETRY_MODE', 'adaptive')
+
+# profile -> (connect timeout s, read timeout s, attempts per call including the first)
+PROFILES = {
+    'default': (float(os.getenv('AWS_CONNECT_TIMEOUT', '2')), float(os.getenv('AWS_READ_TIMEOUT', '10')),
+                int(os.getenv('AWS_MAX_ATTEMPTS', '4'))),
+    'bulk': (5.0, 120.0, 8),
+    'async': (1.0, 5.0, 2),
+}
+
+_lock = threading.Lock()
+_session = None
+_clients = {}
+_resources = {}
+
+
+def config(profile='default'):
+    """botocore Config of a profile"""
+    connect_timeout, read_timeout, max_attempts = PROFILES[profile]
+    return Config(
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        tcp_keepalive=True,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        retries={'mode': RETRY_MODE, 'total_max_attempts': max_attempts},
+    )
+
+
+def session():
+    """The boto3 session every shared client comes from, created on first use"""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = boto3.session.Session()
+    return _session
+
+
+def client(service_name, profile='default'):
+    """The shared client of a service and profile"""
+    key = (service_name, profile)
+    found = _clients.get(key)
+    if found is not None:
+        return found
+    current = session()
+    with _lock:
+        if key not in _clients:
+            _clients[key] = current.client(service_name, config=config(profile))
+        return _clients[key]
+
+
+def resource(service_name, profile='default'):
+    """The shared resource of a service and profile, bound to the shared client. Use from one thread."""
+    key = (service_name, profile)
+    found = _resources.get(key)
+    if found is not None:
+        return found
+    current = session()
+    with _lock:
+        if key not in _resources:
+            built = current.resource(service_name, config=config(profile))
+            # One connection pool per service and profile, whichever of client() or resource() came first
+            if key in _clients:
+                built.meta.client = _clients[key]
+            else:
+                _clients[key] = built.meta.client
+            _resources[key] = built
+        return _resources[key]
+
+
+def thread_resource(service_name, profile='default'):
+    """A new resource object for the calling thread, over the shared client"""
+    shared = resource(service_name, profile)
+    return type(shared)(client=shared.meta.client)
+
+
+def reset():
+    """Forget every shared client, e.g. after the environment or fakes changed"""
+    global _session
+    with _lock:
+        _session = None
+        _clients.clear()
+        _resources.clear()
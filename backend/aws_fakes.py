@@ -0,0 +1,976 @@
+"""
+In-memory fakes of the S3, DynamoDB and Lambda APIs the gallery backend uses.
+
+install(fake) hooks every botocore session created afterwards, so all the
+clients and resources the handlers build (the module-level Lazy clients, the
+per-thread DynamoDB resources, the Lambda client) are answered from memory at
+the before-call event instead of being sent. Parameter validation, the
+DynamoDB resource layer, paginators and the request_metrics / call_tracing
+hooks all still run, so call counts and capacity are those of real requests.
+
+Modelled:
+    DynamoDB  GetItem, PutItem, UpdateItem, DeleteItem, Query, Scan, BatchGetItem and
+              BatchWriteItem with key-condition, filter, condition, update and projection
+              expressions, global secondary indexes, 1 MB pages and ConsumedCapacity
+    S3        ListObjectsV2 (1000 keys a page), GetObject (with Range), HeadObject,
+              PutObject, CopyObject, DeleteObject, DeleteObjects
+    Lambda    Invoke (recorded, not run)
+
+Latency is injected per call, in milliseconds, by service or service.Operation:
+
+    FakeAWS(latency={'dynamodb': 4, 's3': 15, 's3.PutObject': 40})
+
+Used by handler_benchmark.py; nothing here is imported by the Lambda functions.
+"""
+import hashlib
+import io
+import math
+import re
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from decimal import Decimal
+from urllib.parse import unquote
+
+from boto3.dynamodb.types import Binary, TypeDeserializer, TypeSerializer
+from botocore import handlers
+from botocore.awsrequest import AWSResponse
+from botocore.response import StreamingBody
+
+PAGE_BYTES = 1024 * 1024
+S3_MAX_KEYS = 1000
+BATCH_GET_LIMIT = 100
+BATCH_WRITE_LIMIT = 25
+
+_PARAMS_KEY = 'aws_fakes_params'
+_MISSING = object()
+_deserializer = TypeDeserializer()
+_serializer = TypeSerializer()
+
+
+class FakeError(Exception):
+    """An AWS error response: code, message and HTTP status"""
+
+    def __init__(self, code, message='', status=400):
+        super().__init__(f"{code}: {message}")
+        self.code = code
+        self.message = message
+        self.status = status
+
+
+def deserialize_item(item):
+    return {name: _deserializer.deserialize(value) for name, value in item.items()}
+
+
+def serialize_item(item):
+    return {name: _serializer.serialize(value) for name, value in item.items()}
+
+
+def _value_size(value):
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, Binary):
+        return len(value.value)
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float, Decimal)):
+        return min(21, len(str(value)))
+    if isinstance(value, dict):
+        return 3 + sum(len(k) + 1 + _value_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return 3 + sum(1 + _value_size(v) for v in value)
+    return len(str(value))
+
+
+def item_size(item):
+    """Approximate DynamoDB item size in bytes (attribute names plus values)"""
+    return sum(len(name) + _value_size(value) for name, value in item.items())
+
+
+def _sort_value(value):
+    if value is _MISSING or value is None:
+        return (0, '')
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (bytes, bytearray)):
+        return (3, bytes(value))
+    return (2, str(value))
+
+
+# ---------------------------------------------------------------- expressions
+
+_TOKEN_RE = re.compile(r'\s*(<>|<=|>=|[=<>(),+\-]|#\w+|:\w+|[A-Za-z_][\w.]*)')
+_COMPARATORS = ('=', '<>', '<', '<=', '>', '>=')
+
+
+def _tokenize(expr):
+    tokens, pos, expr = [], 0, expr.strip()
+    while pos < len(expr):
+        match = _TOKEN_RE.match(expr, pos)
+        if not match:
+            raise FakeError('ValidationException', f"Invalid expression near '{expr[pos:]}'")
+        tokens.append(match.group(1))
+        pos = match.end()
+    return tokens
+
+
+def _compare(left, op, right):
+    if left is _MISSING or right is _MISSING:
+        return op == '<>' and (left is _MISSING) != (right is _MISSING)
+    try:
+        if op == '=':
+            return left == right
+        if op == '<>':
+            return left != right
+        if op == '<':
+            return left < right
+        if op == '<=':
+            return left <= right
+        if op == '>':
+            return left > right
+        return left >= right
+    except TypeError:
+        return False
+
+
+class _Parser:
+    """Recursive-descent parser turning DynamoDB expressions into functions of an item"""
+
+    def __init__(self, expr, names=None, values=None):
+        self.tokens = _tokenize(expr)
+        self.i = 0
+        self.names = names or {}
+        self.values = values or {}
+
+    def peek(self, offset=0):
+        index = self.i + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def take(self, expected=None):
+        token = self.peek()
+        if token is None or (expected is not None and token.upper() != expected.upper()):
+            raise FakeError('ValidationException', f"Expected {expected or 'a token'}, got {token!r}")
+        self.i += 1
+        return token
+
+    def at_keyword(self, *keywords):
+        token = self.peek()
+        return token is not None and token.upper() in keywords
+
+    def done(self):
+        return self.i >= len(self.tokens)
+
+    def path(self):
+        token = self.take()
+        if token.startswith('#'):
+            if token not in self.names:
+                raise FakeError('ValidationException', f"Undefined attribute name {token}")
+            return self.names[token]
+        return token
+
+    def operand(self):
+        token = self.peek()
+        if token is not None and token.startswith(':'):
+            self.take()
+            if token not in self.values:
+                raise FakeError('ValidationException', f"Undefined attribute value {token}")
+            value = self.values[token]
+            return lambda item: value
+        if token is not None and token.lower() == 'size' and self.peek(1) == '(':
+            self.take()
+            self.take('(')
+            inner = self.operand()
+            self.take(')')
+
+            def size(item):
+                value = inner(item)
+                return _MISSING if value is _MISSING else Decimal(len(value))
+            return size
+        name = self.path()
+        return lambda item: item.get(name, _MISSING)
+
+    # Conditions: OR < AND < NOT < comparison / function
+    def condition(self):
+        left = self.conjunction()
+        while self.at_keyword('OR'):
+            self.take()
+            right = self.conjunction()
+            left = (lambda a, b: lambda item: a(item) or b(item))(left, right)
+        return left
+
+    def conjunction(self):
+        left = self.negation()
+        while self.at_keyword('AND'):
+            self.take()
+            right = self.negation()
+            left = (lambda a, b: lambda item: a(item) and b(item))(left, right)
+        return left
+
+    def negation(self):
+        if self.at_keyword('NOT'):
+            self.take()
+            inner = self.negation()
+            return lambda item: not inner(item)
+        return self.predicate()
+
+    def predicate(self):
+        token = self.peek()
+        if token == '(':
+            self.take()
+            inner = self.condition()
+            self.take(')')
+            return inner
+        function = (token or '').lower()
+        if function in ('attribute_exists', 'attribute_not_exists', 'begins_with', 'contains') and self.peek(1) == '(':
+            self.take()
+            self.take('(')
+            args = [self.operand()]
+            while self.peek() == ',':
+                self.take()
+                args.append(self.operand())
+            self.take(')')
+            if function == 'attribute_exists':
+                return lambda item: args[0](item) is not _MISSING
+            if function == 'attribute_not_exists':
+                return lambda item: args[0](item) is _MISSING
+            if function == 'begins_with':
+                return lambda item: isinstance(args[0](item), str) and args[0](item).startswith(args[1](item))
+
+            def contains(item):
+                value, member = args[0](item), args[1](item)
+                try:
+                    return value is not _MISSING and member in value
+                except TypeError:
+                    return False
+            return contains
+
+        left = self.operand()
+        if self.at_keyword('BETWEEN'):
+            self.take()
+            low = self.operand()
+            self.take('AND')
+            high = self.operand()
+            return lambda item: _compare(left(item), '>=', low(item)) and _compare(left(item), '<=', high(item))
+        if self.at_keyword('IN'):
+            self.take()
+            self.take('(')
+            options = [self.operand()]
+            while self.peek() == ',':
+                self.take()
+                options.append(self.operand())
+            self.take(')')
+            return lambda item: any(_compare(left(item), '=', option(item)) for option in options)
+        op = self.take()
+        if op not in _COMPARATORS:
+            raise FakeError('ValidationException', f"Unsupported comparator {op!r}")
+        right = self.operand()
+        return lambda item: _compare(left(item), op, right(item))
+
+    # Update expressions
+    def update_value(self):
+        left = self.update_operand()
+        if self.peek() in ('+', '-'):
+            op = self.take()
+            right = self.update_operand()
+            if op == '+':
+                return lambda item: left(item) + right(item)
+            return lambda item: left(item) - right(item)
+        return left
+
+    def update_operand(self):
+        function = (self.peek() or '').lower()
+        if function == 'if_not_exists' and self.peek(1) == '(':
+            self.take()
+            self.take('(')
+            name = self.path()
+            self.take(',')
+            default = self.update_value()
+            self.take(')')
+            return lambda item: item[name] if name in item else default(item)
+        if function == 'list_append' and self.peek(1) == '(':
+            self.take()
+            self.take('(')
+            first = self.update_value()
+            self.take(',')
+            second = self.update_value()
+            self.take(')')
+            return lambda item: list(first(item)) + list(second(item))
+        operand = self.operand()
+
+        def value(item):
+            result = operand(item)
+            if result is _MISSING:
+                raise FakeError('ValidationException',
+                                'The provided expression refers to an attribute that does not exist in the item')
+            return result
+        return value
+
+    def update_actions(self):
+        """[(action, attribute, value function or None)] of an UpdateExpression"""
+        actions = []
+        while not self.done():
+            clause = self.take().upper()
+            while True:
+                if clause == 'SET':
+                    name = self.path()
+                    self.take('=')
+                    actions.append(('SET', name, self.update_value()))
+                elif clause == 'REMOVE':
+                    actions.append(('REMOVE', self.path(), None))
+                elif clause in ('ADD', 'DELETE'):
+                    name = self.path()
+                    actions.append((clause, name, self.operand()))
+                else:
+                    raise FakeError('ValidationException', f"Unknown update clause {clause}")
+                if self.peek() != ',':
+                    break
+                self.take()
+        return actions
+
+
+def _values(params):
+    return {name: _deserializer.deserialize(value)
+            for name, value in (params.get('ExpressionAttributeValues') or {}).items()}
+
+
+def compile_condition(expr, params):
+    """Function item -> bool of a condition, filter or key-condition expression"""
+    if not expr:
+        return None
+    parser = _Parser(expr, params.get('ExpressionAttributeNames'), _values(params))
+    condition = parser.condition()
+    if not parser.done():
+        raise FakeError('ValidationException', f"Unexpected token {parser.peek()!r} in {expr!r}")
+    return condition
+
+
+def apply_update(item, expr, params):
+    """New item after an UpdateExpression, and the names of the attributes it set"""
+    actions = _Parser(expr, params.get('ExpressionAttributeNames'), _values(params)).update_actions()
+    updated = dict(item)
+    changed = []
+    # Every operand is evaluated against the item as it was before the update
+    for action, name, value in actions:
+        if action == 'SET':
+            updated[name] = value(item)
+        elif action == 'REMOVE':
+            updated.pop(name, None)
+        elif action == 'ADD':
+            amount = value(item)
+            current = item.get(name)
+            if current is None:
+                updated[name] = amount
+            elif isinstance(current, set):
+                updated[name] = current | amount
+            else:
+                updated[name] = current + amount
+        elif action == 'DELETE':
+            current = item.get(name)
+            if isinstance(current, set):
+                remaining = current - value(item)
+                if remaining:
+                    updated[name] = remaining
+                else:
+                    updated.pop(name, None)
+        changed.append(name)
+    return updated, changed
+
+
+def project(item, params):
+    expr = params.get('ProjectionExpression')
+    if not expr:
+        return item
+    names = params.get('ExpressionAttributeNames') or {}
+    wanted = [names.get(part.strip(), part.strip()) for part in expr.split(',')]
+    return {name: item[name] for name in wanted if name in item}
+
+
+# ---------------------------------------------------------------- DynamoDB
+
+class FakeTable:
+    """Items of one table, partitioned by the table key and by each global secondary index"""
+
+    def __init__(self, name, hash_key, range_key=None, indexes=None):
+        self.name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        # index name -> (hash key, range key or None, 'ALL' | 'KEYS_ONLY')
+        self.indexes = dict(indexes or {})
+        self.items = {}
+        self._partitions = {}
+        self._lock = threading.RLock()
+
+    def key_attributes(self, index=None):
+        if index is None:
+            return self.hash_key, self.range_key
+        if index not in self.indexes:
+            raise FakeError('ValidationException', f"The table does not have the specified index: {index}")
+        hash_key, range_key, _ = self.indexes[index]
+        return hash_key, range_key
+
+    def primary_key(self, item):
+        try:
+            return (item[self.hash_key], item[self.range_key] if self.range_key else None)
+        except KeyError:
+            raise FakeError('ValidationException', 'The provided key element does not match the schema')
+
+    def key_item(self, item, index=None):
+        """The key attributes of item for the table and, for an index, the index too"""
+        names = [self.hash_key] + ([self.range_key] if self.range_key else [])
+        if index is not None:
+            names += [name for name in self.key_attributes(index) if name]
+        return {name: item[name] for name in names if name in item}
+
+    def get(self, key):
+        return self.items.get(self.primary_key(key))
+
+    def put(self, item):
+        with self._lock:
+            pk = self.primary_key(item)
+            old = self.items.get(pk)
+            if old is not None:
+                self._unindex(pk, old)
+            self.items[pk] = item
+            self._index(pk, item)
+            return old
+
+    def delete(self, key):
+        with self._lock:
+            pk = self.primary_key(key)
+            old = self.items.pop(pk, None)
+            if old is not None:
+                self._unindex(pk, old)
+            return old
+
+    def partition(self, index, hash_value):
+        with self._lock:
+            return list(self._partitions.get(index, {}).get(hash_value, {}).values())
+
+    def _index_names(self, item):
+        yield None
+        for index, (hash_key, range_key, _) in self.indexes.items():
+            # Global secondary indexes are sparse
+            if hash_key in item and (range_key is None or range_key in item):
+                yield index
+
+    def _index(self, pk, item):
+        for index in self._index_names(item):
+            hash_key = self.key_attributes(index)[0]
+            self._partitions.setdefault(index, {}).setdefault(item[hash_key], {})[pk] = item
+
+    def _unindex(self, pk, item):
+        for index in self._index_names(item):
+            hash_key = self.key_attributes(index)[0]
+            partition = self._partitions.get(index, {}).get(item[hash_key])
+            if partition is not None:
+                partition.pop(pk, None)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.items)
+
+    def restore(self, items):
+        with self._lock:
+            self.items = {}
+            self._partitions = {}
+            for item in items.values():
+                self.put(item)
+
+
+def _read_units(size, consistent=False):
+    return max(1, math.ceil(size / 4096)) * (1.0 if consistent else 0.5)
+
+
+def _write_units(size):
+    return float(max(1, math.ceil(size / 1024)))
+
+
+class FakeDynamoDB:
+    """Tables answering the low-level DynamoDB API with items kept as Python values"""
+
+    def __init__(self):
+        self.tables = {}
+
+    def create_table(self, name, hash_key, range_key=None, indexes=None):
+        self.tables[name] = FakeTable(name, hash_key, range_key, indexes)
+        return self.tables[name]
+
+    def table(self, name):
+        if name not in self.tables:
+            raise FakeError('ResourceNotFoundException', f"Requested resource not found: Table: {name} not found")
+        return self.tables[name]
+
+    def handle(self, operation, params):
+        method = getattr(self, f"_op_{operation}", None)
+        if method is None:
+            raise FakeError('UnknownOperationException', f"{operation} is not implemented by the fake")
+        return method(params)
+
+    @staticmethod
+    def _capacity(params, table_name, units):
+        if params.get('ReturnConsumedCapacity') in ('TOTAL', 'INDEXES'):
+            return {'ConsumedCapacity': {'TableName': table_name, 'CapacityUnits': units}}
+        return {}
+
+    @staticmethod
+    def _check(condition, item):
+        if condition is not None and not condition(item or {}):
+            raise FakeError('ConditionalCheckFailedException', 'The conditional request failed')
+
+    def _op_GetItem(self, params):
+        table = self.table(params['TableName'])
+        item = table.get(deserialize_item(params['Key']))
+        response = self._capacity(params, table.name,
+                                  _read_units(item_size(item) if item else 0, params.get('ConsistentRead')))
+        if item is not None:
+            response['Item'] = serialize_item(project(item, params))
+        return response
+
+    def _op_PutItem(self, params):
+        table = self.table(params['TableName'])
+        item = deserialize_item(params['Item'])
+        condition = compile_condition(params.get('ConditionExpression'), params)
+        with table._lock:
+            self._check(condition, table.get(item))
+            old = table.put(item)
+        response = self._capacity(params, table.name, _write_units(item_size(item)))
+        if old is not None and params.get('ReturnValues') == 'ALL_OLD':
+            response['Attributes'] = serialize_item(old)
+        return response
+
+    def _op_UpdateItem(self, params):
+        table = self.table(params['TableName'])
+        key = deserialize_item(params['Key'])
+        condition = compile_condition(params.get('ConditionExpression'), params)
+        with table._lock:
+            old = table.get(key)
+            self._check(condition, old)
+            new, changed = apply_update(old or key, params.get('UpdateExpression', ''), params)
+            table.put(new)
+        response = self._capacity(params, table.name, _write_units(max(item_size(new), item_size(old or {}))))
+        returned = params.get('ReturnValues', 'NONE')
+        if returned == 'ALL_NEW':
+            response['Attributes'] = serialize_item(new)
+        elif returned == 'ALL_OLD' and old is not None:
+            response['Attributes'] = serialize_item(old)
+        elif returned == 'UPDATED_NEW':
+            response['Attributes'] = serialize_item({name: new[name] for name in changed if name in new})
+        elif returned == 'UPDATED_OLD' and old is not None:
+            response['Attributes'] = serialize_item({name: old[name] for name in changed if name in old})
+        return response
+
+    def _op_DeleteItem(self, params):
+        table = self.table(params['TableName'])
+        key = deserialize_item(params['Key'])
+        condition = compile_condition(params.get('ConditionExpression'), params)
+        with table._lock:
+            self._check(condition, table.get(key))
+            old = table.delete(key)
+        response = self._capacity(params, table.name, _write_units(item_size(old) if old else 0))
+        if old is not None and params.get('ReturnValues') == 'ALL_OLD':
+            response['Attributes'] = serialize_item(old)
+        return response
+
+    def _page(self, table, candidates, params, index=None):
+        """Evaluate candidates up to Limit items or 1 MB, then filter and project"""
+        limit = params.get('Limit')
+        filter_condition = compile_condition(params.get('FilterExpression'), params)
+        selected, scanned, size = [], 0, 0
+        last = None
+        for item in candidates:
+            scanned += 1
+            size += item_size(item)
+            last = item
+            if filter_condition is None or filter_condition(item):
+                selected.append(item)
+            if (limit and scanned >= limit) or size >= PAGE_BYTES:
+                break
+        else:
+            last = None
+        response = {'Count': len(selected), 'ScannedCount': scanned}
+        if params.get('Select') != 'COUNT':
+            if index is not None and table.indexes[index][2] == 'KEYS_ONLY':
+                selected = [table.key_item(item, index) for item in selected]
+            response['Items'] = [serialize_item(project(item, params)) for item in selected]
+        if last is not None:
+            response['LastEvaluatedKey'] = serialize_item(table.key_item(last, index))
+        response.update(self._capacity(params, table.name, _read_units(size, params.get('ConsistentRead'))))
+        return response
+
+    def _op_Query(self, params):
+        table = self.table(params['TableName'])
+        index = params.get('IndexName')
+        hash_key, range_key = table.key_attributes(index)
+        expr = params.get('KeyConditionExpression')
+        if not expr:
+            raise FakeError('ValidationException', 'KeyConditionExpression is required')
+        names = params.get('ExpressionAttributeNames') or {}
+        values = _values(params)
+        tokens = _tokenize(expr)
+        hash_value = _MISSING
+        for i in range(len(tokens) - 2):
+            if names.get(tokens[i], tokens[i]) == hash_key and tokens[i + 1] == '=' and tokens[i + 2] in values:
+                hash_value = values[tokens[i + 2]]
+                break
+        if hash_value is _MISSING:
+            raise FakeError('ValidationException', f"Query condition missed key schema element: {hash_key}")
+        key_condition = compile_condition(expr, params)
+
+        def order(item):
+            return (_sort_value(item.get(range_key, _MISSING)) if range_key else (0, ''),
+                    _sort_value(item.get(table.hash_key)),
+                    _sort_value(item.get(table.range_key, _MISSING)) if table.range_key else (0, ''))
+
+        candidates = sorted((item for item in table.partition(index, hash_value) if key_condition(item)),
+                            key=order, reverse=params.get('ScanIndexForward') is False)
+        start = params.get('ExclusiveStartKey')
+        if start:
+            position = order(deserialize_item(start))
+            keys = [order(item) for item in candidates]
+            if params.get('ScanIndexForward') is False:
+                candidates = [item for item, k in zip(candidates, keys) if k < position]
+            else:
+                candidates = candidates[bisect_right(keys, position):]
+        return self._page(table, candidates, params, index)
+
+    def _op_Scan(self, params):
+        table = self.table(params['TableName'])
+        index = params.get('IndexName')
+        with table._lock:
+            if index is None:
+                items = list(table.items.values())
+            else:
+                items = [item for partition in table._partitions.get(index, {}).values()
+                         for item in partition.values()]
+        segments = params.get('TotalSegments')
+        if segments:
+            segment = params.get('Segment', 0)
+            items = [item for item in items
+                     if int(hashlib.md5(repr(table.primary_key(item)).encode()).hexdigest(), 16) % segments == segment]
+        start = params.get('ExclusiveStartKey')
+        if start:
+            start_pk = table.primary_key(deserialize_item(start))
+            for i, item in enumerate(items):
+                if table.primary_key(item) == start_pk:
+                    items = items[i + 1:]
+                    break
+        return self._page(table, items, params, index)
+
+    def _op_BatchGetItem(self, params):
+        request = params['RequestItems']
+        if sum(len(spec.get('Keys', [])) for spec in request.values()) > BATCH_GET_LIMIT:
+            raise FakeError('ValidationException', 'Too many items requested for the BatchGetItem call')
+        responses, capacity = {}, []
+        for table_name, spec in request.items():
+            table = self.table(table_name)
+            found, size = [], 0
+            for key in spec.get('Keys', []):
+                item = table.get(deserialize_item(key))
+                if item is not None:
+                    size += item_size(item)
+                    found.append(serialize_item(project(item, spec)))
+            responses[table_name] = found
+            capacity.append({'TableName': table_name, 'CapacityUnits': _read_units(size, spec.get('ConsistentRead'))})
+        response = {'Responses': responses, 'UnprocessedKeys': {}}
+        if params.get('ReturnConsumedCapacity') in ('TOTAL', 'INDEXES'):
+            response['ConsumedCapacity'] = capacity
+        return response
+
+    def _op_BatchWriteItem(self, params):
+        request = params['RequestItems']
+        if sum(len(writes) for writes in request.values()) > BATCH_WRITE_LIMIT:
+            raise FakeError('ValidationException', 'Too many items requested for the BatchWriteItem call')
+        capacity = []
+        for table_name, writes in request.items():
+            table = self.table(table_name)
+            units = 0.0
+            for write in writes:
+                if 'PutRequest' in write:
+                    item = deserialize_item(write['PutRequest']['Item'])
+                    table.put(item)
+                    units += _write_units(item_size(item))
+                else:
+                    old = table.delete(deserialize_item(write['DeleteRequest']['Key']))
+                    units += _write_units(item_size(old) if old else 0)
+            capacity.append({'TableName': table_name, 'CapacityUnits': units})
+        response = {'UnprocessedItems': {}}
+        if params.get('ReturnConsumedCapacity') in ('TOTAL', 'INDEXES'):
+            response['ConsumedCapacity'] = capacity
+        return response
+
+    def snapshot(self):
+        return {name: table.snapshot() for name, table in self.tables.items()}
+
+    def restore(self, snapshot):
+        for name, items in snapshot.items():
+            self.tables[name].restore(items)
+
+
+# ---------------------------------------------------------------- S3
+
+class FakeS3:
+    """Buckets of objects; listings are served from a sorted key list"""
+
+    def __init__(self):
+        self.buckets = {}
+        self._sorted = {}
+        self._lock = threading.RLock()
+
+    def create_bucket(self, name):
+        self.buckets.setdefault(name, {})
+
+    def bucket(self, name):
+        if name not in self.buckets:
+            raise FakeError('NoSuchBucket', 'The specified bucket does not exist', 404)
+        return self.buckets[name]
+
+    def put(self, bucket, key, data=b'', content_type='binary/octet-stream', metadata=None, last_modified=None):
+        with self._lock:
+            self.bucket(bucket)[key] = {
+                'Body': data,
+                'ContentLength': len(data),
+                'ContentType': content_type,
+                'Metadata': dict(metadata or {}),
+                'ETag': '"' + hashlib.md5(data).hexdigest() + '"',
+                'LastModified': last_modified or datetime.now(timezone.utc),
+            }
+            self._sorted.pop(bucket, None)
+
+    def keys(self, bucket):
+        with self._lock:
+            keys = self._sorted.get(bucket)
+            if keys is None:
+                keys = self._sorted[bucket] = sorted(self.bucket(bucket))
+            return keys
+
+    def handle(self, operation, params):
+        method = getattr(self, f"_op_{operation}", None)
+        if method is None:
+            raise FakeError('NotImplemented', f"{operation} is not implemented by the fake", 501)
+        return method(params)
+
+    def _object(self, params, missing_code='NoSuchKey'):
+        obj = self.bucket(params['Bucket']).get(params['Key'])
+        if obj is None:
+            raise FakeError(missing_code, 'The specified key does not exist.', 404)
+        return obj
+
+    @staticmethod
+    def _read_body(body):
+        if body is None:
+            return b''
+        if hasattr(body, 'read'):
+            data = body.read()
+        else:
+            data = body
+        return data.encode('utf-8') if isinstance(data, str) else bytes(data)
+
+    def _op_ListObjectsV2(self, params):
+        keys = self.keys(params['Bucket'])
+        objects = self.buckets[params['Bucket']]
+        prefix = params.get('Prefix', '')
+        max_keys = min(params.get('MaxKeys', S3_MAX_KEYS), S3_MAX_KEYS)
+        after = params.get('ContinuationToken') or params.get('StartAfter') or ''
+        start = max(bisect_left(keys, prefix), bisect_right(keys, after) if after else 0)
+        contents, last = [], None
+        for key in keys[start:]:
+            if not key.startswith(prefix):
+                break
+            if len(contents) == max_keys:
+                last = contents[-1]['Key']
+                break
+            obj = objects.get(key)
+            if obj is None:
+                continue
+            contents.append({'Key': key, 'Size': obj['ContentLength'], 'ETag': obj['ETag'],
+                             'LastModified': obj['LastModified'], 'StorageClass': 'STANDARD'})
+        response = {'Name': params['Bucket'], 'Prefix': prefix, 'MaxKeys': max_keys, 'KeyCount': len(contents),
+                    'IsTruncated': last is not None}
+        if contents:
+            response['Contents'] = contents
+        if last is not None:
+            response['NextContinuationToken'] = last
+        return response
+
+    def _op_HeadObject(self, params):
+        obj = self._object(params, missing_code='404')
+        return {name: obj[name] for name in ('ContentLength', 'ContentType', 'ETag', 'LastModified', 'Metadata')}
+
+    def _op_GetObject(self, params):
+        obj = self._object(params)
+        data = obj['Body']
+        response = self._op_HeadObject(params)
+        byte_range = params.get('Range')
+        if byte_range:
+            match = re.match(r'bytes=(\d+)-(\d*)', byte_range)
+            first = int(match.group(1))
+            last = int(match.group(2)) if match.group(2) else len(data) - 1
+            data = data[first:last + 1]
+            response['ContentRange'] = f"bytes {first}-{first + len(data) - 1}/{obj['ContentLength']}"
+        response['ContentLength'] = len(data)
+        response['Body'] = StreamingBody(io.BytesIO(data), len(data))
+        return response
+
+    def _op_PutObject(self, params):
+        data = self._read_body(params.get('Body'))
+        self.put(params['Bucket'], params['Key'], data, params.get('ContentType', 'binary/octet-stream'),
+                 params.get('Metadata'))
+        return {'ETag': self.buckets[params['Bucket']][params['Key']]['ETag']}
+
+    def _op_CopyObject(self, params):
+        source = params['CopySource']
+        if isinstance(source, str):
+            # botocore has already turned a CopySource dict into a URL-quoted 'bucket/key'
+            bucket, _, key = unquote(source.lstrip('/')).partition('/')
+            source = {'Bucket': bucket, 'Key': key.split('?versionId=', 1)[0]}
+        obj = self._object(source)
+        metadata = params.get('Metadata') if params.get('MetadataDirective') == 'REPLACE' else obj['Metadata']
+        self.put(params['Bucket'], params['Key'], obj['Body'], params.get('ContentType', obj['ContentType']), metadata)
+        copied = self.buckets[params['Bucket']][params['Key']]
+        return {'CopyObjectResult': {'ETag': copied['ETag'], 'LastModified': copied['LastModified']}}
+
+    def _op_DeleteObject(self, params):
+        with self._lock:
+            if self.bucket(params['Bucket']).pop(params['Key'], None) is not None:
+                self._sorted.pop(params['Bucket'], None)
+        return {}
+
+    def _op_DeleteObjects(self, params):
+        objects = params['Delete']['Objects']
+        if len(objects) > 1000:
+            raise FakeError('MalformedXML', 'The XML you provided was not well-formed')
+        with self._lock:
+            bucket = self.bucket(params['Bucket'])
+            for obj in objects:
+                bucket.pop(obj['Key'], None)
+            self._sorted.pop(params['Bucket'], None)
+        response = {'Deleted': [{'Key': obj['Key']} for obj in objects]}
+        if params['Delete'].get('Quiet'):
+            response['Deleted'] = []
+        return response
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(objects) for name, objects in self.buckets.items()}
+
+    def restore(self, snapshot):
+        with self._lock:
+            self.buckets = {name: dict(objects) for name, objects in snapshot.items()}
+            self._sorted = {}
+
+
+# ---------------------------------------------------------------- Lambda
+
+class FakeLambda:
+    """Records asynchronous self-invocations instead of running them"""
+
+    def __init__(self):
+        self.invocations = []
+
+    def handle(self, operation, params):
+        if operation != 'Invoke':
+            raise FakeError('InvalidRequestContentException', f"{operation} is not implemented by the fake")
+        self.invocations.append({'FunctionName': params.get('FunctionName'),
+                                 'InvocationType': params.get('InvocationType', 'RequestResponse'),
+                                 'Payload': self._payload(params.get('Payload'))})
+        status = 202 if params.get('InvocationType') == 'Event' else 200
+        return {'StatusCode': status, 'Payload': StreamingBody(io.BytesIO(b''), 0)}
+
+    @staticmethod
+    def _payload(payload):
+        if hasattr(payload, 'read'):
+            payload = payload.read()
+        return payload.decode('utf-8') if isinstance(payload, bytes) else payload
+
+
+# ---------------------------------------------------------------- wiring
+
+class FakeAWS:
+    """The fake services, per-call latency and a count of answered calls"""
+
+    def __init__(self, latency=None):
+        self.dynamodb = FakeDynamoDB()
+        self.s3 = FakeS3()
+        self.lambda_ = FakeLambda()
+        # 'service' or 'service.Operation' -> milliseconds added to every matching call
+        self.latency = dict(latency or {})
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def service(self, name):
+        return {'dynamodb': self.dynamodb, 's3': self.s3, 'lambda': self.lambda_}.get(name)
+
+    def delay(self, service, operation):
+        ms = self.latency.get(f"{service}.{operation}", self.latency.get(service, 0))
+        if ms:
+            time.sleep(ms / 1000)
+
+    def answer(self, service, operation, params):
+        """(status code, parsed response) for one call"""
+        with self._lock:
+            key = f"{service}.{operation}"
+            self.calls[key] = self.calls.get(key, 0) + 1
+        self.delay(service, operation)
+        backend = self.service(service)
+        try:
+            if backend is None:
+                raise FakeError('UnknownService', f"{service} is not faked", 501)
+            parsed = backend.handle(operation, params)
+            status = 200
+        except FakeError as e:
+            status = e.status
+            parsed = {'Error': {'Code': e.code, 'Message': e.message}}
+        parsed['ResponseMetadata'] = {'HTTPStatusCode': status, 'RetryAttempts': 0, 'HTTPHeaders': {}}
+        return status, parsed
+
+    def snapshot(self):
+        return {'dynamodb': self.dynamodb.snapshot(), 's3': self.s3.snapshot()}
+
+    def restore(self, snapshot):
+        self.dynamodb.restore(snapshot['dynamodb'])
+        self.s3.restore(snapshot['s3'])
+        self.lambda_.invocations.clear()
+
+
+_active = None
+_installed = False
+
+
+def _stash_params(params, context=None, **kwargs):
+    if _active is not None and context is not None:
+        context[_PARAMS_KEY] = params
+
+
+def _respond(model, context=None, **kwargs):
+    fake = _active
+    if fake is None or context is None or _PARAMS_KEY not in context:
+        return None
+    status, parsed = fake.answer(model.service_model.endpoint_prefix, model.name, context.pop(_PARAMS_KEY))
+    return AWSResponse(None, status, {}, None), parsed
+
+
+def install(fake):
+    """
+    Answer every AWS call from fake. Applies to boto3 sessions created after this call and to
+    boto3's default session; install before the handler module creates its clients.
+    """
+    global _active, _installed
+    _active = fake
+    if not _installed:
+        handlers.BUILTIN_HANDLERS.append(('before-parameter-build', _stash_params, handlers.REGISTER_LAST))
+        handlers.BUILTIN_HANDLERS.append(('before-call', _respond, handlers.REGISTER_FIRST))
+        import boto3
+        if boto3.DEFAULT_SESSION is not None:
+            boto3.DEFAULT_SESSION.events.register_last('before-parameter-build', _stash_params)
+            boto3.DEFAULT_SESSION.events.register_first('before-call', _respond)
+        _installed = True
+    return fake
+
+
+def uninstall():
+    """Let calls through to AWS again"""
+    global _active
+    _active = None
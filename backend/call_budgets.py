@@ -0,0 +1,216 @@
+"""
+AWS call budgets for the gallery manager handler.
+
+Each scenario of handler_benchmark.py has a Budget: the most DynamoDB calls,
+S3 calls and writes one request may make, and optional per-operation caps
+(for example no Scan when reading one gallery). Limits are numbers or
+functions of the catalog size, so handlers that legitimately do O(N) work,
+like the sort-order handlers' one update_item per entry, are held to exactly
+that and fail once they grow past it.
+
+Calls are counted by aws_fakes, which sees every call whether or not the
+client that made it is instrumented. The check runs against a small synthetic
+catalog in a few seconds and exits non-zero when any budget is exceeded, so it
+can gate CI:
+
+    python call_budgets.py [--galleries 40] [--photos 4000] [--only get,resync] [--json]
+
+From Python, calls_during() and assert_within() check a single call:
+
+    calls = calls_during(fake, lambda_handler, event, context)
+    assert_within(Budget(dynamodb=2, writes=0, s3=0), calls)
+"""
+import argparse
+import json
+import math
+import sys
+
+import handler_benchmark
+
+WRITE_OPERATIONS = {
+    'dynamodb.PutItem', 'dynamodb.UpdateItem', 'dynamodb.DeleteItem', 'dynamodb.BatchWriteItem',
+    'dynamodb.TransactWriteItems',
+    's3.PutObject', 's3.CopyObject', 's3.DeleteObject', 's3.DeleteObjects', 's3.UploadPartCopy',
+}
+
+
+class BudgetExceeded(AssertionError):
+    """A request made more AWS calls than its budget allows"""
+
+
+class Budget:
+    """
+    Call limits of one request. Each limit is an int, a function of the catalog size dict,
+    or None for no limit. operations caps single operations: {'dynamodb.Scan': 0}.
+    """
+
+    def __init__(self, dynamodb=None, s3=None, writes=None, operations=None, note=''):
+        self.dynamodb = dynamodb
+        self.s3 = s3
+        self.writes = writes
+        self.operations = dict(operations or {})
+        self.note = note
+
+    @staticmethod
+    def _resolve(limit, size):
+        return limit(size) if callable(limit) else limit
+
+    def limits(self, size=None):
+        size = size or {}
+        limits = {'dynamodb': self._resolve(self.dynamodb, size), 's3': self._resolve(self.s3, size),
+                  'writes': self._resolve(self.writes, size)}
+        limits.update({op: self._resolve(limit, size) for op, limit in self.operations.items()})
+        return {name: limit for name, limit in limits.items() if limit is not None}
+
+    def violations(self, calls, size=None):
+        """'<counter>: <used> > <limit>' for every limit calls exceed"""
+        used = usage(calls)
+        return [f"{name}: {used.get(name, 0)} > {limit}"
+                for name, limit in self.limits(size).items() if used.get(name, 0) > limit]
+
+
+def usage(calls):
+    """Totals of a {'service.Operation': count} dict: per service, writes and per operation"""
+    totals = dict(calls)
+    for op, count in calls.items():
+        service = op.split('.', 1)[0]
+        totals[service] = totals.get(service, 0) + count
+        if op in WRITE_OPERATIONS:
+            totals['writes'] = totals.get('writes', 0) + count
+    return totals
+
+
+def calls_during(fake, fn, *args, **kwargs):
+    """AWS calls made while fn(*args, **kwargs) runs, by 'service.Operation'"""
+    before = dict(fake.calls)
+    fn(*args, **kwargs)
+    return {op: count - before.get(op, 0) for op, count in fake.calls.items() if count > before.get(op, 0)}
+
+
+def assert_within(budget, calls, size=None):
+    """Raise BudgetExceeded when calls exceed budget"""
+    violations = budget.violations(calls, size)
+    if violations:
+        raise BudgetExceeded(f"AWS call budget exceeded ({'; '.join(violations)}); calls: {calls}")
+
+
+def pages(count, per_page):
+    return max(1, math.ceil(count / per_page))
+
+
+# Budgets of the handler_benchmark scenarios. Size keys: galleries, photos, objects,
+# gallery_photos (photos of the gallery a scenario acts on), year_galleries (galleries of its year),
+# moved_objects (objects of the renamed legacy gallery), renamed, deleted, uploaded,
+# unsynced (objects missing from the photo sync checkpoint).
+BUDGETS = {
+    'list': Budget(dynamodb=lambda n: pages(n['galleries'], 2000), s3=0, writes=0),
+    'page': Budget(dynamodb=2, s3=0, writes=0, operations={'dynamodb.Scan': 0},
+                   note='one listOrder-index query, then the full items of the page'),
+    'facets': Budget(dynamodb=lambda n: pages(n['galleries'], 1000), s3=0, writes=0,
+                     operations={'dynamodb.Scan': 0}),
+    'map': Budget(dynamodb=lambda n: pages(n['galleries'], 1000), s3=0, writes=0,
+                  operations={'dynamodb.Scan': 0}),
+    'get': Budget(dynamodb=lambda n: 1 + pages(n['gallery_photos'], 2000), s3=0, writes=0,
+                  operations={'dynamodb.Scan': 0}),
+    'filter': Budget(dynamodb=lambda n: 1 + pages(n['year_galleries'], 100) + 1, s3=0, writes=0,
+                     operations={'dynamodb.Scan': 0},
+                     note='year members, their ordering attributes, then the full items of one page'),
+    'upload': Budget(dynamodb=lambda n: 2 + 3 * n['uploaded'], s3=lambda n: 2 * n['uploaded'],
+                     writes=lambda n: 1 + 3 * n['uploaded'], operations={'dynamodb.Scan': 0}),
+    'rename': Budget(dynamodb=lambda n: 11 + pages(n['gallery_photos'], 25),
+                     s3=lambda n: n['moved_objects'] + 2 * pages(n['moved_objects'], 1000) + 1,
+                     operations={'dynamodb.Scan': 0},
+                     note='one CopyObject per object is inherent to a path-layout move'),
+    'rename_photos': Budget(dynamodb=lambda n: 4 + pages(n['renamed'], 100) + pages(n['renamed'], 25), s3=0,
+                            writes=lambda n: 2 + pages(n['renamed'], 25), operations={'dynamodb.Scan': 0},
+                            note='the edited years move the gallery in the year index: one batched write'),
+    'resync': Budget(dynamodb=lambda n: 2 * n['galleries'], s3=lambda n: pages(n['objects'], 1000) + 2,
+                     writes=0, operations={'dynamodb.Scan': 0},
+                     note='one keyed read and one query per gallery folder; no writes for an unchanged catalog'),
+    'resync_incremental': Budget(
+        dynamodb=lambda n: 2 + 2 * pages(n['galleries'], 1000) + 2 + pages(n['gallery_photos'], 2000) + 1,
+        s3=lambda n: pages(n['objects'], 1000) + 2, writes=lambda n: 3 + n['unsynced'],
+        operations={'dynamodb.Scan': 0},
+        note='checkpoint reads per prefix, then one keyed read and one query for the changed gallery only'),
+    'delete_photos': Budget(dynamodb=lambda n: 2 + pages(n['deleted'], 100) + pages(n['deleted'], 25)
+                                           + pages(n['gallery_photos'], 2000),
+                            s3=lambda n: pages(2 * n['deleted'], 1000), operations={'dynamodb.Scan': 0},
+                            note='the cover is deleted: the remaining photos are read to promote the first'),
+    'rate': Budget(dynamodb=3, s3=0, writes=1, operations={'dynamodb.Scan': 0}),
+    'sort_galleries': Budget(dynamodb=lambda n: n['galleries'] + pages(n['galleries'], 100), s3=0,
+                             writes=lambda n: n['galleries'],
+                             note='createdAt of the galleries for their list keys, then one update_item per gallery'),
+    'sort_photos': Budget(dynamodb=lambda n: n['gallery_photos'], s3=0, writes=lambda n: n['gallery_photos'],
+                          note='one update_item per photo'),
+}
+
+
+def catalog_size(catalog, events):
+    target = catalog['id_layout'] or catalog['legacy']
+    moved = catalog['legacy'] or target
+    upload = json.loads(events['upload']['body']) if 'upload' in events else {'photos': []}
+    return {
+        'galleries': catalog['galleries'],
+        'photos': catalog['photos'],
+        'objects': 2 * catalog['photos'],
+        'gallery_photos': len(target['photoIds']),
+        'year_galleries': catalog['years'].get(target['years'][0], 0),
+        'moved_objects': 2 * len(moved['photoIds']),
+        'renamed': len(json.loads(events['rename_photos']['body'])['photos']),
+        'deleted': len(json.loads(events['delete_photos']['body'])['photoIds']),
+        'uploaded': len(upload['photos']),
+        'unsynced': catalog.get('unsynced', 0),
+    }
+
+
+def run(galleries=40, photos=4000, only=None):
+    """Run every budgeted scenario once; returns {scenario: {calls, limits, violations, status}}"""
+    module, fake, catalog = handler_benchmark.setup(galleries, photos)
+    snapshot = fake.snapshot()
+    events = handler_benchmark.scenario_events(catalog)
+    size = catalog_size(catalog, events)
+    results = {}
+    for name, event in events.items():
+        budget = BUDGETS.get(name)
+        if budget is None or (only and name not in only):
+            continue
+        fake.restore(snapshot)
+        responses = []
+        calls = calls_during(fake, lambda: responses.append(
+            module.lambda_handler(event, handler_benchmark.FakeContext())))
+        results[name] = {
+            'status': responses[0].get('statusCode'),
+            'calls': dict(sorted(calls.items())),
+            'limits': budget.limits(size),
+            'violations': budget.violations(calls, size),
+            'note': budget.note,
+        }
+    return {'size': size, 'scenarios': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--galleries', type=int, default=40)
+    parser.add_argument('--photos', type=int, default=4000)
+    parser.add_argument('--only', default='', help=f"comma-separated scenarios ({', '.join(BUDGETS)})")
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    report = run(args.galleries, args.photos, set(filter(None, args.only.split(','))) or None)
+    failed = [name for name, result in report['scenarios'].items() if result['violations']]
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for name, result in report['scenarios'].items():
+            used = usage(result['calls'])
+            verdict = 'OVER BUDGET' if result['violations'] else 'ok'
+            print(f"{name:<18} {verdict:<11} " + ', '.join(
+                f"{counter} {used.get(counter, 0)}/{limit}" for counter, limit in result['limits'].items()))
+            for violation in result['violations']:
+                print(f"{'':<18} {violation}   calls: {result['calls']}")
+        print(f"{len(report['scenarios']) - len(failed)} of {len(report['scenarios'])} scenarios within budget")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
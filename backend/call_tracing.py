@@ -0,0 +1,233 @@
+"""
+Opt-in per-call tracing of boto3 clients.
+
+request_metrics counts calls per route; this module records each call as a
+span so the slow ones inside a handler (a Query in update_gallery, a
+ListObjectsV2 page in scan_s3_for_photos) can be found. instrument_client()
+hooks a client's botocore events:
+
+    before-parameter-build  opens the span: operation, table or bucket, number of keys
+    before-call             restarts its clock once the request is built and about to be sent
+    after-call              closes it with latency, HTTP status, retries and items returned
+    after-call-error        closes it with the connection error
+
+Spans are collected into the trace of the request being observed (started by
+request_metrics.observe_request when tracing is on), including calls made on
+the handlers' worker pools, which pass the request's context on to their
+threads (worker_pools.py). When the trace finishes, calls slower than TRACE_SLOW_MS are
+logged as one summary line, and with TRACE_DIR set the trace is written there
+in Chrome trace-event format (chrome://tracing, https://ui.perfetto.dev).
+
+    TRACE_AWS_CALLS=1   enable tracing (default off)
+    TRACE_SLOW_MS       slow-call threshold in milliseconds (default 100)
+    TRACE_DIR           directory for exported traces (default: not exported)
+
+    python call_tracing.py TRACE_DIR/*.json   summarise exported traces by operation
+"""
+import contextvars
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+TRACE_AWS_CALLS = os.getenv('TRACE_AWS_CALLS', '').lower() in ('1', 'true', 'yes')
+TRACE_SLOW_MS = float(os.getenv('TRACE_SLOW_MS', '100'))
+TRACE_DIR = os.getenv('TRACE_DIR')
+
+_SPAN_KEY = 'call_tracing_span'
+
+
+class Trace:
+    """Spans of the AWS calls made during one request"""
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.wall_started = time.time()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def slow_spans(self, threshold_ms=None):
+        threshold_ms = TRACE_SLOW_MS if threshold_ms is None else threshold_ms
+        return sorted((s for s in self.spans if s['ms'] >= threshold_ms), key=lambda s: -s['ms'])
+
+    def to_chrome(self):
+        """Chrome trace-event JSON: one complete ('X') event per call, one row per thread"""
+        events = [{
+            'name': self.name, 'ph': 'X', 'pid': 1, 'tid': 0, 'ts': 0,
+            'dur': round((time.perf_counter() - self.started) * 1e6),
+        }]
+        for span in self.spans:
+            events.append({
+                'name': f"{span['service']}.{span['operation']}",
+                'cat': span['service'],
+                'ph': 'X', 'pid': 1, 'tid': span['thread'],
+                'ts': round(span['offset_ms'] * 1000),
+                'dur': round(span['ms'] * 1000),
+                'args': {k: span[k] for k in ('resource', 'keys', 'items', 'status', 'retries', 'error')
+                         if span.get(k) is not None},
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms',
+                'otherData': {'request': self.name, 'startedAt': self.wall_started}}
+
+
+# Per request context, like request_metrics' current metrics
+_current = contextvars.ContextVar('call_trace', default=None)
+
+
+def current_trace():
+    """Trace of the request being observed, or None"""
+    return _current.get()
+
+
+def start_trace(name):
+    """Start collecting spans for a request; returns None when tracing is off"""
+    trace = Trace(name) if TRACE_AWS_CALLS else None
+    _current.set(trace)
+    return trace
+
+
+def finish_trace():
+    """Stop collecting spans, log the slow calls and export the trace"""
+    trace = _current.get()
+    _current.set(None)
+    if trace is None:
+        return None
+    slow = trace.slow_spans()
+    if slow:
+        calls = ', '.join(f"{s['service']}.{s['operation']}({s['resource'] or '-'}) {s['ms']:.0f} ms"
+                          + (f" x{s['retries'] + 1}" if s.get('retries') else '')
+                          for s in slow[:10])
+        logger.warning(f"{trace.name}: {len(slow)} of {len(trace.spans)} AWS calls over "
+                       f"{TRACE_SLOW_MS:.0f} ms: {calls}")
+    if TRACE_DIR:
+        try:
+            export(trace, TRACE_DIR)
+        except OSError as e:
+            logger.warning(f"Could not export trace of {trace.name}: {e}")
+    return trace
+
+
+def export(trace, directory):
+    """Write a trace to directory as <request>-<timestamp>.json; returns the path"""
+    os.makedirs(directory, exist_ok=True)
+    slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', trace.name).strip('_') or 'request'
+    path = os.path.join(directory, f"{slug}-{int(trace.wall_started * 1000)}.json")
+    with open(path, 'w') as f:
+        json.dump(trace.to_chrome(), f)
+    return path
+
+
+def _resource_and_keys(params):
+    """Table or bucket a call targets and how many keys it names"""
+    if 'RequestItems' in params:
+        items = params['RequestItems']
+        keys = sum(len(v.get('Keys', [])) if isinstance(v, dict) else len(v) for v in items.values())
+        return ','.join(items), keys
+    if 'TransactItems' in params:
+        return None, len(params['TransactItems'])
+    resource = params.get('TableName') or params.get('Bucket') or params.get('FunctionName')
+    if 'Delete' in params and isinstance(params['Delete'], dict):
+        return resource, len(params['Delete'].get('Objects', []))
+    return resource, 1 if 'Key' in params else None
+
+
+def _open_span(params, model, context, **kwargs):
+    trace = _current.get()
+    if trace is None or context is None:
+        return
+    resource, keys = _resource_and_keys(params)
+    context[_SPAN_KEY] = {
+        'service': model.service_model.endpoint_prefix,
+        'operation': model.name,
+        'resource': resource,
+        'keys': keys,
+        'thread': threading.get_ident() % 100000,
+        'start': time.perf_counter(),
+        'trace': trace,
+    }
+
+
+def _request_built(context=None, **kwargs):
+    span = (context or {}).get(_SPAN_KEY)
+    if span is not None:
+        span['start'] = time.perf_counter()
+
+
+def _close_span(context=None, parsed=None, http_response=None, exception=None, **kwargs):
+    span = (context or {}).pop(_SPAN_KEY, None)
+    if span is None:
+        return
+    trace = span.pop('trace')
+    start = span.pop('start')
+    span['ms'] = (time.perf_counter() - start) * 1000
+    span['offset_ms'] = (start - trace.started) * 1000
+    if isinstance(parsed, dict):
+        meta = parsed.get('ResponseMetadata') or {}
+        span['retries'] = meta.get('RetryAttempts')
+        span['items'] = parsed.get('Count', parsed.get('KeyCount'))
+    if http_response is not None:
+        span['status'] = getattr(http_response, 'status_code', None)
+    if exception is not None:
+        span['error'] = type(exception).__name__
+    trace.add(span)
+
+
+def instrument_client(client):
+    """
+    Record the calls of a boto3 client (or resource) as spans of the current trace.
+    Returns what it was given so it can wrap client creation.
+    """
+    low_level = getattr(getattr(client, 'meta', None), 'client', None) or client
+    if getattr(low_level, '_call_tracing_instrumented', False):
+        return client
+    service = low_level.meta.service_model.service_id.hyphenize()
+    events = low_level.meta.events
+    events.register(f'before-parameter-build.{service}', _open_span, unique_id='call-tracing-open')
+    events.register(f'before-call.{service}', _request_built, unique_id='call-tracing-built')
+    events.register(f'after-call.{service}', _close_span, unique_id='call-tracing-close')
+    events.register(f'after-call-error.{service}', _close_span, unique_id='call-tracing-error')
+    low_level._call_tracing_instrumented = True
+    return client
+
+
+def summarize(paths):
+    """Aggregate exported traces by operation and resource: calls, total and max latency"""
+    totals = {}
+    for path in paths:
+        with open(path) as f:
+            events = json.load(f).get('traceEvents', [])
+        for event in events:
+            if 'cat' not in event:
+                continue
+            key = (event['name'], event.get('args', {}).get('resource') or '-')
+            entry = totals.setdefault(key, {'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            ms = event['dur'] / 1000
+            entry['calls'] += 1
+            entry['total_ms'] += ms
+            entry['max_ms'] = max(entry['max_ms'], ms)
+    return totals
+
+
+def main(argv):
+    if not argv:
+        print(__doc__)
+        return 1
+    totals = summarize(argv)
+    print(f"{'operation':<32} {'resource':<24} {'calls':>6} {'total ms':>10} {'max ms':>8}")
+    for (name, resource), entry in sorted(totals.items(), key=lambda kv: -kv[1]['total_ms']):
+        print(f"{name:<32} {resource:<24} {entry['calls']:>6} {entry['total_ms']:>10.1f} {entry['max_ms']:>8.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
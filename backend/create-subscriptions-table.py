@@ -4,16 +4,17 @@ Script to create the Subscriptions DynamoDB table
 Run this script to ensure the Subscriptions table exists with proper configuration
 """
 
-import boto3
 import json
 import sys
 from botocore.exceptions import ClientError
 
+import aws_clients
+
 def create_subscriptions_table():
     """Create the Subscriptions DynamoDB table"""
     
     # Initialize DynamoDB client
-    dynamodb = boto3.resource('dynamodb')
+    dynamodb = aws_clients.resource('dynamodb')
     
     # Table configuration
     table_name = 'Subscriptions'
@@ -0,0 +1,84 @@
+"""
+Sampled, sanitized recording of the API Gateway events the gallery manager serves.
+
+With RECORD_EVENTS_RATE > 0 that fraction of API requests is written to the
+function's log as one JSON line, {"recordedEvent": {...}}, holding the method,
+path, query parameters and parsed body. Headers and request context are not
+kept; image payloads are replaced by their size ("<image:123456>"), device IDs
+by a stable hash and e-mail addresses are masked. replay_events.py reads these
+lines back from exported logs and replays them locally.
+
+    RECORD_EVENTS_RATE   fraction of API requests recorded (default 0, off)
+"""
+import hashlib
+import json
+import os
+import random
+from datetime import datetime
+
+from log_redaction import mask_email
+
+RECORD_EVENTS_RATE = float(os.getenv('RECORD_EVENTS_RATE', '0'))
+RECORD_FORMAT_VERSION = 1
+MAX_RAW_BODY = 1024
+
+_IMAGE_KEYS = {'image', 'imagedata', 'thumbnaildata'}
+
+
+def image_placeholder(size):
+    return f"<image:{size}>"
+
+
+def pseudonymize(value):
+    """Stable, non-reversible stand-in for an identifier of a person or device"""
+    return 'anon-' + hashlib.sha256(str(value).encode('utf-8')).hexdigest()[:16]
+
+
+def sanitize(value, key=None):
+    """Copy of a request body with images, device IDs and e-mail addresses removed"""
+    name = (key or '').lower()
+    if isinstance(value, dict):
+        return {k: sanitize(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [sanitize(v, key) for v in value]
+    if isinstance(value, str):
+        if name in _IMAGE_KEYS:
+            # Base64 (optionally a data URL): 3 bytes per 4 characters
+            payload = value.split(',', 1)[1] if value.startswith('data:') and ',' in value else value
+            return image_placeholder(len(payload) * 3 // 4)
+        if name in ('deviceid', 'userid', 'email'):
+            return pseudonymize(value) if name != 'email' else mask_email(value)
+        return mask_email(value)
+    return value
+
+
+def recorded_event(event, now=None):
+    """The sanitized record of an API Gateway event"""
+    raw_body = event.get('body') or None
+    body = None
+    record = {
+        'v': RECORD_FORMAT_VERSION,
+        'at': now or datetime.utcnow().isoformat() + 'Z',
+        'method': event.get('httpMethod', 'GET'),
+        'path': event.get('path', ''),
+        'query': sanitize(event.get('queryStringParameters') or {}),
+        'bodyBytes': len(raw_body) if raw_body else 0,
+    }
+    if raw_body:
+        try:
+            body = sanitize(json.loads(raw_body))
+        except ValueError:
+            record['rawBody'] = mask_email(raw_body[:MAX_RAW_BODY])
+    record['body'] = body
+    return record
+
+
+def maybe_record(event):
+    """Log a sampled API request as a recordedEvent line; returns True when it was recorded"""
+    if RECORD_EVENTS_RATE <= 0 or 'httpMethod' not in event or event.get('httpMethod') == 'OPTIONS':
+        return False
+    if random.random() >= RECORD_EVENTS_RATE:
+        return False
+    # A bare JSON line, like the EMF records, so it can be filtered and exported as is
+    print(json.dumps({'recordedEvent': recorded_event(event)}, separators=(',', ':'), default=str), flush=True)
+    return True
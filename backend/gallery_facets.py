@@ -0,0 +1,175 @@
+"""
+Filtered, paginated gallery listings: GET /galleries?continent=&country=&year=&limit=&continuationToken=
+
+Galleries matching a filter are found through indexes instead of a table scan:
+
+    listOrder-index   GSI on Galleries, listed (HASH) + listKey (RANGE): every listed gallery
+                      under one key, sorted in list order; sparse, galleries being deleted drop out
+    country-index     GSI on Galleries, country (HASH)
+    continent-index   GSI on Galleries, continent (HASH)
+    GalleryYears      year (HASH) + galleryId (RANGE), one item per year a gallery covers;
+                      DynamoDB cannot index list elements, so the handlers maintain it
+
+An unfiltered page is one Query of listOrder-index after the previous page's
+listKey, so it reads the page and nothing else. The filter GSIs project only
+what ordering and filtering need (ORDER_ATTRIBUTES), and year members are read
+with BatchGetItem projected the same way, so a filter reads small entries; the
+full items of the requested page are fetched last. listOrder-index also
+projects what the filters and the map show (LIST_ATTRIBUTES), so the facets
+and the map are one Query of it each.
+
+Pages follow the unfiltered list's order (sortOrder, then createdAt) and
+resume after the last gallery of the previous page, named by an opaque
+continuationToken, so galleries added or removed in between do not shift or
+repeat later pages.
+"""
+import base64
+import binascii
+import json
+import re
+from collections import Counter
+
+FILTER_PARAMS = ('continent', 'country', 'year')
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+# Attributes the filter indexes project besides the keys
+ORDER_ATTRIBUTES = ['galleryId', 'continent', 'country', 'sortOrder', 'createdAt', 'deletionStatus']
+# Attributes listOrder-index projects: ordering, facets and the map markers
+LIST_ATTRIBUTES = ['galleryId', 'name', 'continent', 'country', 'years', 'sortOrder', 'createdAt',
+                   'photoCount', 'coverPhotoURL', 'latitude', 'longitude']
+# Partition key value of every listed gallery in listOrder-index
+LISTED = 'gallery'
+
+_YEAR_RE = re.compile(r'^\d{4}$')
+
+
+class FilterError(ValueError):
+    """Invalid filter, page size or continuation token"""
+
+
+def is_filtered(query_params):
+    """True when a GET /galleries request asks for a filtered or paginated listing"""
+    return any(query_params.get(name) for name in FILTER_PARAMS + ('limit', 'continuationToken'))
+
+
+def gallery_years(item):
+    """
+    Years a gallery is listed under: its years, or the year it was created when it has none
+    (galleries created by a resync), as the homepage has always shown them
+    """
+    years = [str(year).strip() for year in item.get('years') or []]
+    years = [year for year in years if _YEAR_RE.match(year)]
+    if not years and str(item.get('createdAt', ''))[:4].isdigit():
+        years = [str(item['createdAt'])[:4]]
+    return sorted(set(years))
+
+
+def parse_filters(query_params):
+    """{'continent', 'country', 'year'} present in the query; raises FilterError"""
+    filters = {name: str(query_params[name]).strip() for name in FILTER_PARAMS
+               if query_params.get(name) and str(query_params[name]).strip()}
+    if 'year' in filters and not _YEAR_RE.match(filters['year']):
+        raise FilterError(f"Invalid year: {filters['year']}")
+    return filters
+
+
+def page_size(value):
+    if value in (None, ''):
+        return DEFAULT_PAGE_SIZE
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        raise FilterError(f"Invalid limit: {value}")
+    return max(1, min(MAX_PAGE_SIZE, size))
+
+
+def order_key(entry):
+    sort_order = entry.get('sortOrder')
+    return (float(sort_order) if sort_order is not None else float('inf'),
+            str(entry.get('createdAt', '')), str(entry['galleryId']))
+
+
+def list_key(entry):
+    """
+    listOrder-index sort key of a gallery: its order_key as a string that sorts the same way
+    (zero-padded sortOrder, or '~' after every number when it has none, then createdAt and galleryId)
+    """
+    return _list_key(order_key(entry))
+
+
+def _list_key(key):
+    sort_order, created_at, gallery_id = key
+    prefix = '~' if sort_order == float('inf') else f"{max(sort_order, 0):020.6f}"
+    return f"{prefix}#{created_at}#{gallery_id}"
+
+
+def list_index_fields(item):
+    """Attributes that put a gallery into listOrder-index"""
+    return {'listed': LISTED, 'listKey': list_key(item)}
+
+
+def token_list_key(token):
+    """listKey of the gallery a continuationToken resumes after; raises FilterError"""
+    return _list_key(decode_token(token))
+
+
+def encode_token(entry):
+    sort_order, created_at, gallery_id = order_key(entry)
+    raw = json.dumps([None if sort_order == float('inf') else sort_order, created_at, gallery_id])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_token(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        sort_order, created_at, gallery_id = json.loads(raw)
+        return (float(sort_order) if sort_order is not None else float('inf'), str(created_at), str(gallery_id))
+    except (binascii.Error, ValueError, TypeError):
+        raise FilterError('Invalid continuationToken')
+
+
+def matches(entry, filters):
+    """Whether an index entry passes the continent and country filters and is not being deleted"""
+    if entry.get('deletionStatus'):
+        return False
+    return all(entry.get(name) == filters[name] for name in ('continent', 'country') if name in filters)
+
+
+def select_page(entries, filters, limit, token=None):
+    """
+    The page of matching entries after token, in list order.
+    Returns (page entries, continuationToken of the next page or None, total matches).
+    """
+    ordered = sorted((entry for entry in entries if matches(entry, filters)), key=order_key)
+    start = 0
+    if token:
+        after = decode_token(token)
+        start = next((i for i, entry in enumerate(ordered) if order_key(entry) > after), len(ordered))
+    page = ordered[start:start + limit]
+    next_token = encode_token(page[-1]) if page and start + limit < len(ordered) else None
+    return page, next_token, len(ordered)
+
+
+def summarize_facets(entries):
+    """
+    Filter options with counts: years (newest first) and continents with their countries.
+    entries are the listOrder-index entries of every listed gallery. Galleries without a
+    continent or country count towards the total and their years only, since no filter finds them.
+    """
+    live = [entry for entry in entries if not entry.get('deletionStatus')]
+    years = Counter(year for entry in live for year in gallery_years(entry))
+    continents = Counter(entry['continent'] for entry in live if entry.get('continent'))
+    countries = {}
+    for entry in live:
+        if entry.get('continent') and entry.get('country'):
+            countries.setdefault(entry['continent'], Counter())[entry['country']] += 1
+    return {
+        'total': len(live),
+        'years': [{'year': year, 'count': count} for year, count in sorted(years.items(), reverse=True)],
+        'continents': [
+            {'continent': name, 'count': count,
+             'countries': [{'country': country, 'count': n}
+                           for country, n in sorted(countries.get(name, Counter()).items())]}
+            for name, count in sorted(continents.items())
+        ],
+    }
@@ -0,0 +1,164 @@
+"""
+Streaming view of the gallery folders of the bucket.
+
+Galleries live either in the legacy path layout (galleries/continent/country/name/)
+or in the immutable ID layout (gallery-data/<galleryId>/). list_objects_v2 returns
+keys in UTF-8 byte order, so every gallery folder comes out as one contiguous run of keys.
+The helpers here consume the listing as a generator and reduce each run to a
+small slotted summary, so memory is bounded by the largest single gallery
+rather than by the size of the bucket.
+"""
+GALLERY_PREFIX = 'galleries/'
+ID_LAYOUT_PREFIX = 'gallery-data/'
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.avif', '.tiff', '.bmp')
+
+
+def gallery_path_of(key):
+    """
+    Return the gallery folder a key belongs to (galleries/continent/country/name/ or
+    gallery-data/<galleryId>/), or None
+    """
+    parts = key.split('/')
+    if parts[0] + '/' == GALLERY_PREFIX and len(parts) >= 5:
+        return '/'.join(parts[:4]) + '/'
+    if parts[0] + '/' == ID_LAYOUT_PREFIX and len(parts) >= 3 and parts[1]:
+        return '/'.join(parts[:2]) + '/'
+    return None
+
+
+def id_layout_photo_id(key):
+    """
+    photoId an ID-layout original is named after (gallery-data/<galleryId>/<photoId>.<ext>), or None
+    for legacy keys and for keys below the gallery folder (thumbnails/...)
+    """
+    parts = key.split('/')
+    if parts[0] + '/' != ID_LAYOUT_PREFIX or len(parts) != 3 or not parts[1]:
+        return None
+    return parts[2].rsplit('.', 1)[0] or None
+
+
+def iter_s3_objects(s3_client, bucket, prefix=GALLERY_PREFIX, start_after=None):
+    """
+    Yield listed objects page by page without accumulating the listing
+    """
+    params = {'Bucket': bucket, 'Prefix': prefix}
+    if start_after:
+        params['StartAfter'] = start_after
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(**params):
+        for obj in page.get('Contents', []):
+            yield obj
+
+
+def iter_gallery_runs(objects):
+    """
+    Group a key-ordered object stream into (gallery_path, [objects]) runs
+    """
+    current_path = None
+    run = []
+    for obj in objects:
+        path = gallery_path_of(obj['Key'])
+        if path is None:
+            continue
+        if path != current_path:
+            if run:
+                yield current_path, run
+            current_path, run = path, []
+        run.append(obj)
+    if run:
+        yield current_path, run
+
+
+def thumbnail_stem(filename):
+    """
+    Normalize an original or thumbnail filename to the stem they share
+    (photo.webp, photo_thumb.webp and photo.jpg all map to 'photo')
+    """
+    stem = filename.rsplit('.', 1)[0]
+    if stem.endswith('_thumb'):
+        stem = stem[:-len('_thumb')]
+    return stem
+
+
+def index_thumbnails(objects):
+    """
+    Index the thumbnails/ keys of one gallery run by filename stem
+    """
+    thumbnails_by_stem = {}
+    for obj in objects:
+        key = obj['Key']
+        if '/thumbnails/' in key and not key.endswith('/'):
+            thumbnails_by_stem.setdefault(thumbnail_stem(key.split('/')[-1]), []).append(key)
+    return thumbnails_by_stem
+
+
+def resolve_thumbnail_key(s3_key, thumbnails_by_stem):
+    """
+    Find the thumbnail key for an original among the listed thumbnails of its gallery.
+    Prefers the original's extension, then JPEG (upload_photos), then anything else.
+    """
+    filename = s3_key.split('/')[-1]
+    candidates = thumbnails_by_stem.get(thumbnail_stem(filename))
+    if not candidates:
+        return None
+    original_extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+
+    def rank(key):
+        extension = key.rsplit('.', 1)[-1].lower()
+        if extension == original_extension:
+            return (0, key)
+        return (1 if extension in ('jpg', 'jpeg') else 2, key)
+
+    return min(candidates, key=rank)
+
+
+class GalleryFolderSummary:
+    """
+    What gallery reconciliation needs to know about one S3 folder: its path parts,
+    how many files it holds and which photo (and thumbnail) to use as the cover.
+    """
+    __slots__ = ('gallery_path', 'continent', 'country', 'name', 'photo_count',
+                 'object_count', 'cover_key', 'cover_thumbnail_key')
+
+    def __init__(self, gallery_path):
+        path_parts = gallery_path.split('/')
+        self.gallery_path = gallery_path
+        self.continent = path_parts[1]
+        self.country = path_parts[2]
+        self.name = path_parts[3]
+        self.photo_count = 0
+        self.object_count = 0
+        self.cover_key = None
+        self.cover_thumbnail_key = None
+
+    def __repr__(self):
+        return (f"GalleryFolderSummary({self.gallery_path!r}, photo_count={self.photo_count}, "
+                f"cover_key={self.cover_key!r}, cover_thumbnail_key={self.cover_thumbnail_key!r})")
+
+
+def summarize_gallery_run(gallery_path, objects):
+    """
+    Reduce the listed objects of one gallery folder to a GalleryFolderSummary.
+    Folder placeholders and .json metadata are ignored; files outside thumbnails/ count as photos
+    and the first image in key order becomes the cover.
+    """
+    summary = GalleryFolderSummary(gallery_path)
+    for obj in objects:
+        key = obj['Key']
+        summary.object_count += 1
+        if key.endswith('/') or key.endswith('.json') or '/thumbnails/' in key:
+            continue
+        summary.photo_count += 1
+        if key.lower().endswith(IMAGE_EXTENSIONS) and (summary.cover_key is None or key < summary.cover_key):
+            summary.cover_key = key
+    if summary.cover_key:
+        summary.cover_thumbnail_key = resolve_thumbnail_key(summary.cover_key, index_thumbnails(objects))
+    return summary
+
+
+def iter_gallery_summaries(objects):
+    """
+    Stream GalleryFolderSummary records, one per gallery folder, from a key-ordered object stream
+    """
+    for gallery_path, run in iter_gallery_runs(objects):
+        yield summarize_gallery_run(gallery_path, run)
@@ -0,0 +1,387 @@
+"""
+Gallery geocoding with layered lookups.
+
+A place (gallery name + country) is resolved from the cheapest source that knows it:
+
+    1. a bounded in-process LRU
+    2. a durable cache table shared by every container (GeocodeCache, placeKey HASH)
+    3. an optional offline gazetteer: a GeoNames extract loaded with a prefix index
+    4. Nominatim, over one pooled keep-alive HTTP session, at most one request a second
+
+Nominatim answers are written to the durable table, including "not found" (with
+an expiry so the place is retried eventually), so a place normally goes over the
+network once across all containers and cold starts. Network failures are not
+cached; they raise GeocodeUnavailable so callers can retry later.
+"""
+import bisect
+import gzip
+import io
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import unicodedata
+import urllib.parse
+import zipfile
+from collections import OrderedDict
+from datetime import datetime
+from decimal import Decimal
+
+logger = logging.getLogger(__name__)
+
+NOMINATIM_URL = 'https://nominatim.openstreetmap.org/search'
+USER_AGENT = 'my-photo-app/1.0 (contact@example.com)'
+NOMINATIM_MIN_INTERVAL = 1.0  # Nominatim usage policy: at most one request per second
+NEGATIVE_CACHE_SECONDS = 30 * 24 * 3600
+PREFIX_SCAN_LIMIT = 200  # Gazetteer names examined per prefix lookup
+MIN_PREFIX_LENGTH = 4
+
+_MISSING = object()
+
+# GeoNames main table columns (geoname tab-separated dump, e.g. cities15000.txt)
+_GEONAMES_NAME = 1
+_GEONAMES_ASCII_NAME = 2
+_GEONAMES_ALTERNATE_NAMES = 3
+_GEONAMES_LATITUDE = 4
+_GEONAMES_LONGITUDE = 5
+_GEONAMES_COUNTRY = 8
+_GEONAMES_POPULATION = 14
+
+
+class GeocodeUnavailable(Exception):
+    """Raised when the network geocoder fails transiently (timeout, 429, 5xx)"""
+
+
+def normalize_place(text):
+    """Lowercase, strip accents and collapse punctuation so 'Reykjavík ' matches 'reykjavik'"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return re.sub(r'[^0-9a-z]+', ' ', text.lower()).strip()
+
+
+def place_key(name, country=None):
+    """Cache key of a place"""
+    return f"{normalize_place(name)}|{normalize_place(country)}"
+
+
+class LRUCache:
+    """
+    Thread-safe mapping that keeps at most maxsize entries, evicting the least recently used
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=_MISSING):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class GeocodeCacheTable:
+    """
+    Durable geocoding results in DynamoDB: placeKey (HASH), latitude, longitude, found, source,
+    cachedAt and expiresAt (epoch seconds, the table's TTL attribute) on not-found entries.
+    get_table is called for every access so callers can hand out per-thread Table objects.
+    A missing or failing table only costs a warning; lookups fall through to the next source.
+    """
+
+    def __init__(self, get_table, negative_ttl=NEGATIVE_CACHE_SECONDS):
+        self.get_table = get_table
+        self.negative_ttl = negative_ttl
+
+    def get(self, key):
+        """(lat, lon), None for a cached miss, or _MISSING when the place is unknown"""
+        try:
+            item = self.get_table().get_item(Key={'placeKey': key}).get('Item')
+        except Exception as e:
+            logger.warning(f"Geocode cache read failed for {key}: {e}")
+            return _MISSING
+        if not item:
+            return _MISSING
+        if not item.get('found'):
+            # TTL deletion is lazy; treat expired misses as unknown
+            if int(item.get('expiresAt', 0)) < time.time():
+                return _MISSING
+            return None
+        return Decimal(str(item['latitude'])), Decimal(str(item['longitude']))
+
+    def put(self, key, latlon, source):
+        item = {'placeKey': key, 'found': latlon is not None, 'source': source,
+                'cachedAt': datetime.utcnow().isoformat() + 'Z'}
+        if latlon is not None:
+            item['latitude'], item['longitude'] = latlon
+        else:
+            item['expiresAt'] = int(time.time() + self.negative_ttl)
+        try:
+            self.get_table().put_item(Item=item)
+        except Exception as e:
+            logger.warning(f"Geocode cache write failed for {key}: {e}")
+
+
+class Gazetteer:
+    """
+    Offline place lookup over a GeoNames extract (cities15000.txt and friends), optionally
+    with countryInfo.txt next to it to map country names to ISO codes.
+    Names (and ASCII / alternate names) are indexed in a dict for exact matches and in a sorted
+    list for prefix matches; among several candidates the most populous one in the country wins.
+    """
+
+    def __init__(self, include_alternate_names=True):
+        self.include_alternate_names = include_alternate_names
+        self.places = {}         # normalized name -> [(population, lat, lon, country code)]
+        self.sorted_names = []
+        self.countries = {}      # normalized country name / ISO / ISO3 -> ISO code
+
+    @classmethod
+    def load(cls, source, s3_client=None, **kwargs):
+        """Load from a local path or an s3://bucket/key URI (.txt, .txt.gz or .zip)"""
+        gazetteer = cls(**kwargs)
+        path = gazetteer._fetch(source, s3_client)
+        gazetteer.load_places(path)
+        country_info = os.path.join(os.path.dirname(path), 'countryInfo.txt')
+        if os.path.isfile(country_info):
+            gazetteer.load_countries(country_info)
+        logger.info(f"Loaded gazetteer {source}: {len(gazetteer.sorted_names)} names, "
+                    f"{len(gazetteer.countries)} country aliases")
+        return gazetteer
+
+    @staticmethod
+    def _fetch(source, s3_client):
+        if not source.startswith('s3://'):
+            return source
+        if s3_client is None:
+            raise ValueError("An S3 client is needed to load a gazetteer from S3")
+        bucket, key = source[len('s3://'):].split('/', 1)
+        local_dir = os.path.join(tempfile.gettempdir(), 'gazetteer')
+        os.makedirs(local_dir, exist_ok=True)
+        path = os.path.join(local_dir, os.path.basename(key))
+        # /tmp survives warm starts, so the extract is downloaded once per container
+        if not os.path.isfile(path):
+            s3_client.download_file(bucket, key, path)
+            country_key = key.rsplit('/', 1)[0] + '/countryInfo.txt' if '/' in key else 'countryInfo.txt'
+            try:
+                s3_client.download_file(bucket, country_key, os.path.join(local_dir, 'countryInfo.txt'))
+            except Exception:
+                logger.info(f"No countryInfo.txt next to {source}; country names will not be resolved")
+        return path
+
+    @staticmethod
+    def _open_lines(path):
+        if path.endswith('.zip'):
+            archive = zipfile.ZipFile(path)
+            member = next(name for name in archive.namelist() if name.endswith('.txt'))
+            return io.TextIOWrapper(archive.open(member), encoding='utf-8')
+        if path.endswith('.gz'):
+            return gzip.open(path, 'rt', encoding='utf-8')
+        return open(path, 'r', encoding='utf-8')
+
+    def load_places(self, path):
+        with self._open_lines(path) as lines:
+            for line in lines:
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) <= _GEONAMES_POPULATION:
+                    continue
+                try:
+                    entry = (int(fields[_GEONAMES_POPULATION] or 0), fields[_GEONAMES_LATITUDE],
+                             fields[_GEONAMES_LONGITUDE], fields[_GEONAMES_COUNTRY])
+                except ValueError:
+                    continue
+                names = {fields[_GEONAMES_NAME], fields[_GEONAMES_ASCII_NAME]}
+                if self.include_alternate_names and fields[_GEONAMES_ALTERNATE_NAMES]:
+                    names.update(fields[_GEONAMES_ALTERNATE_NAMES].split(','))
+                for name in {normalize_place(name) for name in names}:
+                    if name:
+                        self.places.setdefault(name, []).append(entry)
+        self.sorted_names = sorted(self.places)
+
+    def load_countries(self, path):
+        with open(path, 'r', encoding='utf-8') as lines:
+            for line in lines:
+                if line.startswith('#'):
+                    continue
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) < 5:
+                    continue
+                iso = fields[0]
+                for alias in (fields[0], fields[1], fields[4]):
+                    if alias:
+                        self.countries[normalize_place(alias)] = iso
+
+    def country_code(self, country):
+        normalized = normalize_place(country)
+        if not normalized:
+            return None
+        if normalized in self.countries:
+            return self.countries[normalized]
+        return normalized.upper() if len(normalized) == 2 else None
+
+    def _best(self, entries, code):
+        if code:
+            entries = [entry for entry in entries if entry[3] == code]
+        if not entries:
+            return None
+        _, lat, lon, _ = max(entries, key=lambda entry: entry[0])
+        return Decimal(lat), Decimal(lon)
+
+    def lookup(self, name, country=None):
+        """(lat, lon) of the best match for a gallery name, or None"""
+        query = normalize_place(name)
+        if not query:
+            return None
+        code = self.country_code(country)
+
+        # Exact name, then the longest leading run of words that is a place ("Lake Bled Autumn")
+        words = query.split(' ')
+        for end in range(len(words), 0, -1):
+            candidate = ' '.join(words[:end])
+            if end < len(words) and len(candidate) < MIN_PREFIX_LENGTH:
+                break
+            match = self._best(self.places.get(candidate, []), code)
+            if match:
+                return match
+
+        # Places whose name starts with the query ("Reykjav" -> Reykjavik)
+        if len(query) < MIN_PREFIX_LENGTH:
+            return None
+        entries = []
+        start = bisect.bisect_left(self.sorted_names, query)
+        for candidate in self.sorted_names[start:start + PREFIX_SCAN_LIMIT]:
+            if not candidate.startswith(query):
+                break
+            entries.extend(self.places[candidate])
+        return self._best(entries, code)
+
+
+class NominatimClient:
+    """
+    Nominatim search over one keep-alive session (requests from the Lambda layer, urllib otherwise),
+    serialized to one request per min_interval seconds across threads
+    """
+
+    def __init__(self, user_agent=USER_AGENT, timeout=10, min_interval=NOMINATIM_MIN_INTERVAL):
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self.min_interval = min_interval
+        self._session = None
+        self._lock = threading.Lock()
+        self._last_request = 0.0
+
+    @property
+    def session(self):
+        if self._session is None:
+            try:
+                import requests
+                from requests.adapters import HTTPAdapter
+            except ImportError:
+                logger.warning("requests is not available, geocoding without connection reuse")
+                self._session = False
+            else:
+                session = requests.Session()
+                session.headers['User-Agent'] = self.user_agent
+                session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=4))
+                self._session = session
+        return self._session
+
+    def _get(self, params):
+        if self.session:
+            resp = self.session.get(NOMINATIM_URL, params=params, timeout=self.timeout)
+            if resp.status_code == 429 or resp.status_code >= 500:
+                raise GeocodeUnavailable(f"Nominatim returned HTTP {resp.status_code}")
+            resp.raise_for_status()
+            return resp.json()
+        import urllib.request
+        request = urllib.request.Request(f"{NOMINATIM_URL}?{urllib.parse.urlencode(params)}",
+                                         headers={'User-Agent': self.user_agent})
+        with urllib.request.urlopen(request, timeout=self.timeout) as resp:
+            return json.loads(resp.read().decode('utf-8'))
+
+    def search(self, query):
+        """(lat, lon) of the first result, None when Nominatim has no match"""
+        with self._lock:
+            wait = self.min_interval - (time.time() - self._last_request)
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                data = self._get({'q': query, 'format': 'json', 'limit': 1})
+            except GeocodeUnavailable:
+                raise
+            except Exception as e:
+                raise GeocodeUnavailable(f"Nominatim request failed for '{query}': {e}")
+            finally:
+                self._last_request = time.time()
+        if not data:
+            return None
+        return Decimal(str(data[0]['lat'])), Decimal(str(data[0]['lon']))
+
+
+class Geocoder:
+    """
+    Resolve gallery places through the LRU, durable cache, gazetteer and Nominatim in turn.
+    stats counts where each lookup was answered.
+    """
+
+    def __init__(self, cache_size=1024, cache_table=None, gazetteer=None, nominatim=None):
+        self.lru = LRUCache(cache_size)
+        self.cache_table = cache_table
+        self.gazetteer = gazetteer
+        self.nominatim = nominatim
+        self.stats = {'lru': 0, 'table': 0, 'gazetteer': 0, 'nominatim': 0}
+
+    def geocode(self, name, country=None, network=True):
+        """
+        (lat, lon) as Decimals, or None if the place is unknown.
+        Raises GeocodeUnavailable if only the network could answer and it failed,
+        or was not to be used (network=False).
+        """
+        if not (name or '').strip():
+            return None
+        key = place_key(name, country)
+
+        latlon = self.lru.get(key)
+        if latlon is not _MISSING:
+            self.stats['lru'] += 1
+            return latlon
+
+        if self.cache_table is not None:
+            latlon = self.cache_table.get(key)
+            if latlon is not _MISSING:
+                self.stats['table'] += 1
+                self.lru.put(key, latlon)
+                return latlon
+
+        if self.gazetteer is not None:
+            latlon = self.gazetteer.lookup(name, country)
+            if latlon is not None:
+                self.stats['gazetteer'] += 1
+                self.lru.put(key, latlon)
+                return latlon
+
+        if self.nominatim is None:
+            return None
+        if not network:
+            raise GeocodeUnavailable(f"'{key}' is not cached and network lookups are disabled")
+        query = f"{name.strip()}, {country.strip()}" if (country or '').strip() else name.strip()
+        latlon = self.nominatim.search(query)
+        self.stats['nominatim'] += 1
+        self.lru.put(key, latlon)
+        if self.cache_table is not None:
+            self.cache_table.put(key, latlon, 'nominatim')
+        return latlon
@@ -0,0 +1,376 @@
+"""
+End-to-end benchmark of the gallery manager handler against in-memory AWS fakes.
+
+A synthetic catalog (galleries, photos, their S3 originals and thumbnails,
+path and year index entries and ratings) is loaded into aws_fakes, lambda_handler is
+called with API Gateway events for each scenario, and every scenario reports:
+
+    latency_ms   median and p95 handler time over --runs calls (injected latency included)
+    aws_calls    AWS calls of one call by operation, from its request_metrics record
+    capacity     consumed read / write capacity units of one call
+    peak_mb      peak Python memory allocated during one call (tracemalloc, separate run)
+
+The store is reset to the catalog before every call, so mutating scenarios
+(upload, rename, resync, delete, sort) do the same work each time. The catalog
+includes a photo sync checkpoint that misses the last upload, so the incremental
+resync finds one changed gallery. No AWS account or
+network access is used.
+
+    python handler_benchmark.py [--galleries 500] [--photos 50000] [--runs 5]
+                                [--latency dynamodb=4,s3=15,s3.PutObject=40]
+                                [--only list,get,upload] [--json]
+"""
+import argparse
+import base64
+import importlib
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+import uuid
+import zlib
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+# The handler module reads these at import time
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-north-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'benchmark')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'benchmark')
+os.environ['METRICS_SINK'] = 'memory'
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('GAZETTEER_SOURCE', '')
+
+import aws_fakes  # noqa: E402
+from boto3.dynamodb.types import Binary  # noqa: E402
+import gallery_facets  # noqa: E402
+from gallery_listing import gallery_path_of  # noqa: E402
+
+BUCKET = 'haophotography'
+BASE_URL = f"https://{BUCKET}.s3.eu-north-1.amazonaws.com"
+PLACES = [
+    ('Europe', 'Norway'), ('Europe', 'Italy'), ('Europe', 'Iceland'), ('Asia', 'Japan'),
+    ('Asia', 'Vietnam'), ('North America', 'Canada'), ('South America', 'Chile'),
+    ('Africa', 'Namibia'), ('Oceania', 'New Zealand'), ('Antarctica', 'Antarctica'),
+]
+WORDS = ['Fjords', 'Coast', 'Mountains', 'Old Town', 'Lakes', 'Desert', 'Winter', 'Harbour', 'Islands', 'Forest']
+SCENARIOS = ('list', 'page', 'facets', 'map', 'get', 'filter', 'upload', 'rename', 'rename_photos', 'resync',
+             'resync_incremental', 'delete_photos', 'rate', 'sort_galleries', 'sort_photos')
+
+
+def _jpeg(width, height, seed=0):
+    """A JPEG of the given size, noisy enough that encoding and thumbnailing do real work"""
+    from PIL import Image
+    rng = random.Random(seed)
+    image = Image.frombytes('RGB', (width, height), rng.randbytes(width * height * 3))
+    out = io.BytesIO()
+    image.save(out, 'JPEG', quality=85)
+    return out.getvalue()
+
+
+def create_tables(fake):
+    """The tables and indexes of BACKEND_GUIDE.md, under the handler's configured names"""
+    dynamodb = fake.dynamodb
+    dynamodb.create_table(os.getenv('GALLERIES_TABLE', 'Galleries'), 'galleryId', indexes={
+        'geocodeStatus-index': ('geocodeStatus', 'geocodeNextAttemptAt', 'ALL'),
+        # INCLUDE projections in AWS; the fakes project everything
+        'continent-index': ('continent', None, 'ALL'),
+        'country-index': ('country', None, 'ALL'),
+        'listOrder-index': ('listed', 'listKey', 'ALL')})
+    dynamodb.create_table(os.getenv('GALLERY_PHOTOS_TABLE', 'GalleryPhotos'), 'galleryId', 'photoId', indexes={
+        'contentHash-index': ('contentHash', 'galleryId', 'ALL'),
+        's3Key-index': ('s3Key', None, 'KEYS_ONLY'),
+        'photoId-index': ('photoId', None, 'KEYS_ONLY')})
+    dynamodb.create_table(os.getenv('PHOTO_RATINGS_TABLE', 'PhotoRatings'), 'photoId', 'deviceId')
+    dynamodb.create_table(os.getenv('SYNC_STATE_TABLE', 'SyncState'), 'syncId', 'scope')
+    dynamodb.create_table(os.getenv('GALLERY_PATHS_TABLE', 'GalleryPaths'), 's3Prefix')
+    dynamodb.create_table(os.getenv('GALLERY_YEARS_TABLE', 'GalleryYears'), 'year', 'galleryId')
+    dynamodb.create_table(os.getenv('GEOCODE_CACHE_TABLE', 'GeocodeCache'), 'placeKey')
+    fake.s3.create_bucket(BUCKET)
+
+
+def build_catalog(fake, galleries, photos, legacy_share=0.2, seed=7):
+    """
+    Fill the fakes with galleries and photos spread over them. A legacy_share of the galleries
+    use the path layout (galleries/continent/country/name/), the rest the ID layout.
+    Returns a summary naming the galleries and photos the scenarios act on.
+    """
+    rng = random.Random(seed)
+    tables = fake.dynamodb.tables
+    t_galleries = tables[os.getenv('GALLERIES_TABLE', 'Galleries')]
+    t_photos = tables[os.getenv('GALLERY_PHOTOS_TABLE', 'GalleryPhotos')]
+    t_paths = tables[os.getenv('GALLERY_PATHS_TABLE', 'GalleryPaths')]
+    t_ratings = tables[os.getenv('PHOTO_RATINGS_TABLE', 'PhotoRatings')]
+    t_years = tables[os.getenv('GALLERY_YEARS_TABLE', 'GalleryYears')]
+    image = _jpeg(64, 48)
+    thumbnail = _jpeg(32, 24, seed=1)
+    image_size = f"{len(image):.2f} B" if len(image) < 1024 else f"{len(image) / 1024:.2f} KB"
+    started = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    counts = [photos // galleries + (1 if i < photos % galleries else 0) for i in range(galleries)]
+    summary = {'galleries': galleries, 'photos': photos, 'legacy': None, 'id_layout': None, 'galleryIds': [],
+               'years': {}}
+    for index, count in enumerate(counts):
+        gallery_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        continent, country = PLACES[index % len(PLACES)]
+        name = f"{country} {WORDS[index % len(WORDS)]} {index}"
+        legacy = index < galleries * legacy_share
+        prefix = f"galleries/{continent}/{country}/{name}/" if legacy else f"gallery-data/{gallery_id}/"
+        created = (started + timedelta(hours=index)).isoformat().replace('+00:00', 'Z')
+        gallery = {
+            'galleryId': gallery_id, 'name': name, 'continent': continent, 'country': country,
+            'description': f"Synthetic gallery {index}", 'years': [str(2015 + index % 10)],
+            'photoCount': count, 'sortOrder': index + 1, 'createdAt': created, 'updatedAt': created,
+            'latitude': Decimal(str(round(rng.uniform(-60, 70), 4))),
+            'longitude': Decimal(str(round(rng.uniform(-170, 170), 4))),
+        }
+        gallery.update(gallery_facets.list_index_fields(gallery))
+        if not legacy:
+            gallery.update({'storageLayout': 'id', 's3Prefix': prefix})
+        t_paths.put({'s3Prefix': prefix, 'galleryId': gallery_id, 'updatedAt': created})
+
+        photo_ids = []
+        for n in range(count):
+            photo_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+            filename = f"{photo_id}.jpg" if not legacy else f"IMG_{n:05d}.jpg"
+            key, thumb_key = f"{prefix}{filename}", f"{prefix}thumbnails/{filename}"
+            modified = started + timedelta(minutes=index * 1000 + n)
+            fake.s3.put(BUCKET, key, image, 'image/jpeg', last_modified=modified)
+            fake.s3.put(BUCKET, thumb_key, thumbnail, 'image/jpeg', last_modified=modified)
+            t_photos.put({
+                'galleryId': gallery_id, 'photoId': photo_id, 'name': filename.rsplit('.', 1)[0],
+                's3Key': key, 'image': f"{BASE_URL}/{key}", 'thumbnail': f"{BASE_URL}/{thumb_key}",
+                'uploadedAt': created, 'lastModified': modified.isoformat().replace('+00:00', 'Z'),
+                'format': 'JPG', 'contentHash': f"{rng.getrandbits(128):032x}", 'sortOrder': n + 1,
+                # What a resync derives from the listing, so an unchanged catalog resyncs as unchanged
+                'width': 64, 'height': 48, 'dimensions': '64x48', 'hasExif': False, 'fileSize': image_size,
+            })
+            photo_ids.append(photo_id)
+        if photo_ids:
+            gallery['coverPhotoURL'] = f"{BASE_URL}/{prefix}thumbnails/" + (
+                f"{photo_ids[0]}.jpg" if not legacy else 'IMG_00000.jpg')
+        t_galleries.put(gallery)
+        summary['galleryIds'].append(gallery_id)
+        for year in gallery['years']:
+            t_years.put({'year': year, 'galleryId': gallery_id})
+            summary['years'][year] = summary['years'].get(year, 0) + 1
+
+        target = {'galleryId': gallery_id, 'name': name, 'continent': continent, 'country': country,
+                  'years': gallery['years'], 'photoIds': photo_ids, 'prefix': prefix}
+        key = 'legacy' if legacy else 'id_layout'
+        if summary[key] is None or len(photo_ids) > len(summary[key]['photoIds']):
+            summary[key] = target
+
+    rated = (summary['id_layout'] or summary['legacy'])['photoIds'][:1]
+    for photo_id in rated:
+        for device in range(25):
+            t_ratings.put({'photoId': photo_id, 'deviceId': f"device-{device}", 'rating': 1 + device % 5,
+                           'createdAt': '2024-01-01T00:00:00Z', 'updatedAt': '2024-01-01T00:00:00Z'})
+
+    # The photo sync checkpoint as of before the target's last upload, which an incremental resync picks up
+    target = summary['id_layout'] or summary['legacy']
+    last = target['photoIds'][-1:]
+    unsynced = set()
+    if last:
+        record = t_photos.items[t_photos.primary_key({'galleryId': target['galleryId'], 'photoId': last[0]})]
+        unsynced = {record['s3Key'], f"{target['prefix']}thumbnails/{record['s3Key'].rsplit('/', 1)[1]}"}
+    record_photo_checkpoint(fake, skip=unsynced)
+    summary['unsynced'] = len(unsynced)
+    return summary
+
+
+def record_photo_checkpoint(fake, skip=()):
+    """
+    Store the photo sync checkpoint an incremental resync leaves behind for the bucket as it is,
+    without the keys in skip (objects uploaded since)
+    """
+    t_sync = fake.dynamodb.tables[os.getenv('SYNC_STATE_TABLE', 'SyncState')]
+    etags = {}
+    for key, obj in fake.s3.buckets[BUCKET].items():
+        gallery_path = gallery_path_of(key)
+        if gallery_path and key not in skip:
+            etags.setdefault(gallery_path, {})[key[len(gallery_path):]] = obj['ETag']
+    for gallery_path, gallery_etags in etags.items():
+        t_sync.put({'syncId': 'photos', 'scope': gallery_path, 'objectCount': len(gallery_etags),
+                    'etags': Binary(zlib.compress(json.dumps(gallery_etags, separators=(',', ':')).encode('utf-8'))),
+                    'updatedAt': '2024-06-01T00:00:00Z'})
+    t_sync.put({'syncId': 'photos', 'scope': '#checkpoint', 'watermark': '2024-06-01T00:00:00+00:00',
+                'lastCompletedAt': '2024-06-01T00:00:00Z', 'updatedAt': '2024-06-01T00:00:00Z'})
+
+
+def _event(method, query=None, body=None):
+    return {'httpMethod': method, 'path': '/galleries', 'queryStringParameters': query,
+            'body': json.dumps(body) if body is not None else None}
+
+
+def scenario_events(catalog, upload_photos=3, upload_size=(1024, 768)):
+    """name -> API Gateway event of each scenario"""
+    target = catalog['id_layout'] or catalog['legacy']
+    moved = catalog['legacy'] or target
+    events = {
+        'list': _event('GET'),
+        'page': _event('GET', {'limit': '24'}),
+        'facets': _event('GET', {'action': 'gallery_facets'}),
+        'map': _event('GET', {'action': 'gallery_map'}),
+        'get': _event('GET', {'id': target['galleryId']}),
+        'filter': _event('GET', {'year': target['years'][0], 'continent': target['continent'], 'limit': '24'}),
+        'rename': _event('PUT', body={
+            'id': moved['galleryId'], 'name': moved['name'] + ' (renamed)', 'continent': moved['continent'],
+            'country': moved['country'], 'description': 'Renamed by the benchmark', 'years': ['2024']}),
+        'rename_photos': _event('PUT', body={
+            'id': target['galleryId'], 'name': target['name'], 'continent': target['continent'],
+            'country': target['country'], 'description': 'Photo names updated', 'years': ['2024'],
+            'photos': [{'photoId': photo_id, 'name': f"Renamed {i}"}
+                       for i, photo_id in enumerate(target['photoIds'][:50])]}),
+        'resync': _event('POST', {'action': 'update_GalleryPhotos'}),
+        'resync_incremental': _event('POST', {'action': 'update_GalleryPhotos', 'mode': 'incremental'}),
+        'delete_photos': _event('POST', {'action': 'delete_photos', 'id': target['galleryId']},
+                                {'photoIds': target['photoIds'][:20]}),
+        'rate': _event('POST', {'action': 'rate_photo'},
+                       {'photoId': target['photoIds'][0], 'galleryId': target['galleryId'],
+                        'deviceId': 'benchmark-device', 'rating': 5}),
+        'sort_galleries': _event('POST', {'action': 'update_sort_order'}, {'galleries': [
+            {'galleryId': gallery_id, 'sortOrder': i + 1}
+            for i, gallery_id in enumerate(reversed(catalog['galleryIds']))]}),
+        'sort_photos': _event('POST', {'action': 'update_photo_sort_order'}, {
+            'galleryId': target['galleryId'],
+            'photos': [{'photoId': photo_id, 'sortOrder': i + 1}
+                       for i, photo_id in enumerate(reversed(target['photoIds']))]}),
+    }
+    try:
+        images = [_jpeg(*upload_size, seed=100 + i) for i in range(upload_photos)]
+    except ImportError:
+        images = None
+    if images:
+        events['upload'] = _event('POST', {'action': 'upload_photos', 'id': target['galleryId']}, {'photos': [
+            {'filename': f"benchmark-{i}.jpg", 'contentType': 'image/jpeg',
+             'image': 'data:image/jpeg;base64,' + base64.b64encode(data).decode('ascii')}
+            for i, data in enumerate(images)]})
+    return {name: events[name] for name in SCENARIOS if name in events}
+
+
+class FakeContext:
+    """The parts of the Lambda context the handlers use"""
+    invoked_function_arn = 'arn:aws:lambda:eu-north-1:000000000000:function:gallery-manager'
+    function_name = 'gallery-manager'
+
+    def __init__(self, timeout_ms=300000):
+        self._deadline = time.monotonic() + timeout_ms / 1000
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_scenario(handler, fake, snapshot, event, runs, sink):
+    """
+    Call the handler runs times on a freshly restored store, plus once under tracemalloc.
+    An untimed first call builds the clients and tables the scenario uses.
+    """
+    latencies, statuses = [], []
+    record = None
+    fake.restore(snapshot)
+    handler(event, FakeContext())
+    for _ in range(runs):
+        fake.restore(snapshot)
+        sink.clear()
+        started = time.perf_counter()
+        response = handler(event, FakeContext())
+        latencies.append((time.perf_counter() - started) * 1000)
+        statuses.append(response.get('statusCode'))
+        record = sink.records[-1] if sink.records else None
+
+    fake.restore(snapshot)
+    tracemalloc.start()
+    try:
+        handler(event, FakeContext())
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'status': statuses[-1],
+        'latency_ms': {'median': statistics.median(latencies), 'p95': _percentile(latencies, 0.95),
+                       'min': min(latencies)},
+        'aws_calls': dict(sorted((record or {}).get('AWSCalls', {}).items())),
+        'capacity': {'read': (record or {}).get('ConsumedReadCapacity', 0),
+                     'write': (record or {}).get('ConsumedWriteCapacity', 0)},
+        'response_bytes': (record or {}).get('ResponseBytes', 0),
+        'peak_mb': peak / (1024 * 1024),
+    }
+
+
+def parse_latency(spec):
+    """'dynamodb=4,s3=15,s3.PutObject=40' -> {'dynamodb': 4.0, ...}"""
+    latency = {}
+    for part in filter(None, (spec or '').split(',')):
+        name, _, ms = part.partition('=')
+        latency[name.strip()] = float(ms)
+    return latency
+
+
+def setup(galleries, photos, latency=None, legacy_share=0.2):
+    """Install the fakes, build the catalog and import the handler; returns (module, fake, catalog)"""
+    fake = aws_fakes.install(aws_fakes.FakeAWS(latency))
+    create_tables(fake)
+    catalog = build_catalog(fake, galleries, photos, legacy_share)
+    module = importlib.import_module('lambda')
+    return module, fake, catalog
+
+
+def run(galleries=500, photos=50000, runs=5, latency=None, only=None, legacy_share=0.2):
+    started = time.perf_counter()
+    module, fake, catalog = setup(galleries, photos, latency, legacy_share)
+    snapshot = fake.snapshot()
+    setup_s = time.perf_counter() - started
+    import request_metrics
+    events = scenario_events(catalog)
+    results = {}
+    for name, event in events.items():
+        if only and name not in only:
+            continue
+        results[name] = run_scenario(module.lambda_handler, fake, snapshot, event, runs, request_metrics.sink)
+    return {'catalog': {'galleries': galleries, 'photos': photos, 'setup_s': round(setup_s, 2)},
+            'latency_injected_ms': fake.latency, 'runs': runs, 'scenarios': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--galleries', type=int, default=500)
+    parser.add_argument('--photos', type=int, default=50000)
+    parser.add_argument('--runs', type=int, default=5, help='timed calls per scenario (median and p95 reported)')
+    parser.add_argument('--latency', default='', help="injected latency in ms, e.g. 'dynamodb=4,s3=15'")
+    parser.add_argument('--legacy-share', type=float, default=0.2, help='fraction of path-layout galleries')
+    parser.add_argument('--only', default='', help=f"comma-separated scenarios ({', '.join(SCENARIOS)})")
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    only = set(filter(None, args.only.split(','))) or None
+    report = run(args.galleries, args.photos, args.runs, parse_latency(args.latency), only, args.legacy_share)
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+        return
+    catalog = report['catalog']
+    print(f"{catalog['galleries']} galleries, {catalog['photos']} photos (built in {catalog['setup_s']} s), "
+          f"{report['runs']} runs, injected latency {report['latency_injected_ms'] or 'none'}")
+    print(f"{'scenario':<18} {'status':>6} {'median ms':>10} {'p95 ms':>9} {'calls':>6} "
+          f"{'RCU':>8} {'WCU':>8} {'peak MB':>8}")
+    for name, result in report['scenarios'].items():
+        calls = sum(result['aws_calls'].values())
+        print(f"{name:<18} {result['status']:>6} {result['latency_ms']['median']:>10.1f} "
+              f"{result['latency_ms']['p95']:>9.1f} {calls:>6} {result['capacity']['read']:>8.1f} "
+              f"{result['capacity']['write']:>8.1f} {result['peak_mb']:>8.1f}")
+        print(f"{'':<18} " + ', '.join(f"{op} x{n}" for op, n in result['aws_calls'].items()))
+
+
+if __name__ == '__main__':
+    main()
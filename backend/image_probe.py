@@ -0,0 +1,493 @@
+"""
+Header-only image probing.
+
+Reads just enough of an image to get its dimensions and the EXIF fields the
+gallery cares about (DateTime / DateTimeOriginal), instead of downloading and
+decoding the whole original. Supports JPEG, PNG, WebP, AVIF/HEIF, TIFF and BMP.
+
+For S3 objects the first PROBE_INITIAL_BYTES are fetched with a ranged GET;
+data that lives further into the file (EXIF at the end of a WebP, an AVIF Exif
+item in mdat, a TIFF IFD written after the pixels) is fetched with further
+small ranged GETs. A full read is only done when the headers cannot be parsed
+within PROBE_MAX_BYTES.
+"""
+import io
+import logging
+import struct
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+PROBE_INITIAL_BYTES = 64 * 1024
+PROBE_MAX_BYTES = 256 * 1024
+
+# EXIF / TIFF tags we decode, by tag id
+EXIF_TAGS = {
+    0x0100: 'ImageWidth',
+    0x0101: 'ImageLength',
+    0x010F: 'Make',
+    0x0110: 'Model',
+    0x0112: 'Orientation',
+    0x0132: 'DateTime',
+    0x9003: 'DateTimeOriginal',
+    0x9004: 'DateTimeDigitized',
+    0xA002: 'ExifImageWidth',
+    0xA003: 'ExifImageHeight',
+}
+_EXIF_IFD_POINTER = 0x8769
+
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+class ProbeBudgetExceeded(Exception):
+    """Raised when parsing needs more bytes than the probe is allowed to fetch"""
+
+
+class _ByteSource:
+    """
+    Random access over an image held partly in memory.
+    Missing ranges are pulled through `fetch(start, end)` (inclusive end, like an HTTP Range)
+    until `max_bytes` have been fetched in total.
+    """
+
+    def __init__(self, data=b'', fetch=None, size=None, chunk=PROBE_INITIAL_BYTES, max_bytes=PROBE_MAX_BYTES):
+        self._segments = [(0, data)] if data else []
+        self._fetch = fetch
+        self.size = size if size is not None else (None if fetch else len(data))
+        self._chunk = chunk
+        self._max_bytes = max_bytes
+        self.bytes_fetched = len(data)
+        self.requests = 0
+
+    def read(self, offset, length):
+        if offset < 0 or length <= 0:
+            return b''
+        if self.size is not None:
+            length = max(0, min(length, self.size - offset))
+            if length == 0:
+                return b''
+        for start, seg in self._segments:
+            if start <= offset and offset + length <= start + len(seg):
+                return seg[offset - start:offset - start + length]
+        if self._fetch is None:
+            # In-memory source: return whatever overlaps
+            for start, seg in self._segments:
+                if start <= offset < start + len(seg):
+                    return seg[offset - start:offset - start + length]
+            return b''
+        want = max(length, self._chunk)
+        if self.size is not None:
+            want = min(want, self.size - offset)
+        if self.bytes_fetched + want > self._max_bytes:
+            want = length
+            if self.bytes_fetched + want > self._max_bytes:
+                raise ProbeBudgetExceeded(f"need bytes {offset}-{offset + length - 1}")
+        data = self._fetch(offset, offset + want - 1)
+        self.requests += 1
+        self.bytes_fetched += len(data)
+        self._segments.append((offset, data))
+        return data[:length]
+
+
+def _u16(b, little):
+    return struct.unpack('<H' if little else '>H', b)[0]
+
+
+def _u32(b, little):
+    return struct.unpack('<I' if little else '>I', b)[0]
+
+
+def _parse_tiff(src, base):
+    """
+    Parse a TIFF structure starting at `base` (EXIF payloads are TIFF too).
+    Returns a dict of decoded tags; includes '_entries' with the IFD0 entry count.
+    """
+    header = src.read(base, 8)
+    if len(header) < 8:
+        return {}
+    if header[:2] == b'II':
+        little = True
+    elif header[:2] == b'MM':
+        little = False
+    else:
+        return {}
+    if _u16(header[2:4], little) != 42:
+        return {}
+
+    tags = {}
+    visited = set()
+    ifd_offset = _u32(header[4:8], little)
+    pending = [ifd_offset]
+    first = True
+    while pending:
+        ifd_offset = pending.pop()
+        if ifd_offset in visited or ifd_offset == 0:
+            continue
+        visited.add(ifd_offset)
+        count_bytes = src.read(base + ifd_offset, 2)
+        if len(count_bytes) < 2:
+            break
+        count = _u16(count_bytes, little)
+        if count > 1000:
+            break
+        if first:
+            tags['_entries'] = count
+            first = False
+        entries = src.read(base + ifd_offset + 2, count * 12)
+        for i in range(len(entries) // 12):
+            entry = entries[i * 12:(i + 1) * 12]
+            tag = _u16(entry[0:2], little)
+            typ = _u16(entry[2:4], little)
+            n = _u32(entry[4:8], little)
+            raw = entry[8:12]
+            if tag == _EXIF_IFD_POINTER:
+                pending.append(_u32(raw, little))
+                continue
+            name = EXIF_TAGS.get(tag)
+            if not name:
+                continue
+            if typ == 2:  # ASCII
+                if n > 256:
+                    continue
+                value = raw[:n] if n <= 4 else src.read(base + _u32(raw, little), n)
+                tags[name] = value.split(b'\x00', 1)[0].decode('utf-8', errors='ignore').strip()
+            elif typ == 3 and n >= 1:  # SHORT
+                tags[name] = _u16(raw[0:2], little)
+            elif typ == 4 and n >= 1:  # LONG
+                tags[name] = _u32(raw, little)
+    return tags
+
+
+def _split_exif(tags):
+    exif = {k: v for k, v in tags.items() if not k.startswith('_')}
+    return exif, bool(tags.get('_entries'))
+
+
+def _probe_jpeg(src):
+    result = {'format': 'JPEG'}
+    offset = 2
+    while True:
+        head = src.read(offset, 4)
+        if len(head) < 2 or head[0] != 0xFF:
+            break
+        marker = head[1]
+        if marker == 0xFF:  # fill byte
+            offset += 1
+            continue
+        if marker in (0x01,) or 0xD0 <= marker <= 0xD7:
+            offset += 2
+            continue
+        if marker in (0xD9, 0xDA) or len(head) < 4:
+            break
+        seg_len = struct.unpack('>H', head[2:4])[0]
+        if marker == 0xE1 and 'exif' not in result:
+            ident = src.read(offset + 4, 6)
+            if ident == b'Exif\x00\x00':
+                result['exif'], result['has_exif'] = _split_exif(_parse_tiff(src, offset + 10))
+        elif marker in _JPEG_SOF_MARKERS:
+            sof = src.read(offset + 4, 5)
+            if len(sof) == 5:
+                result['height'], result['width'] = struct.unpack('>HH', sof[1:5])
+            break
+        offset += 2 + seg_len
+    return result
+
+
+def _probe_png(src):
+    result = {'format': 'PNG'}
+    offset = 8
+    while True:
+        head = src.read(offset, 8)
+        if len(head) < 8:
+            break
+        length = struct.unpack('>I', head[:4])[0]
+        ctype = head[4:8]
+        if ctype == b'IHDR':
+            ihdr = src.read(offset + 8, 8)
+            if len(ihdr) == 8:
+                result['width'], result['height'] = struct.unpack('>II', ihdr)
+        elif ctype == b'eXIf':
+            base = offset + 8
+            if src.read(base, 6) == b'Exif\x00\x00':
+                base += 6
+            result['exif'], result['has_exif'] = _split_exif(_parse_tiff(src, base))
+        elif ctype in (b'IDAT', b'IEND'):
+            break
+        offset += 12 + length
+    return result
+
+
+def _probe_webp(src):
+    result = {'format': 'WEBP'}
+    riff = src.read(0, 12)
+    riff_end = 8 + struct.unpack('<I', riff[4:8])[0]
+    offset = 12
+    wants_exif = False
+    while offset + 8 <= riff_end:
+        head = src.read(offset, 8)
+        if len(head) < 8:
+            break
+        fourcc = head[:4]
+        size = struct.unpack('<I', head[4:8])[0]
+        data_offset = offset + 8
+        if fourcc == b'VP8X':
+            data = src.read(data_offset, 10)
+            if len(data) == 10:
+                wants_exif = bool(data[0] & 0x08)
+                result['width'] = 1 + int.from_bytes(data[4:7], 'little')
+                result['height'] = 1 + int.from_bytes(data[7:10], 'little')
+        elif fourcc == b'VP8 ' and 'width' not in result:
+            data = src.read(data_offset, 10)
+            if len(data) == 10 and data[3:6] == b'\x9d\x01\x2a':
+                result['width'] = struct.unpack('<H', data[6:8])[0] & 0x3FFF
+                result['height'] = struct.unpack('<H', data[8:10])[0] & 0x3FFF
+        elif fourcc == b'VP8L' and 'width' not in result:
+            data = src.read(data_offset, 5)
+            if len(data) == 5 and data[0] == 0x2F:
+                bits = struct.unpack('<I', data[1:5])[0]
+                result['width'] = (bits & 0x3FFF) + 1
+                result['height'] = ((bits >> 14) & 0x3FFF) + 1
+        elif fourcc == b'EXIF':
+            base = data_offset
+            if src.read(base, 6) == b'Exif\x00\x00':
+                base += 6
+            result['exif'], result['has_exif'] = _split_exif(_parse_tiff(src, base))
+            break
+        if 'width' in result and not wants_exif:
+            break
+        offset = data_offset + size + (size & 1)
+    return result
+
+
+def _iter_boxes(src, start, end):
+    """Yield (type, payload_offset, box_end) for ISO-BMFF boxes between start and end"""
+    offset = start
+    while end is None or offset + 8 <= end:
+        head = src.read(offset, 8)
+        if len(head) < 8:
+            return
+        size = struct.unpack('>I', head[:4])[0]
+        btype = head[4:8]
+        header_len = 8
+        if size == 1:
+            large = src.read(offset + 8, 8)
+            if len(large) < 8:
+                return
+            size = struct.unpack('>Q', large)[0]
+            header_len = 16
+        elif size == 0:
+            size = (end if end is not None else (src.size or offset + header_len)) - offset
+        if size < header_len:
+            return
+        yield btype, offset + header_len, offset + size
+        offset += size
+
+
+def _read_uint(src, offset, size):
+    if size == 0:
+        return 0, offset
+    data = src.read(offset, size)
+    return int.from_bytes(data, 'big'), offset + size
+
+
+def _probe_heif(src, brand):
+    result = {'format': 'AVIF' if brand in (b'avif', b'avis') else 'HEIF'}
+    meta = None
+    for btype, payload, box_end in _iter_boxes(src, 0, src.size):
+        if btype == b'meta':
+            meta = (payload + 4, box_end)  # FullBox: skip version/flags
+            break
+    if not meta:
+        return result
+
+    exif_item = None
+    locations = {}
+    best_area = 0
+    for btype, payload, box_end in _iter_boxes(src, *meta):
+        if btype == b'iprp':
+            for ptype, ppayload, pend in _iter_boxes(src, payload, box_end):
+                if ptype != b'ipco':
+                    continue
+                for ctype, cpayload, _ in _iter_boxes(src, ppayload, pend):
+                    if ctype == b'ispe':
+                        dims = src.read(cpayload + 4, 8)
+                        if len(dims) == 8:
+                            w, h = struct.unpack('>II', dims)
+                            if w * h > best_area:
+                                best_area = w * h
+                                result['width'], result['height'] = w, h
+        elif btype == b'iinf':
+            version = src.read(payload, 1)[0]
+            pos = payload + 4 + (2 if version == 0 else 4)
+            for itype, ipayload, _ in _iter_boxes(src, pos, box_end):
+                if itype != b'infe':
+                    continue
+                infe_version = src.read(ipayload, 1)[0]
+                if infe_version < 2:
+                    continue
+                id_size = 2 if infe_version == 2 else 4
+                item_id, pos2 = _read_uint(src, ipayload + 4, id_size)
+                if src.read(pos2 + 2, 4) == b'Exif':
+                    exif_item = item_id
+        elif btype == b'iloc':
+            header = src.read(payload, 6)
+            if len(header) < 6:
+                continue
+            version = header[0]
+            offset_size, length_size = header[4] >> 4, header[4] & 0x0F
+            base_offset_size = header[5] >> 4
+            index_size = (header[5] & 0x0F) if version in (1, 2) else 0
+            pos = payload + 6
+            item_count, pos = _read_uint(src, pos, 2 if version < 2 else 4)
+            for _ in range(min(item_count, 10000)):
+                item_id, pos = _read_uint(src, pos, 2 if version < 2 else 4)
+                if version in (1, 2):
+                    pos += 2  # construction_method
+                pos += 2  # data_reference_index
+                base_offset, pos = _read_uint(src, pos, base_offset_size)
+                extent_count, pos = _read_uint(src, pos, 2)
+                extents = []
+                for _ in range(extent_count):
+                    _, pos = _read_uint(src, pos, index_size)
+                    extent_offset, pos = _read_uint(src, pos, offset_size)
+                    extent_length, pos = _read_uint(src, pos, length_size)
+                    extents.append((base_offset + extent_offset, extent_length))
+                locations[item_id] = extents
+
+    if exif_item is not None and locations.get(exif_item):
+        exif_offset, _ = locations[exif_item][0]
+        header_offset = src.read(exif_offset, 4)
+        if len(header_offset) == 4:
+            base = exif_offset + 4 + struct.unpack('>I', header_offset)[0]
+            result['exif'], result['has_exif'] = _split_exif(_parse_tiff(src, base))
+    return result
+
+
+def _probe_tiff(src):
+    tags = _parse_tiff(src, 0)
+    result = {'format': 'TIFF'}
+    if 'ImageWidth' in tags and 'ImageLength' in tags:
+        result['width'], result['height'] = tags['ImageWidth'], tags['ImageLength']
+    result['exif'], result['has_exif'] = _split_exif(tags)
+    return result
+
+
+def _probe_bmp(src):
+    result = {'format': 'BMP'}
+    header = src.read(14, 12)
+    if len(header) == 12:
+        width, height = struct.unpack('<ii', header[4:12])
+        result['width'], result['height'] = width, abs(height)
+    return result
+
+
+def _probe_source(src):
+    head = src.read(0, 16)
+    if head[:2] == b'\xff\xd8':
+        return _probe_jpeg(src)
+    if head[:8] == b'\x89PNG\r\n\x1a\n':
+        return _probe_png(src)
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return _probe_webp(src)
+    if head[4:8] == b'ftyp':
+        return _probe_heif(src, head[8:12])
+    if head[:4] in (b'II*\x00', b'MM\x00*'):
+        return _probe_tiff(src)
+    if head[:2] == b'BM':
+        return _probe_bmp(src)
+    return None
+
+
+def _finish(result, src, full_read):
+    result.setdefault('exif', {})
+    result.setdefault('has_exif', False)
+    result['bytes_read'] = src.bytes_fetched
+    result['full_read'] = full_read
+    return result
+
+
+def probe_bytes(data):
+    """
+    Probe an image already held in memory. Returns None if the format is not recognised
+    or the dimensions could not be read.
+    """
+    src = _ByteSource(data)
+    try:
+        result = _probe_source(src)
+    except (struct.error, IndexError, ValueError):
+        result = None
+    if not result or 'width' not in result:
+        return None
+    return _finish(result, src, full_read=True)
+
+
+def _probe_with_pillow(data):
+    """Last-resort probe for formats the header parser cannot handle"""
+    from PIL import Image
+    from PIL.ExifTags import TAGS
+
+    image = Image.open(io.BytesIO(data))
+    result = {'format': (image.format or '').upper(), 'width': image.width, 'height': image.height}
+    exif_data = {}
+    if hasattr(image, 'getexif'):
+        exif = image.getexif()
+        for tag_id, value in (exif or {}).items():
+            tag = TAGS.get(tag_id, tag_id)
+            if isinstance(value, bytes):
+                value = value.decode('utf-8', errors='ignore')
+            exif_data[tag] = value
+    result['exif'] = exif_data
+    result['has_exif'] = bool(exif_data)
+    return result
+
+
+def probe_s3_object(s3_client, bucket, key, size=None,
+                    initial_bytes=PROBE_INITIAL_BYTES, max_bytes=PROBE_MAX_BYTES):
+    """
+    Read dimensions and EXIF of an S3 object using ranged GETs.
+    Falls back to downloading the whole object only when the headers are not found
+    within `max_bytes`. Returns a dict with format, width, height, exif, has_exif,
+    bytes_read and full_read.
+    """
+    def fetch(start, end):
+        resp = s3_client.get_object(Bucket=bucket, Key=key, Range=f'bytes={start}-{end}')
+        return resp['Body'].read()
+
+    src = _ByteSource(fetch=fetch, size=size, chunk=initial_bytes, max_bytes=max_bytes)
+    result = None
+    try:
+        result = _probe_source(src)
+    except ProbeBudgetExceeded as e:
+        logger.info(f"Probe budget exceeded for {key} ({e}), falling back to full read")
+    except (struct.error, IndexError, ValueError) as e:
+        logger.warning(f"Could not parse headers of {key}: {e}")
+
+    if result and 'width' in result:
+        return _finish(result, src, full_read=False)
+
+    # Full read fallback
+    response = s3_client.get_object(Bucket=bucket, Key=key)
+    data = response['Body'].read()
+    full = _ByteSource(data)
+    parsed = None
+    try:
+        parsed = _probe_source(full)
+    except (struct.error, IndexError, ValueError):
+        parsed = None
+    full.bytes_fetched += src.bytes_fetched
+    if not parsed or 'width' not in parsed:
+        parsed = _probe_with_pillow(data)
+    return _finish(parsed, full, full_read=True)
+
+
+def exif_taken_at(exif):
+    """
+    Convert the EXIF DateTime / DateTimeOriginal of a probe result to an ISO timestamp
+    """
+    date_taken = (exif or {}).get('DateTime') or (exif or {}).get('DateTimeOriginal')
+    if not date_taken:
+        return None
+    try:
+        return datetime.strptime(str(date_taken), '%Y:%m:%d %H:%M:%S').isoformat() + 'Z'
+    except ValueError:
+        return None
@@ -0,0 +1,282 @@
+"""
+Incremental, checkpointed S3 -> DynamoDB synchronisation.
+
+The bucket listing under galleries/ and then gallery-data/ is consumed as a
+stream of per-gallery runs (S3 lists keys in order, so every gallery folder
+is a contiguous run, and galleries/ sorts before gallery-data/).
+Each run is merge-joined with the ETags stored for that gallery by the last
+sync, so only galleries with objects added, changed or deleted since then
+need any reconciliation work.
+
+Checkpoints live in the SyncState table (syncId HASH, scope RANGE):
+
+    {syncId: 'photos', scope: '#checkpoint'}          run metadata: watermark, resume point
+    {syncId: 'photos', scope: 'galleries/A/B/C/'}     zlib-compressed {relative key: ETag}
+    {syncId: 'photos', scope: 'gallery-data/<id>/'}   same, for ID-layout galleries
+
+Gallery paths and S3 keys sort the same way in DynamoDB (UTF-8 bytes) and S3,
+so both sides can be streamed without loading either into memory.
+"""
+import base64
+import json
+import logging
+import zlib
+from datetime import datetime
+
+from gallery_listing import GALLERY_PREFIX, ID_LAYOUT_PREFIX, iter_s3_objects, iter_gallery_runs
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_SCOPE = '#checkpoint'
+# Gallery prefixes walked by default, both layouts
+SYNC_PREFIXES = (GALLERY_PREFIX, ID_LAYOUT_PREFIX)
+
+
+def prefix_range(prefix, after=None):
+    """
+    (start, end) of the keys under prefix that sort after `after`, or None when there are none.
+    end is the first key past the prefix; start is the prefix itself or `after` when it falls inside.
+    """
+    end = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    if after and after >= end:
+        return None
+    return (after if after and after > prefix else prefix), end
+
+
+def iter_prefixed_objects(s3_client, bucket, prefixes=SYNC_PREFIXES, start_after=None):
+    """
+    Listed objects of every prefix in key order, resuming after start_after; prefixes that
+    sort entirely before it are skipped, later ones are listed from their start
+    """
+    for prefix in sorted(prefixes):
+        bounds = prefix_range(prefix, start_after)
+        if bounds is None:
+            continue
+        yield from iter_s3_objects(s3_client, bucket, prefix=prefix,
+                                   start_after=bounds[0] if bounds[0] != prefix else None)
+
+
+class GalleryNotReady(Exception):
+    """
+    Raised by apply_diff when a gallery's changes cannot be applied yet (its gallery record
+    does not exist). The gallery's ETags are not saved, so the next run retries it; counts
+    are summed into the result like apply_diff's return value.
+    """
+
+    def __init__(self, message, counts=None):
+        super().__init__(message)
+        self.counts = counts or {}
+
+
+def _add_counts(result, counts):
+    for name, count in (counts or {}).items():
+        if name == 'errors':
+            result['errors'].extend(count)
+        else:
+            result[name] = result.get(name, 0) + count
+
+
+class GalleryDiff:
+    """
+    Changes of one gallery folder since the last checkpoint.
+    Keys in added/changed/deleted are full S3 keys.
+    """
+    __slots__ = ('gallery_path', 'objects', 'etags', 'added', 'changed', 'deleted', 'last_key')
+
+    def __init__(self, gallery_path, objects, previous_etags):
+        self.gallery_path = gallery_path
+        self.objects = objects
+        self.etags = {obj['Key'][len(gallery_path):]: obj.get('ETag', '') for obj in objects}
+        self.added = [gallery_path + rel for rel in self.etags if rel not in previous_etags]
+        self.changed = [gallery_path + rel for rel, etag in self.etags.items()
+                        if rel in previous_etags and previous_etags[rel] != etag]
+        self.deleted = [gallery_path + rel for rel in previous_etags if rel not in self.etags]
+        self.last_key = objects[-1]['Key'] if objects else None
+
+    @property
+    def has_changes(self):
+        return bool(self.added or self.changed or self.deleted)
+
+    @property
+    def changed_keys(self):
+        return set(self.added) | set(self.changed) | set(self.deleted)
+
+
+def diff_gallery_runs(runs, stored):
+    """
+    Merge-join listed gallery runs with stored (gallery_path, etags) checkpoints, both in path order.
+    Galleries only present in the checkpoint come out as diffs with every key deleted.
+    """
+    stored = iter(stored)
+    pending = next(stored, None)
+    for path, objects in runs:
+        while pending is not None and pending[0] < path:
+            yield GalleryDiff(pending[0], [], pending[1])
+            pending = next(stored, None)
+        previous = {}
+        if pending is not None and pending[0] == path:
+            previous = pending[1]
+            pending = next(stored, None)
+        yield GalleryDiff(path, objects, previous)
+    while pending is not None:
+        yield GalleryDiff(pending[0], [], pending[1])
+        pending = next(stored, None)
+
+
+def encode_continuation_token(resume):
+    """Encode a resume point ({'key': ..., 'path': ...}) as an opaque token"""
+    return base64.urlsafe_b64encode(json.dumps(resume).encode('utf-8')).decode('ascii')
+
+
+def decode_continuation_token(token):
+    """Decode a token produced by encode_continuation_token, or None if it is malformed"""
+    try:
+        resume = json.loads(base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8'))
+        return resume if isinstance(resume, dict) and 'path' in resume else None
+    except (ValueError, TypeError):
+        return None
+
+
+class SyncCheckpoint:
+    """
+    Persisted watermark, resume point and per-key ETags of one sync kind
+    """
+
+    def __init__(self, table, sync_id):
+        self.table = table
+        self.sync_id = sync_id
+
+    def load(self):
+        resp = self.table.get_item(Key={'syncId': self.sync_id, 'scope': CHECKPOINT_SCOPE})
+        return resp.get('Item') or {}
+
+    def iter_gallery_etags(self, after=None, prefixes=SYNC_PREFIXES):
+        """
+        Yield (gallery_path, {relative key: etag}) of the gallery prefixes in path order,
+        starting after `after`
+        """
+        from boto3.dynamodb.conditions import Key
+        for prefix in sorted(prefixes):
+            bounds = prefix_range(prefix, after)
+            if bounds is None:
+                continue
+            # between is inclusive: the resume path itself is skipped below
+            params = {'KeyConditionExpression': Key('syncId').eq(self.sync_id) & Key('scope').between(*bounds)}
+            while True:
+                resp = self.table.query(**params)
+                for item in resp.get('Items', []):
+                    if item['scope'] != after and item['scope'].startswith(prefix):
+                        yield item['scope'], self._decode_etags(item.get('etags'))
+                if 'LastEvaluatedKey' not in resp:
+                    break
+                params['ExclusiveStartKey'] = resp['LastEvaluatedKey']
+
+    def save_gallery(self, gallery_path, etags):
+        if not etags:
+            self.table.delete_item(Key={'syncId': self.sync_id, 'scope': gallery_path})
+            return
+        self.table.put_item(Item={
+            'syncId': self.sync_id,
+            'scope': gallery_path,
+            'etags': zlib.compress(json.dumps(etags, separators=(',', ':')).encode('utf-8')),
+            'objectCount': len(etags),
+            'updatedAt': datetime.utcnow().isoformat() + 'Z'
+        })
+
+    def save(self, **fields):
+        item = {'syncId': self.sync_id, 'scope': CHECKPOINT_SCOPE,
+                'updatedAt': datetime.utcnow().isoformat() + 'Z'}
+        item.update({k: v for k, v in fields.items() if v is not None})
+        self.table.put_item(Item=item)
+
+    def clear(self):
+        self.table.delete_item(Key={'syncId': self.sync_id, 'scope': CHECKPOINT_SCOPE})
+
+    @staticmethod
+    def _decode_etags(value):
+        if value is None:
+            return {}
+        raw = getattr(value, 'value', value)  # boto3 returns Binary wrappers
+        return json.loads(zlib.decompress(bytes(raw)).decode('utf-8'))
+
+
+def run_incremental_sync(checkpoint, s3_client, bucket, apply_diff, continuation_token=None,
+                         context=None, time_buffer_ms=30000, prefixes=SYNC_PREFIXES):
+    """
+    Walk the gallery prefixes of the bucket from the checkpointed resume point and call
+    apply_diff(diff) for every gallery with changes. apply_diff returns a dict of counters that are summed into the result,
+    or raises GalleryNotReady to have the gallery retried by the next run.
+    Stops before the Lambda runs out of time, leaving a continuation token.
+    """
+    state = checkpoint.load()
+    resume = decode_continuation_token(continuation_token) if continuation_token else state.get('resume')
+    resume = resume or None
+    watermark = state.get('pendingWatermark') if resume else None
+    previous_watermark = state.get('watermark')
+
+    start_after = None
+    if resume:
+        # The last listed key, or the start of the resume path's prefix when the galleries since
+        # that key were all emptied: a resume point past galleries/ never relists it
+        path_prefix = next((prefix for prefix in prefixes if resume['path'].startswith(prefix)), '')
+        start_after = max(resume.get('key') or '', path_prefix) or None
+    objects = iter_prefixed_objects(s3_client, bucket, prefixes, start_after=start_after)
+    stored = checkpoint.iter_gallery_etags(after=resume.get('path') if resume else None, prefixes=prefixes)
+
+    result = {
+        'galleries_scanned': 0,
+        'galleries_changed': 0,
+        'galleries_unchanged': 0,
+        'objects_scanned': 0,
+        'objects_added': 0,
+        'objects_changed': 0,
+        'objects_deleted': 0,
+        'errors': []
+    }
+    stopped = False
+    for diff in diff_gallery_runs(iter_gallery_runs(objects), stored):
+        if context is not None and context.get_remaining_time_in_millis() < time_buffer_ms:
+            stopped = True
+            break
+        result['galleries_scanned'] += 1
+        result['objects_scanned'] += len(diff.objects)
+        for obj in diff.objects:
+            last_modified = obj.get('LastModified')
+            if last_modified is not None:
+                stamp = last_modified.isoformat() if hasattr(last_modified, 'isoformat') else str(last_modified)
+                watermark = max(watermark or stamp, stamp)
+
+        if diff.has_changes:
+            result['galleries_changed'] += 1
+            result['objects_added'] += len(diff.added)
+            result['objects_changed'] += len(diff.changed)
+            result['objects_deleted'] += len(diff.deleted)
+            try:
+                _add_counts(result, apply_diff(diff))
+                # Only advance the gallery's ETags once its changes are reconciled, so failures retry
+                checkpoint.save_gallery(diff.gallery_path, diff.etags)
+            except GalleryNotReady as e:
+                logger.warning(f"Gallery {diff.gallery_path} not synced, retrying next run: {str(e)}")
+                _add_counts(result, e.counts)
+            except Exception as e:
+                error_msg = f"Error syncing gallery {diff.gallery_path}: {str(e)}"
+                logger.error(error_msg)
+                result['errors'].append(error_msg)
+        else:
+            result['galleries_unchanged'] += 1
+
+        resume = {'key': diff.last_key or (resume or {}).get('key'), 'path': diff.gallery_path}
+
+    if stopped:
+        checkpoint.save(resume=resume, pendingWatermark=watermark, watermark=previous_watermark,
+                        lastCompletedAt=state.get('lastCompletedAt'))
+        result['complete'] = False
+        result['continuationToken'] = encode_continuation_token(resume) if resume else None
+        logger.info(f"Incremental sync {checkpoint.sync_id} stopped before timeout at {resume}")
+    else:
+        checkpoint.save(watermark=watermark or previous_watermark,
+                        lastCompletedAt=datetime.utcnow().isoformat() + 'Z')
+        result['complete'] = True
+        result['continuationToken'] = None
+    result['watermark'] = watermark or previous_watermark
+    return result
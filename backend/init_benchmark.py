@@ -0,0 +1,95 @@
+"""
+Cold-start cost of each Lambda entry point.
+
+Every entry point is imported in a fresh interpreter, the way a new Lambda
+container would, and reports:
+
+    import_ms      time to import the handler module (module-level init included)
+    clients        time to build each lazily created client, resource or table on first use
+                   (a table's time includes the resource it is bound to if that came first)
+    heavy_modules  whether Pillow ended up imported
+    modules        number of modules loaded after import
+
+No AWS calls are made; creating clients only loads their service models.
+
+    python init_benchmark.py [--runs 5] [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# name -> (file, lazy objects to resolve after import, as a request on that entry point would)
+ENTRY_POINTS = {
+    'gallery-manager': ('lambda.py', ['s3_client', 'dynamodb', 'tbl_galleries', 'tbl_gallery_photos',
+                                      'tbl_photo_ratings', 'tbl_sync_state', 'tbl_gallery_paths', 'tbl_gallery_years']),
+    'read-only (list galleries)': ('read_lambda.py', ['gallery_api.tbl_galleries']),
+    'user-api': ('user-lambda.py', []),
+}
+
+_PROBE = r'''
+import importlib.util, json, sys, time
+sys.path.insert(0, {here!r})
+started = time.perf_counter()
+spec = importlib.util.spec_from_file_location('entry_point', {path!r})
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+import_ms = (time.perf_counter() - started) * 1000
+clients = {{}}
+for dotted in {lazy!r}:
+    target = module
+    for part in dotted.split('.'):
+        target = getattr(target, part)
+    started = time.perf_counter()
+    target.resolve()
+    clients[dotted] = (time.perf_counter() - started) * 1000
+print(json.dumps({{'import_ms': import_ms, 'clients': clients,
+                   'heavy_modules': {{'PIL': 'PIL' in sys.modules}}, 'modules': len(sys.modules)}}))
+'''
+
+
+def measure(filename, lazy):
+    """Import one entry point in a fresh interpreter and return its measurements"""
+    env = dict(os.environ)
+    env.setdefault('AWS_DEFAULT_REGION', 'eu-north-1')
+    code = _PROBE.format(here=HERE, path=os.path.join(HERE, filename), lazy=lazy)
+    out = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def run(runs):
+    report = {}
+    for name, (filename, lazy) in ENTRY_POINTS.items():
+        samples = [measure(filename, lazy) for _ in range(runs)]
+        report[name] = {
+            'import_ms': statistics.median(s['import_ms'] for s in samples),
+            'clients_ms': {key: statistics.median(s['clients'][key] for s in samples) for key in lazy},
+            'heavy_modules': samples[0]['heavy_modules'],
+            'modules': samples[0]['modules'],
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters per entry point (median reported)')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    report = run(args.runs)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    for name, result in report.items():
+        print(f"{name}: import {result['import_ms']:.1f} ms, {result['modules']} modules, "
+              f"Pillow loaded: {result['heavy_modules']['PIL']}")
+        for client, ms in result['clients_ms'].items():
+            print(f"    {client:<24} {ms:7.1f} ms on first use")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,42 +1,108 @@
 import json
-import boto3
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from botocore.exceptions import ClientError
 import logging
-from PIL import Image
-from PIL.ExifTags import TAGS
 import io
 import os
 import re
 from decimal import Decimal
 import time
 import json
-import urllib.parse
-import urllib.request
-
-# In-process cache + throttling
-_geocode_cache = {}
-_last_geocode_ts = 0
+import threading
+import itertools
+from concurrent.futures import as_completed
+from image_probe import probe_s3_object, exif_taken_at
+from incremental_sync import GalleryNotReady, SyncCheckpoint, run_incremental_sync
+from gallery_listing import (iter_s3_objects, iter_gallery_runs, summarize_gallery_run,
+                             index_thumbnails, thumbnail_stem, resolve_thumbnail_key,
+                             gallery_path_of, id_layout_photo_id, GALLERY_PREFIX, ID_LAYOUT_PREFIX)
+from s3_inventory import iter_inventory_objects, InventoryError
+from prefix_move import move_prefix, copy_keys, delete_keys
+from worker_pools import ContextThreadPoolExecutor
+import gallery_facets
+from gallery_facets import FilterError, gallery_years
+from lazy_resources import Lazy
+import aws_clients
+from request_metrics import observe_request, instrument_client
+import log_redaction
+from log_redaction import summary, verbose
+from event_recorder import maybe_record
+from geocoding import Geocoder, GeocodeCacheTable, Gazetteer, NominatimClient, GeocodeUnavailable
 
 # Configure logging
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+logger = log_redaction.configure(logging.getLogger())
 logger.info("==== Lambda START ====")
-# Initialize S3 client
-s3_client = boto3.client('s3')
-
-# Initialize DynamoDB
-dynamodb = boto3.resource('dynamodb')
+# AWS clients, the DynamoDB resource and tables are created on first use (lazy_resources.py),
+# so an invocation only pays for the ones it touches. They come from aws_clients.py, which shares
+# one tuned client per service across warm invocations and worker threads.
+s3_client = Lazy('s3', lambda: instrument_client(aws_clients.client('s3')))
+# Same bucket with long read timeouts and more retries, for bulk copies and deletes
+s3_bulk_client = Lazy('s3:bulk', lambda: instrument_client(aws_clients.client('s3', 'bulk')))
+
+dynamodb = Lazy('dynamodb', lambda: instrument_client(aws_clients.resource('dynamodb')))
 GALLERIES_TABLE_NAME = os.getenv('GALLERIES_TABLE', 'Galleries')
 GALLERY_PHOTOS_TABLE_NAME = os.getenv('GALLERY_PHOTOS_TABLE', 'GalleryPhotos')
 PHOTO_RATINGS_TABLE_NAME = os.getenv('PHOTO_RATINGS_TABLE', 'PhotoRatings')
-tbl_galleries = dynamodb.Table(GALLERIES_TABLE_NAME)
-tbl_gallery_photos = dynamodb.Table(GALLERY_PHOTOS_TABLE_NAME)
-tbl_photo_ratings = dynamodb.Table(PHOTO_RATINGS_TABLE_NAME)
+# GSI on GalleryPhotos: contentHash (HASH) + galleryId (RANGE), projection ALL
+CONTENT_HASH_INDEX = os.getenv('CONTENT_HASH_INDEX', 'contentHash-index')
+S3_KEY_INDEX = os.getenv('S3_KEY_INDEX', 's3Key-index')
+# GSI on GalleryPhotos: photoId (HASH), keys only; finds a photo's gallery when only the photoId is known
+PHOTO_ID_INDEX = os.getenv('PHOTO_ID_INDEX', 'photoId-index')
+tbl_galleries = Lazy('table:galleries', lambda: dynamodb.Table(GALLERIES_TABLE_NAME))
+tbl_gallery_photos = Lazy('table:gallery_photos', lambda: dynamodb.Table(GALLERY_PHOTOS_TABLE_NAME))
+tbl_photo_ratings = Lazy('table:photo_ratings', lambda: dynamodb.Table(PHOTO_RATINGS_TABLE_NAME))
+# Incremental sync checkpoints: syncId (HASH) + scope (RANGE)
+SYNC_STATE_TABLE_NAME = os.getenv('SYNC_STATE_TABLE', 'SyncState')
+tbl_sync_state = Lazy('table:sync_state', lambda: dynamodb.Table(SYNC_STATE_TABLE_NAME))
+# S3 folder -> galleryId index: s3Prefix (HASH), maintained by create/rename/delete
+GALLERY_PATHS_TABLE_NAME = os.getenv('GALLERY_PATHS_TABLE', 'GalleryPaths')
+tbl_gallery_paths = Lazy('table:gallery_paths', lambda: dynamodb.Table(GALLERY_PATHS_TABLE_NAME))
+# Year membership index for filtered listings: year (HASH) + galleryId (RANGE), see gallery_facets.py
+GALLERY_YEARS_TABLE_NAME = os.getenv('GALLERY_YEARS_TABLE', 'GalleryYears')
+tbl_gallery_years = Lazy('table:gallery_years', lambda: dynamodb.Table(GALLERY_YEARS_TABLE_NAME))
+# GSIs on Galleries for filtered listings: continent / country (HASH), projecting ORDER_ATTRIBUTES
+CONTINENT_INDEX = os.getenv('CONTINENT_INDEX', 'continent-index')
+COUNTRY_INDEX = os.getenv('COUNTRY_INDEX', 'country-index')
+# Sparse GSI on Galleries in list order: listed (HASH) + listKey (RANGE), projecting LIST_ATTRIBUTES
+LIST_ORDER_INDEX = os.getenv('LIST_ORDER_INDEX', 'listOrder-index')
+# Stop incremental syncs when less than this much Lambda time is left
+SYNC_TIME_BUFFER_MS = int(os.getenv('SYNC_TIME_BUFFER_MS', '30000'))
+# Worker threads used for per-gallery reconciliation
+RECONCILE_WORKERS = int(os.getenv('RECONCILE_WORKERS', '8'))
+# Concurrent server-side copies when a gallery rename moves its S3 folder
+MOVE_WORKERS = int(os.getenv('MOVE_WORKERS', '16'))
+# Concurrent delete_objects calls (1,000 keys each) when a gallery is deleted
+DELETE_WORKERS = int(os.getenv('DELETE_WORKERS', '4'))
+MAX_BULK_DELETE_PHOTOS = 1000  # photoIds accepted by one delete_photos request
+RECONCILE_CHUNK_SIZE = 100  # Gallery folders per BatchGetItem prefetch
+# Default S3 Inventory report for mode=inventory scans: s3://bucket/.../manifest.json or a local directory
+INVENTORY_MANIFEST = os.getenv('INVENTORY_MANIFEST', '')
+# Durable geocoding results shared by all containers: placeKey (HASH), TTL on expiresAt
+GEOCODE_CACHE_TABLE_NAME = os.getenv('GEOCODE_CACHE_TABLE', 'GeocodeCache')
+GEOCODE_LRU_SIZE = int(os.getenv('GEOCODE_LRU_SIZE', '1024'))
+# Optional offline GeoNames extract: a local path (e.g. a layer under /opt) or s3://bucket/key
+GAZETTEER_SOURCE = os.getenv('GAZETTEER_SOURCE', '')
+# Sparse GSI on Galleries over galleries awaiting geocoding: geocodeStatus (HASH) + geocodeNextAttemptAt (RANGE)
+GEOCODE_STATUS_INDEX = os.getenv('GEOCODE_STATUS_INDEX', 'geocodeStatus-index')
+GEOCODE_BATCH_SIZE = 25  # Pending galleries read per page by the geocoding worker
+GEOCODE_MAX_ATTEMPTS = int(os.getenv('GEOCODE_MAX_ATTEMPTS', '8'))
+GEOCODE_RETRY_BASE_SECONDS = 60  # Doubled per failed attempt, capped at GEOCODE_RETRY_MAX_SECONDS
+GEOCODE_RETRY_MAX_SECONDS = 6 * 3600
+
+# Created on first use, only needed to continue background jobs
+lambda_client = None
+_geocoder = None
+_geocoder_lock = threading.Lock()
+
+# boto3 resources are not thread safe, worker threads get their own
+_thread_local = threading.local()
 
 # Configuration
 BUCKET_NAME = 'haophotography'
+# S3 layout of new galleries: 'id' (gallery-data/<galleryId>/<photoId>.<ext>, renames never move
+# objects) or 'path' (legacy galleries/<continent>/<country>/<name>/)
+STORAGE_LAYOUT = os.getenv('STORAGE_LAYOUT', 'id')
 METADATA_KEY = 'galleries/metadata.json'
 
 
@@ -44,95 +110,138 @@ def lambda_handler(event, context):
     """
     Main Lambda handler for gallery management operations
     """
-    logger.info(f"Received event: {event}")
+    log_redaction.start_request()
+    verbose(logger, "Received event: %s", summary(event))
+    # Sampled, sanitized copy of API requests for local replay (RECORD_EVENTS_RATE)
+    maybe_record(event)
+    # Background jobs re-invoke this function asynchronously with a plain event
+    if event.get('job'):
+        job = JOBS.get(event['job'])
+        if job is None:
+            logger.error(f"Unknown background job: {event['job']}")
+            return {'error': f"Unknown job {event['job']}"}
+        return observe_request(f"JOB {event['job']}", job, event, context)
+
     # Parse the HTTP method and path
     http_method = event.get('httpMethod', 'GET')
     path = event.get('path', '')
     
-    # Parse request body if present
-    body = {}
-    if event.get('body'):
-        body = json.loads(event.get('body', '{}'))
+    # CORS preflight support
+    if http_method == 'OPTIONS':
+        return create_response(200, {'ok': True})
+    if '/galleries' not in path:
+        return create_response(400, {'error': 'Invalid endpoint or method'})
     
     # Parse query parameters
     query_params = event.get('queryStringParameters') or {}
+    action_param = query_params.get('action')
     
-    logger.info(f"Body: {body}")
-    logger.info(f"Query params: {query_params}")
-    # CORS preflight support
-    if http_method == 'OPTIONS':
-        return create_response(200, {'ok': True})
-        
-    # Route to appropriate handler - check specific actions first
-    if http_method == 'POST' and '/galleries' in path:
-        action_param = query_params.get('action') if query_params else None
-        
-        # Actions under POST /galleries
-        if action_param == 'upload_photos':
-            logger.info("Routing to upload_photos()")
-            gallery_id = query_params.get('id')
-            if gallery_id:
-                return upload_photos(gallery_id, body)
-            else:
-                return create_response(400, {'error': 'Gallery ID required for photo upload'})
-        elif action_param == 'update_galleries_metadata':
-            logger.info("Routing to update_galleries_metadata()")
-            return update_galleries_metadata()
-        elif action_param == 'update_GalleryPhotos':
-            logger.info("Routing to update_GalleryPhotos()")
-            return update_GalleryPhotos(body)
-        elif action_param == 'delete_photo':
-            logger.info("Routing to delete_photo()")
-            gallery_id = query_params.get('id')
-            if not gallery_id:
-                return create_response(400, {'error': 'Gallery ID required for delete'})
-            return delete_photo(gallery_id, body)
-        elif action_param == 'rate_photo':
-            logger.info("Routing to rate_photo()")
-            return rate_photo(body)
-        elif action_param == 'get_photo_rating':
-            logger.info("Routing to get_photo_rating()")
-            return get_photo_rating(query_params)
-        elif action_param == 'update_sort_order':
-            logger.info("Routing to update_gallery_sort_order()")
-            return update_gallery_sort_order(body)
-        elif action_param == 'update_photo_sort_order':
-            logger.info("Routing to update_photo_sort_order()")
-            return update_photo_sort_order(body)
-        elif action_param == 'get_upload_urls':
-            logger.info("Routing to get_upload_urls()")
-            gallery_id = query_params.get('id')
-            if gallery_id:
-                return get_upload_urls(gallery_id, body)
-            else:
-                return create_response(400, {'error': 'Gallery ID required for getting upload URLs'})
-        else:
-            logger.info("Routing to create_gallery()")
-            return create_gallery(body)
-    elif http_method == 'GET' and '/galleries' in path:
-        action_param = query_params.get('action') if query_params else None
-        
-        if action_param == 'get_photo_rating':
-            logger.info("Routing to get_photo_rating()")
-            return get_photo_rating(query_params)
-        else:
-            gallery_id = query_params.get('id')
-            if gallery_id:
-                return get_gallery(gallery_id)
-            else:
-                return list_galleries()
-
-    elif http_method == 'PUT' and '/galleries' in path:
-        return update_gallery(body)
-    elif http_method == 'DELETE' and '/galleries' in path:
-        gallery_id = query_params.get('id')
-        return delete_gallery(gallery_id)
-    else:
+    # Specific actions first, then the method's default route
+    route_key = (http_method, action_param) if (http_method, action_param) in ROUTES else (http_method, None)
+    handler = ROUTES.get(route_key)
+    if handler is None:
         return create_response(400, {'error': 'Invalid endpoint or method'})
+    route_name = f"{http_method} {route_key[1] or 'default'}"
+    logger.info(f"Routing to {route_name}")
+    return observe_request(route_name, _run_route, handler, event, query_params, context,
+                           error_response=_unhandled_error_response)
+
+
+def _run_route(handler, event, query_params, context):
+    # Parse request body if present
+    body = {}
+    if event.get('body'):
+        try:
+            body = json.loads(event.get('body', '{}'))
+        except ValueError:
+            return create_response(400, {'error': 'Request body must be JSON'})
+    
+    verbose(logger, "Body: %s", summary(body))
+    logger.info("Query params: %s", summary(query_params))
+    return handler(body, query_params, context)
+
+
+def _unhandled_error_response(error):
+    logger.error(f"Unhandled error: {error}")
+    return create_response(500, {'error': 'Internal server error', 'details': str(error)})
 
-def create_gallery(gallery_data):
+
+def _require_id(handler, message):
+    """Route wrapper returning 400 when the request has no ?id="""
+    def route(body, query_params, context):
+        gallery_id = query_params.get('id')
+        if not gallery_id:
+            return create_response(400, {'error': message})
+        return handler(gallery_id, body, query_params, context)
+    return route
+
+
+def _get_or_list_galleries(body, query_params, context):
+    gallery_id = query_params.get('id')
+    if gallery_id:
+        return get_gallery(gallery_id)
+    if gallery_facets.is_filtered(query_params):
+        return filter_galleries(query_params)
+    return list_galleries()
+
+
+# (HTTP method, action query parameter) -> handler(body, query_params, context).
+# (method, None) is the route for requests without a recognised action.
+ROUTES = {
+    ('POST', 'upload_photos'): _require_id(
+        lambda gallery_id, body, q, ctx: upload_photos(gallery_id, body), 'Gallery ID required for photo upload'),
+    ('POST', 'update_galleries_metadata'): lambda body, q, ctx: update_galleries_metadata(
+        mode=q.get('mode') or body.get('mode'),
+        continuation_token=q.get('continuationToken') or body.get('continuationToken'),
+        context=ctx,
+        inventory=q.get('inventory') or body.get('inventory')
+    ),
+    ('POST', 'update_GalleryPhotos'): lambda body, q, ctx: update_GalleryPhotos(
+        body,
+        mode=q.get('mode'),
+        continuation_token=q.get('continuationToken'),
+        context=ctx,
+        inventory=q.get('inventory')
+    ),
+    ('POST', 'migrate_storage_layout'): lambda body, q, ctx: migrate_storage_layout(
+        q.get('id') or body.get('id'), context=ctx),
+    ('POST', 'geocode_pending'): lambda body, q, ctx: create_response(200, run_geocode_worker(ctx)),
+    ('POST', 'rebuild_gallery_path_index'): lambda body, q, ctx: rebuild_gallery_path_index(),
+    ('POST', 'rebuild_gallery_year_index'): lambda body, q, ctx: rebuild_gallery_year_index(),
+    ('POST', 'rebuild_gallery_list_index'): lambda body, q, ctx: rebuild_gallery_list_index(),
+    ('POST', 'delete_photo'): _require_id(
+        lambda gallery_id, body, q, ctx: delete_photo(gallery_id, body), 'Gallery ID required for delete'),
+    ('POST', 'delete_photos'): _require_id(
+        lambda gallery_id, body, q, ctx: delete_photos(gallery_id, body), 'Gallery ID required for delete'),
+    ('POST', 'rate_photo'): lambda body, q, ctx: rate_photo(body),
+    ('POST', 'get_photo_rating'): lambda body, q, ctx: get_photo_rating(q),
+    ('POST', 'update_sort_order'): lambda body, q, ctx: update_gallery_sort_order(body),
+    ('POST', 'update_photo_sort_order'): lambda body, q, ctx: update_photo_sort_order(body),
+    ('POST', 'get_upload_urls'): _require_id(
+        lambda gallery_id, body, q, ctx: get_upload_urls(gallery_id, body),
+        'Gallery ID required for getting upload URLs'),
+    ('POST', None): lambda body, q, ctx: create_gallery(body, context=ctx),
+    ('GET', 'get_photo_rating'): lambda body, q, ctx: get_photo_rating(q),
+    ('GET', 'delete_status'): lambda body, q, ctx: get_gallery_deletion_status(q.get('id')),
+    ('GET', 'gallery_facets'): lambda body, q, ctx: get_gallery_facets(),
+    ('GET', 'gallery_map'): lambda body, q, ctx: get_gallery_map(),
+    ('GET', None): _get_or_list_galleries,
+    ('PUT', None): lambda body, q, ctx: update_gallery(body, context=ctx),
+    ('DELETE', None): _require_id(
+        lambda gallery_id, body, q, ctx: delete_gallery(gallery_id, context=ctx), 'Gallery ID required for delete'),
+}
+# Background jobs: {'job': name, ...} events -> handler(event, context)
+JOBS = {
+    'delete_gallery': lambda event, ctx: run_gallery_deletion(event.get('galleryId'), ctx, continue_async=True),
+    'geocode_galleries': lambda event, ctx: run_geocode_worker(ctx, continue_async=True),
+}
+
+
+def create_gallery(gallery_data, context=None):
     """
-    Create a new gallery
+    Create a new gallery.
+    Coordinates come from the request or from cached/offline geocoding; otherwise the gallery is
+    marked geocodeStatus=pending and the background geocoding worker fills them in.
     """
     try:
         # Validate required fields
@@ -194,6 +303,12 @@ def create_gallery(gallery_data):
             'createdAt': current_time,
             'updatedAt': current_time
         }
+        gallery_item.update(gallery_facets.list_index_fields(gallery_item))
+        
+        if STORAGE_LAYOUT == 'id':
+            # Objects live under the immutable ID, display names only in DynamoDB
+            gallery_item['storageLayout'] = 'id'
+            gallery_item['s3Prefix'] = f"{ID_LAYOUT_PREFIX}{gallery_id}/"
         
         # Add coordinates if provided
         if 'latitude' in gallery_data and 'longitude' in gallery_data:
@@ -202,22 +317,18 @@ def create_gallery(gallery_data):
             gallery_item['longitude'] = Decimal(str(gallery_data['longitude']))
             logger.info(f"Added coordinates for gallery {gallery_item['name']}: {gallery_data['latitude']}, {gallery_data['longitude']}")
         else:
-            # Try to geocode the location if coordinates not provided
-            try:
-                latlon = geocode_place(gallery_data['name'], gallery_data['country'])
-                if latlon:
-                    gallery_item['latitude'] = Decimal(str(latlon[0]))
-                    gallery_item['longitude'] = Decimal(str(latlon[1]))
-                    logger.info(f"Geocoded coordinates for gallery {gallery_item['name']}: {latlon[0]}, {latlon[1]}")
-                else:
-                    logger.warning(f"Could not geocode coordinates for gallery {gallery_item['name']}")
-            except Exception as e:
-                logger.error(f"Error geocoding gallery {gallery_item['name']}: {str(e)}")
+            # Never wait on the network here: cached or gazetteer answers only, the rest is queued
+            gallery_item.update(offline_geocode_fields(gallery_item['name'], gallery_item['country'], current_time))
         tbl_galleries.put_item(Item=gallery_item)
+        
+        # Index the S3 folder so reconciliation finds this gallery instead of creating another
+        gallery_prefix = gallery_storage_prefix(gallery_item)
+        register_gallery_path(gallery_prefix, gallery_id)
+        update_gallery_years(gallery_id, [], gallery_years(gallery_item))
 
         # Create S3 folder
         try:
-            s3_client.put_object(Bucket=BUCKET_NAME, Key=f"galleries/{gallery_item['continent']}/{gallery_item['country']}/{gallery_item['name']}/", Body=b"")
+            s3_client.put_object(Bucket=BUCKET_NAME, Key=gallery_prefix, Body=b"")
             logger.info(f"Created S3 folder for gallery {gallery_item['name']}")
         except Exception as s3_error:
             logger.warning(f"Failed to create S3 folder for gallery {gallery_item['name']}: {str(s3_error)}")
@@ -245,6 +356,9 @@ def create_gallery(gallery_data):
             # Convert Decimal back to float for JSON response
             response_gallery['latitude'] = float(gallery_item['latitude'])
             response_gallery['longitude'] = float(gallery_item['longitude'])
+        elif gallery_item.get('geocodeStatus') == 'pending':
+            response_gallery['geocodeStatus'] = 'pending'
+            start_background_job({'job': 'geocode_galleries'}, context)
         
         return create_response(201, {
             'message': 'Gallery created successfully',
@@ -252,7 +366,7 @@ def create_gallery(gallery_data):
         })
     except Exception as e:
         logger.error(f"Error creating gallery: {str(e)}")
-        logger.error(f"Gallery data received: {gallery_data}")
+        logger.error("Gallery data received: %s", summary(gallery_data))
         import traceback
         logger.error(f"Full traceback: {traceback.format_exc()}")
         return create_response(500, {'error': 'Failed to create gallery', 'details': str(e)})
@@ -263,7 +377,8 @@ def list_galleries():
     """
     logger.info("Listing galleries from DynamoDB table")
     scan = tbl_galleries.scan()
-    items = scan.get('Items', [])
+    # Galleries whose deletion job is running are already gone for the UI
+    items = [it for it in scan.get('Items', []) if not it.get('deletionStatus')]
 
     # Sort galleries by sortOrder if available, otherwise by creation date
     try:
@@ -279,66 +394,428 @@ def list_galleries():
         'lastUpdated': datetime.utcnow().isoformat() + 'Z'
     })
 
-def delete_gallery(gallery_id):
+
+def query_all(table, **params):
+    """
+    Every item of a Query, or of a Scan when params has no KeyConditionExpression, across pages
+    """
+    operation = table.query if 'KeyConditionExpression' in params else table.scan
+    items = []
+    while True:
+        resp = operation(**params)
+        items.extend(resp.get('Items', []))
+        if 'LastEvaluatedKey' not in resp:
+            return items
+        params['ExclusiveStartKey'] = resp['LastEvaluatedKey']
+
+
+def gallery_index_entries(filters):
+    """
+    Ordering entries (gallery_facets.ORDER_ATTRIBUTES) of the galleries a filter can match,
+    read from the narrowest index: year members, then country, then continent.
+    filters must name at least one of them.
+    """
+    from boto3.dynamodb.conditions import Key
+    if 'year' in filters:
+        members = query_all(tbl_gallery_years, KeyConditionExpression=Key('year').eq(filters['year']),
+                            ProjectionExpression='galleryId')
+        return batch_get_keys(GALLERIES_TABLE_NAME, [{'galleryId': it['galleryId']} for it in members],
+                              attributes=gallery_facets.ORDER_ATTRIBUTES)
+    if 'country' in filters:
+        return query_all(tbl_galleries, IndexName=COUNTRY_INDEX,
+                         KeyConditionExpression=Key('country').eq(filters['country']))
+    return query_all(tbl_galleries, IndexName=CONTINENT_INDEX,
+                     KeyConditionExpression=Key('continent').eq(filters['continent']))
+
+
+def list_index_entries(attributes, after=None, limit=None):
+    """
+    listOrder-index entries in list order, after the listKey `after`, at most limit of them.
+    Only the pages that hold them are read.
+    """
+    from boto3.dynamodb.conditions import Key
+    condition = Key('listed').eq(gallery_facets.LISTED)
+    if after:
+        condition = condition & Key('listKey').gt(after)
+    params = {'IndexName': LIST_ORDER_INDEX, 'KeyConditionExpression': condition,
+              'ProjectionExpression': ', '.join(f"#a{i}" for i in range(len(attributes))),
+              'ExpressionAttributeNames': {f"#a{i}": name for i, name in enumerate(attributes)}}
+    if limit is None:
+        return query_all(tbl_galleries, **params)
+    entries = []
+    while len(entries) < limit:
+        params['Limit'] = limit - len(entries)
+        resp = tbl_galleries.query(**params)
+        entries.extend(resp.get('Items', []))
+        if 'LastEvaluatedKey' not in resp:
+            break
+        params['ExclusiveStartKey'] = resp['LastEvaluatedKey']
+    return entries
+
+
+def list_gallery_page(limit, token=None):
+    """
+    One unfiltered page in list order: (galleries, continuationToken or None).
+    Reads the page's listOrder-index entries plus one to tell whether another page follows.
+    """
+    after = gallery_facets.token_list_key(token) if token else None
+    entries = list_index_entries(['galleryId', 'sortOrder', 'createdAt'], after=after, limit=limit + 1)
+    page = entries[:limit]
+    items = batch_get_galleries([entry['galleryId'] for entry in page])
+    galleries = [items[entry['galleryId']] for entry in page if entry['galleryId'] in items]
+    next_token = gallery_facets.encode_token(page[-1]) if len(entries) > limit else None
+    return galleries, next_token
+
+
+def filter_galleries(query_params):
     """
-    Delete a gallery in manage gallery page
+    One page of the galleries matching continent / country / year, in list order (gallery_facets.py),
+    or of every gallery when the request only pages
     """
     try:
-        # Get gallery info first
-        gallery_response = get_gallery(gallery_id)
-        if gallery_response['statusCode'] != 200:
-            return gallery_response
-        
-        gallery = json.loads(gallery_response['body'])
-        
-        # 1) Delete gallery folder and all contents from S3
-        gallery_prefix = f"galleries/{gallery['continent']}/{gallery['country']}/{gallery['name']}/"
-        
-        objects_to_delete = []
-        try:
-            paginator = s3_client.get_paginator('list_objects_v2')
-            for page in paginator.paginate(Bucket=BUCKET_NAME, Prefix=gallery_prefix):
-                for obj in page.get('Contents', []):
-                    objects_to_delete.append({'Key': obj['Key']})
-            if objects_to_delete:
-                s3_client.delete_objects(Bucket=BUCKET_NAME, Delete={'Objects': objects_to_delete})
-        except Exception as e:
-            logger.warning(f"S3 delete error for prefix {gallery_prefix}: {e}")
+        filters = gallery_facets.parse_filters(query_params)
+        limit = gallery_facets.page_size(query_params.get('limit'))
+        if not filters:
+            # Paging through the whole list: the total is in the facets, not counted per page
+            galleries, next_token = list_gallery_page(limit, query_params.get('continuationToken'))
+            return create_response(200, {
+                'galleries': galleries,
+                'count': len(galleries),
+                'total': None,
+                'filters': filters,
+                'continuationToken': next_token,
+                'lastUpdated': datetime.utcnow().isoformat() + 'Z'
+            })
+        entries = gallery_index_entries(filters)
+        page, next_token, total = gallery_facets.select_page(
+            entries, filters, limit, query_params.get('continuationToken'))
+        items = batch_get_galleries([entry['galleryId'] for entry in page])
+        galleries = [items[entry['galleryId']] for entry in page if entry['galleryId'] in items]
+        logger.info(f"Filtered galleries {filters}: {len(galleries)} of {total}")
+        return create_response(200, {
+            'galleries': galleries,
+            'count': len(galleries),
+            'total': total,
+            'filters': filters,
+            'continuationToken': next_token,
+            'lastUpdated': datetime.utcnow().isoformat() + 'Z'
+        })
+    except FilterError as e:
+        return create_response(400, {'error': str(e)})
+    except Exception as e:
+        logger.error(f"Error filtering galleries: {str(e)}")
+        return create_response(500, {'error': 'Failed to list galleries', 'details': str(e)})
 
-        # 2) Delete all photo items from DynamoDB (GalleryPhotos)
-        ddb_photos_deleted = 0
-        try:
-            from boto3.dynamodb.conditions import Key
-            q = tbl_gallery_photos.query(KeyConditionExpression=Key('galleryId').eq(str(gallery_id)))
-            items = q.get('Items', [])
-            if items:
-                with tbl_gallery_photos.batch_writer(overwrite_by_pkeys=['galleryId', 'photoId']) as batch:
-                    for it in items:
-                        batch.delete_item(Key={'galleryId': str(gallery_id), 'photoId': str(it.get('photoId') or it.get('photoNumber'))})
-                        ddb_photos_deleted += 1
-        except Exception as e:
-            logger.warning(f"DynamoDB delete GalleryPhotos error for {gallery_id}: {e}")
 
-        # 3) Delete the gallery item itself from DynamoDB (Galleries)
-        ddb_gallery_deleted = False
-        try:
-            tbl_galleries.delete_item(Key={'galleryId': str(gallery_id)})
-            ddb_gallery_deleted = True
-        except Exception as e:
-            logger.warning(f"DynamoDB delete Galleries error for {gallery_id}: {e}")
+def get_gallery_facets():
+    """
+    Years, continents and countries of the listed galleries with counts, for the homepage filters
+    """
+    try:
+        entries = list_index_entries(['galleryId', 'continent', 'country', 'years', 'createdAt'])
+        return create_response(200, {
+            **gallery_facets.summarize_facets(entries),
+            'lastUpdated': datetime.utcnow().isoformat() + 'Z'
+        })
+    except Exception as e:
+        logger.error(f"Error reading gallery facets: {str(e)}")
+        return create_response(500, {'error': 'Failed to read gallery filters', 'details': str(e)})
+
+
+def get_gallery_map():
+    """
+    Every listed gallery with what the homepage map shows (gallery_facets.LIST_ATTRIBUTES), in list order
+    """
+    try:
+        galleries = list_index_entries(gallery_facets.LIST_ATTRIBUTES)
+        return create_response(200, {
+            'galleries': galleries,
+            'total': len(galleries),
+            'lastUpdated': datetime.utcnow().isoformat() + 'Z'
+        })
+    except Exception as e:
+        logger.error(f"Error reading gallery map: {str(e)}")
+        return create_response(500, {'error': 'Failed to read gallery map', 'details': str(e)})
+
+
+def update_gallery_years(gallery_id, old_years, new_years, table=None):
+    """
+    Move a gallery's GalleryYears entries from old_years to new_years, in one batched write
+    """
+    added = set(map(str, new_years)) - set(map(str, old_years))
+    removed = set(map(str, old_years)) - set(map(str, new_years))
+    if not added and not removed:
+        return
+    with (table or tbl_gallery_years).batch_writer() as batch:
+        for year in sorted(added):
+            batch.put_item(Item={'year': year, 'galleryId': str(gallery_id)})
+        for year in sorted(removed):
+            batch.delete_item(Key={'year': year, 'galleryId': str(gallery_id)})
+
+
+def rebuild_gallery_year_index():
+    """
+    Backfill the GalleryYears index from the Galleries table and drop entries of galleries
+    that no longer exist or no longer cover the year
+    """
+    try:
+        galleries = query_all(tbl_galleries, ProjectionExpression='galleryId, years, createdAt, deletionStatus')
+        expected = {(year, str(it['galleryId'])) for it in galleries if not it.get('deletionStatus')
+                    for year in gallery_years(it)}
+        existing = {(str(it['year']), str(it['galleryId'])) for it in query_all(tbl_gallery_years)}
+        with tbl_gallery_years.batch_writer() as batch:
+            for year, gallery_id in expected - existing:
+                batch.put_item(Item={'year': year, 'galleryId': gallery_id})
+            for year, gallery_id in existing - expected:
+                batch.delete_item(Key={'year': year, 'galleryId': gallery_id})
+        logger.info(f"Rebuilt gallery year index: {len(expected - existing)} added, "
+                    f"{len(existing - expected)} removed")
+        return create_response(200, {
+            'message': 'Gallery year index rebuilt',
+            'entries': len(expected),
+            'added': len(expected - existing),
+            'removed': len(existing - expected)
+        })
+    except Exception as e:
+        logger.error(f"Error rebuilding gallery year index: {str(e)}")
+        return create_response(500, {'error': 'Failed to rebuild gallery year index', 'details': str(e)})
 
-        logger.info(f"Successfully deleted gallery {gallery_id}: S3 objects={len(objects_to_delete)}, photos={ddb_photos_deleted}, galleryItem={ddb_gallery_deleted}")
+
+def rebuild_gallery_list_index():
+    """
+    Backfill listOrder-index: set listed and listKey on every gallery that is not being deleted
+    and whose key is missing or stale, and take galleries being deleted out
+    """
+    try:
+        galleries = query_all(tbl_galleries, ProjectionExpression='galleryId, sortOrder, createdAt, '
+                                                                  'deletionStatus, listed, listKey')
+        indexed = removed = 0
+        for item in galleries:
+            if item.get('deletionStatus'):
+                if item.get('listed'):
+                    tbl_galleries.update_item(Key={'galleryId': item['galleryId']}, UpdateExpression='REMOVE listed')
+                    removed += 1
+                continue
+            fields = gallery_facets.list_index_fields(item)
+            if item.get('listed') != fields['listed'] or item.get('listKey') != fields['listKey']:
+                tbl_galleries.update_item(
+                    Key={'galleryId': item['galleryId']},
+                    UpdateExpression='SET listed = :l, listKey = :k',
+                    ExpressionAttributeValues={':l': fields['listed'], ':k': fields['listKey']}
+                )
+                indexed += 1
+        logger.info(f"Rebuilt gallery list index: {indexed} updated, {removed} removed")
         return create_response(200, {
-            'message': 'Gallery deleted successfully',
-            's3DeletedObjects': len(objects_to_delete),
-            'ddbPhotosDeleted': ddb_photos_deleted,
-            'ddbGalleryDeleted': ddb_gallery_deleted
+            'message': 'Gallery list index rebuilt',
+            'galleries': len(galleries),
+            'updated': indexed,
+            'removed': removed
         })
+    except Exception as e:
+        logger.error(f"Error rebuilding gallery list index: {str(e)}")
+        return create_response(500, {'error': 'Failed to rebuild gallery list index', 'details': str(e)})
+
+
+def delete_gallery(gallery_id, context=None):
+    """
+    Delete a gallery in manage gallery page.
+    Deletion runs as a background job (S3 objects, GalleryPhotos, PhotoRatings, then the gallery
+    item); this starts or resumes it and returns its progress. Poll action=delete_status for the rest.
+    """
+    try:
+        job = SyncCheckpoint(tbl_sync_state, f"delete#{gallery_id}")
+        state = job.load()
+        gallery = tbl_galleries.get_item(Key={'galleryId': str(gallery_id)}).get('Item')
+        if not state or state.get('status') == 'complete':
+            if not gallery:
+                if state:
+                    return create_response(200, {'message': 'Gallery deleted successfully', 'job': state})
+                return create_response(404, {'error': 'Gallery not found'})
+            state = {
+                'status': 'running',
+                'phase': 's3',
+                'galleryId': str(gallery_id),
+                'prefix': gallery_storage_prefix(gallery),
+                's3DeletedObjects': 0,
+                'ddbPhotosDeleted': 0,
+                'ddbRatingsDeleted': 0,
+                'startedAt': datetime.utcnow().isoformat() + 'Z'
+            }
+            job.save(**state)
+            # Hide the gallery right away; the job removes the item last
+            tbl_galleries.update_item(
+                Key={'galleryId': str(gallery_id)},
+                UpdateExpression="SET deletionStatus = :s, updatedAt = :now REMOVE listed",
+                ExpressionAttributeValues={':s': 'deleting', ':now': datetime.utcnow().isoformat() + 'Z'}
+            )
+            update_gallery_years(gallery_id, gallery_years(gallery), [])
+            logger.info(f"Started deletion job for gallery {gallery_id} ({state['prefix']})")
+        
+        if start_deletion_worker(gallery_id, context):
+            return create_response(202, {'message': 'Gallery deletion started', 'job': state})
+        
+        # No asynchronous invocation available: work inline until the time budget runs out
+        state = run_gallery_deletion(gallery_id, context)
+        if state.get('status') == 'complete':
+            return create_response(200, {'message': 'Gallery deleted successfully', 'job': state})
+        return create_response(202, {'message': 'Gallery deletion in progress, repeat the request to continue',
+                                     'job': state})
         
     except Exception as e:
         logger.error(f"Error deleting gallery {gallery_id}: {str(e)}")
         return create_response(500, {'error': 'Failed to delete gallery', 'details': str(e)})
 
+
+def get_gallery_deletion_status(gallery_id):
+    """
+    Progress of a gallery's deletion job
+    """
+    if not gallery_id:
+        return create_response(400, {'error': 'Gallery ID required'})
+    try:
+        state = SyncCheckpoint(tbl_sync_state, f"delete#{gallery_id}").load()
+        if not state:
+            return create_response(404, {'error': 'No deletion job for this gallery'})
+        return create_response(200, {'job': state})
+    except Exception as e:
+        logger.error(f"Error reading deletion status for {gallery_id}: {str(e)}")
+        return create_response(500, {'error': 'Failed to read deletion status', 'details': str(e)})
+
+
+def start_background_job(payload, context):
+    """
+    Run a background job ({'job': ..., ...}) in a fresh asynchronous invocation of this function.
+    Returns False when that is not possible (no Lambda context, missing permission, ...).
+    """
+    if context is None or not getattr(context, 'invoked_function_arn', None):
+        return False
+    try:
+        global lambda_client
+        if lambda_client is None:
+            lambda_client = instrument_client(aws_clients.client('lambda', 'async'))
+        lambda_client.invoke(
+            FunctionName=context.invoked_function_arn,
+            InvocationType='Event',
+            Payload=json.dumps(payload).encode('utf-8')
+        )
+        return True
+    except Exception as e:
+        logger.warning(f"Could not start background job {payload.get('job')}: {e}")
+        return False
+
+
+def start_deletion_worker(gallery_id, context):
+    """
+    Continue a deletion job in a fresh asynchronous invocation of this function
+    """
+    return start_background_job({'job': 'delete_gallery', 'galleryId': str(gallery_id)}, context)
+
+
+def run_gallery_deletion(gallery_id, context=None, continue_async=False):
+    """
+    Advance a gallery deletion job until it completes or the time budget runs out.
+    Phases: s3 (paginated listing, parallel 1,000-key deletes), photos (GalleryPhotos and their
+    PhotoRatings, page by page) and gallery (the item and its path index entry).
+    Every phase is idempotent, so a job picks up from its checkpoint after any interruption.
+    """
+    from boto3.dynamodb.conditions import Key
+    job = SyncCheckpoint(tbl_sync_state, f"delete#{gallery_id}")
+    state = job.load()
+    if not state or state.get('status') == 'complete':
+        return state
+    
+    def should_stop():
+        return context is not None and context.get_remaining_time_in_millis() < SYNC_TIME_BUFFER_MS
+    
+    def save():
+        state['updatedAt'] = datetime.utcnow().isoformat() + 'Z'
+        job.save(**{k: v for k, v in state.items() if k not in ('syncId', 'scope')})
+    
+    stopped = False
+    errors = []
+    state['status'] = 'running'
+    state.pop('errors', None)
+    progress_before = (state['phase'], int(state['s3DeletedObjects']), int(state['ddbPhotosDeleted']))
+    
+    if state['phase'] == 's3':
+        # Deletes run on the pool while the listing continues
+        paginator = s3_client.get_paginator('list_objects_v2')
+        with ContextThreadPoolExecutor(max_workers=DELETE_WORKERS) as pool:
+            in_flight = []
+            for page in paginator.paginate(Bucket=BUCKET_NAME, Prefix=state['prefix']):
+                if should_stop():
+                    stopped = True
+                    break
+                keys = [obj['Key'] for obj in page.get('Contents', [])]
+                if keys:
+                    in_flight.append(pool.submit(delete_keys, s3_bulk_client, BUCKET_NAME, keys))
+                while len(in_flight) >= DELETE_WORKERS:
+                    deleted, batch_errors = in_flight.pop(0).result()
+                    state['s3DeletedObjects'] = int(state['s3DeletedObjects']) + deleted
+                    errors.extend(batch_errors)
+            for future in in_flight:
+                deleted, batch_errors = future.result()
+                state['s3DeletedObjects'] = int(state['s3DeletedObjects']) + deleted
+                errors.extend(batch_errors)
+        if not stopped and not errors:
+            state['phase'] = 'photos'
+        save()
+    
+    while state['phase'] == 'photos' and not stopped and not errors:
+        if should_stop():
+            stopped = True
+            break
+        # Deleted items drop out of the query, so the first page is always the next batch
+        resp = tbl_gallery_photos.query(
+            KeyConditionExpression=Key('galleryId').eq(str(gallery_id)),
+            ProjectionExpression='galleryId, photoId',
+            Limit=100
+        )
+        photos = resp.get('Items', [])
+        if not photos:
+            state['phase'] = 'gallery'
+            break
+        ratings_deleted = 0
+        with tbl_photo_ratings.batch_writer() as batch:
+            for photo in photos:
+                params = {'KeyConditionExpression': Key('photoId').eq(str(photo['photoId'])),
+                          'ProjectionExpression': 'photoId, deviceId'}
+                while True:
+                    ratings = tbl_photo_ratings.query(**params)
+                    for rating in ratings.get('Items', []):
+                        batch.delete_item(Key={'photoId': rating['photoId'], 'deviceId': rating['deviceId']})
+                        ratings_deleted += 1
+                    if 'LastEvaluatedKey' not in ratings:
+                        break
+                    params['ExclusiveStartKey'] = ratings['LastEvaluatedKey']
+        with tbl_gallery_photos.batch_writer(overwrite_by_pkeys=['galleryId', 'photoId']) as batch:
+            for photo in photos:
+                batch.delete_item(Key={'galleryId': str(gallery_id), 'photoId': str(photo['photoId'])})
+        state['ddbRatingsDeleted'] = int(state['ddbRatingsDeleted']) + ratings_deleted
+        state['ddbPhotosDeleted'] = int(state['ddbPhotosDeleted']) + len(photos)
+        save()
+    
+    if state['phase'] == 'gallery' and not stopped and not errors:
+        tbl_galleries.delete_item(Key={'galleryId': str(gallery_id)})
+        unregister_gallery_path(state['prefix'], gallery_id)
+        state['status'] = 'complete'
+        state['phase'] = 'done'
+        state['finishedAt'] = datetime.utcnow().isoformat() + 'Z'
+    
+    if errors:
+        state['status'] = 'failed'
+        state['errors'] = errors[:20]
+        logger.error(f"Deletion of gallery {gallery_id} failed: {errors[:5]}")
+    save()
+    logger.info(f"Deletion job for gallery {gallery_id}: {json.dumps(state, default=str)}")
+    
+    # Re-invoke only while work is getting done, so a job can never spin without progress
+    progressed = progress_before != (state['phase'], int(state['s3DeletedObjects']), int(state['ddbPhotosDeleted']))
+    if continue_async and state['status'] == 'running' and progressed:
+        start_deletion_worker(gallery_id, context)
+    return state
+
+
 def get_gallery(gallery_id):
     """
     Get a specific gallery by ID from DynamoDB
@@ -346,11 +823,12 @@ def get_gallery(gallery_id):
     try:
         # Read gallery basic information from galleries table
         resp = tbl_galleries.get_item(Key={'galleryId': str(gallery_id)})
-        if 'Item' not in resp:
+        # A gallery being deleted is already hidden from the lists
+        if 'Item' not in resp or resp['Item'].get('deletionStatus'):
             return create_response(404, {'error': 'Gallery not found'})
 
         gallery = resp['Item']
-        logger.info(f"Gallery: {gallery}")
+        verbose(logger, "Gallery: %s", summary(gallery))
 
         # Query photos for this gallery
         from boto3.dynamodb.conditions import Key
@@ -433,13 +911,14 @@ def get_gallery(gallery_id):
         return create_response(500, {'error': 'Failed to get gallery', 'details': str(e)})
         
 
-def update_gallery(gallery_data):
+def update_gallery(gallery_data, context=None):
     """Update an existing gallery (DynamoDB is source of truth).
     If name/continent/country changed, move S3 folder (copy-then-delete) and update photo s3Key/image/thumbnail.
+    A move that does not finish before the Lambda timeout returns 202; repeating the request resumes it.
     Also supports setting cover photo.
     """
     try:
-        logger.info(f"Starting update_gallery with data: {json.dumps(gallery_data, default=str)}")
+        verbose(logger, "Starting update_gallery with data: %s", summary(gallery_data))
         
         gallery_id = gallery_data.get('id')
         if not gallery_id:
@@ -452,8 +931,10 @@ def update_gallery(gallery_data):
         if 'Item' not in cur_resp:
             return create_response(404, {'error': 'Gallery not found'})
         current = cur_resp['Item']
+        if current.get('deletionStatus'):
+            return create_response(409, {'error': 'Gallery is being deleted'})
         
-        logger.info(f"Current gallery data: {json.dumps(current, default=str)}")
+        verbose(logger, "Current gallery data: %s", summary(current))
 
         # Check if this is just a cover photo update
         if gallery_data.get('action') == 'set_cover_photo':
@@ -462,14 +943,7 @@ def update_gallery(gallery_data):
                 return create_response(400, {'error': 'photoId is required for cover photo update'})
             
             # Validate the photo belongs to the gallery and get its thumbnail URL
-            from boto3.dynamodb.conditions import Key
-            q = tbl_gallery_photos.query(KeyConditionExpression=Key('galleryId').eq(str(gallery_id)))
-            target_photo = None
-            for it in q.get('Items', []):
-                if (str(it.get('photoId') or it.get('photoNumber')) == str(photo_id)):
-                    target_photo = it
-                    break
-            
+            target_photo = get_gallery_photo(gallery_id, photo_id)
             if not target_photo:
                 return create_response(404, {'error': 'Photo not found in this gallery'})
             
@@ -506,121 +980,62 @@ def update_gallery(gallery_data):
         s3_objects_deleted = 0
         photo_items_updated = 0
 
-        # Move S3 objects if any path component has changed
-        if path_changed:
+        # Move S3 objects if any path component has changed; ID-layout keys never contain names
+        if path_changed and current.get('storageLayout') != 'id':
             # Compute old/new S3 prefixes
-            old_prefix = f"galleries/{current['continent']}/{current['country']}/{current['name']}/"
-            new_prefix = f"galleries/{new_continent}/{new_country}/{new_name}/"
+            old_prefix = gallery_s3_prefix(current['continent'], current['country'], current['name'])
+            new_prefix = gallery_s3_prefix(new_continent, new_country, new_name)
             
+            move = move_gallery_prefix(gallery_id, old_prefix, new_prefix, context)
+            s3_objects_copied = move['totalCopied']
+            s3_objects_deleted = move['totalDeleted']
+            if move.get('conflict'):
+                return create_response(409, {
+                    'error': 'Another move of this gallery is in progress',
+                    'details': f"Finish the move to {move['conflict']} first"
+                })
+            if move['errors']:
+                return create_response(500, {'error': 'Failed to move gallery files in S3', 'details': move['errors'][:20]})
+            if not move['complete']:
+                return create_response(202, {
+                    'message': 'Gallery move in progress, repeat the request to continue',
+                    's3ObjectsCopied': move['totalCopied'],
+                    's3ObjectsDeleted': move['totalDeleted']
+                })
+            
+            # Update DynamoDB photo items and the cover with the new s3Key/image/thumbnail
             try:
-                # Ensure dest "folder" exists
-                try:
-                    s3_client.put_object(Bucket=BUCKET_NAME, Key=new_prefix, Body=b"")
-                except Exception:
-                    pass
-
-                # Copy all objects from old to new
-                paginator = s3_client.get_paginator('list_objects_v2')
-                objects_to_delete = []
-                for page in paginator.paginate(Bucket=BUCKET_NAME, Prefix=old_prefix):
-                    for obj in page.get('Contents', []):
-                        key = obj['Key']
-                        new_key = new_prefix + key[len(old_prefix):]
-                        # Skip folder placeholder keys during copy
-                        if key.endswith('/') and key == old_prefix:
-                            continue
-                        s3_client.copy_object(Bucket=BUCKET_NAME, Key=new_key, CopySource={'Bucket': BUCKET_NAME, 'Key': key})
-                        s3_objects_copied += 1
-                        objects_to_delete.append({'Key': key})
-                
-                # Also delete the old folder placeholder
-                objects_to_delete.append({'Key': old_prefix})
-                
-                if objects_to_delete:
-                    s3_client.delete_objects(Bucket=BUCKET_NAME, Delete={'Objects': objects_to_delete})
-                    s3_objects_deleted = len(objects_to_delete)
-            except Exception as e:
-                logger.error(f"Error moving S3 prefix from {old_prefix} to {new_prefix}: {e}")
-                return create_response(500, {'error': 'Failed to move gallery files in S3', 'details': str(e)})
-
-            # Update DynamoDB photo items with new s3Key/image/thumbnail
-            try:
-                from boto3.dynamodb.conditions import Key
-                q = tbl_gallery_photos.query(KeyConditionExpression=Key('galleryId').eq(str(gallery_id)))
+                photo_items_updated = rewrite_photo_prefix(gallery_id, old_prefix, new_prefix)
                 base_url = f"https://{BUCKET_NAME}.s3.eu-north-1.amazonaws.com"
-                for it in q.get('Items', []):
-                    pid = str(it.get('photoId') or it.get('photoNumber'))
-                    old_key = it.get('s3Key') or ''
-                    new_key = (old_key.replace(old_prefix, new_prefix, 1) if old_key.startswith(old_prefix) else old_key)
-                    new_image = f"{base_url}/{new_key}" if new_key else it.get('image')
-                    # thumbnail may equal image
-                    old_thumb = it.get('thumbnail') or ''
-                    new_thumb = new_image if (old_thumb == it.get('image')) else (f"{base_url}/{new_key}" if old_thumb and old_thumb.startswith(f"{base_url}/{old_prefix}") else old_thumb)
-                    tbl_gallery_photos.update_item(
-                        Key={'galleryId': str(gallery_id), 'photoId': pid},
-                        UpdateExpression="SET s3Key=:k, image=:img, thumbnail=:th, lastModified=:now",
-                        ExpressionAttributeValues={
-                            ':k': new_key,
-                            ':img': new_image,
-                            ':th': new_thumb,
-                            ':now': datetime.utcnow().isoformat() + 'Z'
-                        }
+                cover_url = current.get('coverPhotoURL') or ''
+                if cover_url.startswith(f"{base_url}/{old_prefix}"):
+                    tbl_galleries.update_item(
+                        Key={'galleryId': str(gallery_id)},
+                        UpdateExpression="SET coverPhotoURL = :cpid",
+                        ExpressionAttributeValues={':cpid': f"{base_url}/{new_prefix}" + cover_url[len(f"{base_url}/{old_prefix}"):]}
                     )
-                    photo_items_updated += 1
             except Exception as e:
                 logger.error(f"Error updating photo items for gallery {gallery_id}: {e}")
                 return create_response(500, {'error': 'Failed to update photo records', 'details': str(e)})
+            
+            # Point the path index at the moved folder
+            try:
+                register_gallery_path(new_prefix, gallery_id)
+                unregister_gallery_path(old_prefix, gallery_id)
+            except Exception as e:
+                logger.error(f"Error updating path index for gallery {gallery_id}: {e}")
+                return create_response(500, {'error': 'Failed to update gallery path index', 'details': str(e)})
+            # Objects, records and index are moved; nothing is left to resume
+            SyncCheckpoint(tbl_sync_state, f"move#{gallery_id}").clear()
 
         # Update photo names if provided
         photos_to_update = gallery_data.get('photos', [])
-        logger.info(f"Photos to update: {json.dumps(photos_to_update, default=str)}")
+        logger.info(f"Photos to update: {len(photos_to_update)}")
+        verbose(logger, "Photo updates: %s", summary(photos_to_update))
         
         if photos_to_update:
             try:
-                from boto3.dynamodb.conditions import Key
-                for photo_data in photos_to_update:
-                    photo_id = photo_data.get('id') or photo_data.get('photoId')
-                    new_name = photo_data.get('name')
-                    
-                    logger.info(f"Processing photo: id={photo_id}, name={new_name}")
-                    
-                    if photo_id and new_name is not None:
-                        # First, find the photo in DynamoDB to get the correct photoId
-                        photo_query = tbl_gallery_photos.query(
-                            KeyConditionExpression=Key('galleryId').eq(str(gallery_id))
-                        )
-                        
-                        logger.info(f"Found {len(photo_query.get('Items', []))} photos in gallery")
-                        
-                        # Find the photo by matching id or photoId
-                        target_photo = None
-                        for photo_item in photo_query.get('Items', []):
-                            logger.info(f"Checking photo item: {json.dumps(photo_item, default=str)}")
-                            if (str(photo_item.get('photoId')) == str(photo_id) or 
-                                str(photo_item.get('id')) == str(photo_id) or
-                                str(photo_item.get('photoNumber')) == str(photo_id)):
-                                target_photo = photo_item
-                                logger.info(f"Found matching photo: {json.dumps(target_photo, default=str)}")
-                                break
-                        
-                        if target_photo:
-                            # Update photo name in DynamoDB using the correct photoId
-                            actual_photo_id = str(target_photo.get('photoId') or target_photo.get('photoNumber'))
-                            logger.info(f"Updating photo name for {photo_id} (actual photoId: {actual_photo_id}): {new_name}")
-                            
-                            tbl_gallery_photos.update_item(
-                                Key={'galleryId': str(gallery_id), 'photoId': actual_photo_id},
-                                UpdateExpression="SET #n=:n, lastModified=:now",
-                                ExpressionAttributeNames={'#n': 'name'},
-                                ExpressionAttributeValues={
-                                    ':n': str(new_name).strip(),
-                                    ':now': datetime.utcnow().isoformat() + 'Z'
-                                }
-                            )
-                            photo_items_updated += 1
-                            logger.info(f"Successfully updated photo name for {photo_id}")
-                        else:
-                            logger.warning(f"Photo with id {photo_id} not found in gallery {gallery_id}")
+                photo_items_updated += rename_gallery_photos(gallery_id, photos_to_update)
             except Exception as e:
                 logger.error(f"Error updating photo names for gallery {gallery_id}: {e}")
                 logger.error(f"Full error details: {str(e)}")
@@ -648,14 +1063,7 @@ def update_gallery(gallery_data):
                 # If new_cover_photo_url is a photoId (not a URL), convert it to thumbnail URL
                 if not new_cover_photo_url.startswith('http'):
                     # Find the photo and get its thumbnail URL
-                    from boto3.dynamodb.conditions import Key
-                    q = tbl_gallery_photos.query(KeyConditionExpression=Key('galleryId').eq(str(gallery_id)))
-                    target_photo = None
-                    for it in q.get('Items', []):
-                        if (str(it.get('photoId') or it.get('photoNumber')) == str(new_cover_photo_url)):
-                            target_photo = it
-                            break
-                    
+                    target_photo = get_gallery_photo(gallery_id, new_cover_photo_url)
                     if target_photo and target_photo.get('thumbnail'):
                         new_cover_photo_url = target_photo.get('thumbnail')
                     else:
@@ -671,6 +1079,9 @@ def update_gallery(gallery_data):
                 ExpressionAttributeValues=expr_vals,
                 ExpressionAttributeNames=expr_names
             )
+            # Keep the year filter index in step with the edited years
+            update_gallery_years(gallery_id, gallery_years(current),
+                                 gallery_years({'years': new_years, 'createdAt': current.get('createdAt')}))
         except Exception as e:
             logger.error(f"Error updating gallery item {gallery_id}: {e}")
             return create_response(500, {'error': 'Failed to update gallery metadata', 'details': str(e)})
@@ -684,14 +1095,14 @@ def update_gallery(gallery_data):
             'description': new_description,
             'years': new_years or [],
             'updatedAt': datetime.utcnow().isoformat() + 'Z',
-            'movedS3': path_changed,
+            'movedS3': path_changed and current.get('storageLayout') != 'id',
             's3ObjectsCopied': s3_objects_copied,
             's3ObjectsDeleted': s3_objects_deleted,
             'photosUpdated': photo_items_updated,
             'coverPhotoURL': new_cover_photo_url
         }
 
-        logger.info(f"Updated gallery {gallery_id}: {json.dumps(updated)}")
+        logger.info("Updated gallery %s: %s", gallery_id, summary(updated))
         return create_response(200, {'message': 'Gallery updated successfully', 'gallery': updated})
 
     except Exception as e:
@@ -699,6 +1110,236 @@ def update_gallery(gallery_data):
         return create_response(500, {'error': 'Failed to update gallery', 'details': str(e)})
 
 
+def move_gallery_prefix(gallery_id, old_prefix, new_prefix, context=None):
+    """
+    Move a gallery's S3 folder with the parallel, page-at-a-time move engine.
+    Progress is checkpointed in SyncState (move#<galleryId>) so an interrupted rename resumes.
+    """
+    checkpoint = SyncCheckpoint(tbl_sync_state, f"move#{gallery_id}")
+    state = checkpoint.load()
+    if state.get('newPrefix') and (state['newPrefix'] != new_prefix or state.get('oldPrefix') != old_prefix):
+        # A half-finished move to another folder must be completed before starting a new one
+        return {'copied': 0, 'deleted': 0, 'errors': [], 'complete': False, 'conflict': state['newPrefix']}
+    
+    totals = {'copied': int(state.get('copied', 0)), 'deleted': int(state.get('deleted', 0))}
+    
+    def save_progress(result):
+        checkpoint.save(oldPrefix=old_prefix, newPrefix=new_prefix, status='moving',
+                        copied=totals['copied'] + result['copied'],
+                        deleted=totals['deleted'] + result['deleted'],
+                        startedAt=state.get('startedAt') or datetime.utcnow().isoformat() + 'Z')
+    
+    def should_stop():
+        return context is not None and context.get_remaining_time_in_millis() < SYNC_TIME_BUFFER_MS
+    
+    logger.info(f"Moving gallery {gallery_id} from {old_prefix} to {new_prefix} (resuming: {bool(state)})")
+    save_progress({'copied': 0, 'deleted': 0})
+    result = move_prefix(s3_bulk_client, BUCKET_NAME, old_prefix, new_prefix, workers=MOVE_WORKERS,
+                         should_stop=should_stop, on_progress=save_progress)
+    result['totalCopied'] = totals['copied'] + result['copied']
+    result['totalDeleted'] = totals['deleted'] + result['deleted']
+    return result
+
+
+def rewrite_photo_prefix(gallery_id, old_prefix, new_prefix):
+    """
+    Point the gallery's photo records at their moved objects, written back in batches.
+    Records already under new_prefix are left alone, so this is safe to repeat.
+    """
+    base_url = f"https://{BUCKET_NAME}.s3.eu-north-1.amazonaws.com"
+    old_url, new_url = f"{base_url}/{old_prefix}", f"{base_url}/{new_prefix}"
+    now = datetime.utcnow().isoformat() + 'Z'
+    updated = 0
+    with tbl_gallery_photos.batch_writer(overwrite_by_pkeys=['galleryId', 'photoId']) as batch:
+        for item in query_gallery_photos(gallery_id):
+            changed = {}
+            if (item.get('s3Key') or '').startswith(old_prefix):
+                changed['s3Key'] = new_prefix + item['s3Key'][len(old_prefix):]
+            for field in ('image', 'thumbnail'):
+                if (item.get(field) or '').startswith(old_url):
+                    changed[field] = new_url + item[field][len(old_url):]
+            if changed:
+                batch.put_item(Item={**item, **changed, 'lastModified': now})
+                updated += 1
+    return updated
+
+
+def migrate_storage_layout(gallery_id=None, context=None):
+    """
+    Migrate legacy path-layout galleries (one, or all of them) to the immutable ID layout.
+    Stops before the Lambda timeout; calling again resumes where it left off.
+    """
+    try:
+        if gallery_id:
+            item = tbl_galleries.get_item(Key={'galleryId': str(gallery_id)}).get('Item')
+            if not item:
+                return create_response(404, {'error': 'Gallery not found'})
+            galleries = [item]
+        else:
+            galleries = []
+            params = {}
+            while True:
+                resp = tbl_galleries.scan(**params)
+                galleries.extend(it for it in resp.get('Items', []) if it.get('storageLayout') != 'id')
+                if 'LastEvaluatedKey' not in resp:
+                    break
+                params['ExclusiveStartKey'] = resp['LastEvaluatedKey']
+        
+        results = []
+        pending = []
+        for gallery in galleries:
+            if gallery.get('storageLayout') == 'id':
+                continue
+            if context is not None and context.get_remaining_time_in_millis() < SYNC_TIME_BUFFER_MS:
+                pending.append(gallery['galleryId'])
+                continue
+            result = migrate_gallery_to_id_layout(gallery, context)
+            results.append(result)
+            if not result['complete']:
+                pending.append(gallery['galleryId'])
+        
+        complete = not pending
+        logger.info(f"Storage layout migration: {len(results)} galleries processed, {len(pending)} pending")
+        return create_response(200, {
+            'message': 'Storage layout migration complete' if complete
+                       else 'Storage layout migration paused, call again to continue',
+            'complete': complete,
+            'galleries': results,
+            'pending': pending
+        })
+    except Exception as e:
+        logger.error(f"Error migrating storage layout: {str(e)}")
+        return create_response(500, {'error': 'Failed to migrate storage layout', 'details': str(e)})
+
+
+def migrate_gallery_to_id_layout(gallery, context=None):
+    """
+    Copy one gallery into gallery-data/<galleryId>/ and switch its records over.
+    Phases, checkpointed in SyncState (migrate#<galleryId>):
+      copy    - parallel server-side copies, originals and thumbnails renamed after their photoId
+      switch  - photo records, cover, gallery item and path index point at the new keys
+      cleanup - the old folder is emptied (anything uploaded meanwhile is moved, not lost)
+    The old objects stay readable until the records have switched.
+    """
+    gallery_id = gallery['galleryId']
+    old_prefix = gallery_s3_prefix(gallery['continent'], gallery['country'], gallery['name'])
+    new_prefix = f"{ID_LAYOUT_PREFIX}{gallery_id}/"
+    base_url = f"https://{BUCKET_NAME}.s3.eu-north-1.amazonaws.com"
+    checkpoint = SyncCheckpoint(tbl_sync_state, f"migrate#{gallery_id}")
+    state = checkpoint.load()
+    phase = state.get('phase', 'copy')
+    result = {'galleryId': gallery_id, 'from': old_prefix, 'to': new_prefix,
+              'copied': 0, 'deleted': 0, 'photosUpdated': 0, 'errors': [], 'complete': False}
+    
+    def should_stop():
+        return context is not None and context.get_remaining_time_in_millis() < SYNC_TIME_BUFFER_MS
+    
+    def key_of(url):
+        return url[len(base_url) + 1:] if url and url.startswith(f"{base_url}/") else None
+    
+    # Objects referenced by photo records are renamed after the photoId, the rest keep their path
+    key_map = {}
+    for photo in query_gallery_photos(gallery_id):
+        photo_id = str(photo['photoId'])
+        original_key = photo.get('s3Key') or ''
+        if original_key.startswith(old_prefix):
+            extension = original_key.rsplit('.', 1)[-1].lower() if '.' in original_key.split('/')[-1] else 'jpg'
+            key_map[original_key] = f"{new_prefix}{photo_id}.{extension}"
+        thumb_key = photo.get('thumbnailKey') or key_of(photo.get('thumbnail'))
+        if thumb_key and thumb_key.startswith(old_prefix) and thumb_key != original_key:
+            extension = thumb_key.rsplit('.', 1)[-1].lower() if '.' in thumb_key.split('/')[-1] else 'jpg'
+            key_map[thumb_key] = f"{new_prefix}thumbnails/{photo_id}.{extension}"
+    
+    def new_key(key):
+        return key_map.get(key) or new_prefix + key[len(old_prefix):]
+    
+    def cleanup_target(obj):
+        # Objects older than the copy phase were copied then; only later uploads still need it
+        last_modified = obj.get('LastModified')
+        if last_modified is not None and last_modified < copy_started_at:
+            return None
+        return new_key(obj['Key'])
+    
+    def new_url(url):
+        key = key_of(url)
+        if not key or not key.startswith(old_prefix):
+            return url
+        return f"{base_url}/{new_key(key)}"
+    
+    def switch_records():
+        now = datetime.utcnow().isoformat() + 'Z'
+        updated = 0
+        with tbl_gallery_photos.batch_writer(overwrite_by_pkeys=['galleryId', 'photoId']) as batch:
+            for photo in query_gallery_photos(gallery_id):
+                changed = {}
+                if (photo.get('s3Key') or '').startswith(old_prefix):
+                    changed['s3Key'] = new_key(photo['s3Key'])
+                if (photo.get('thumbnailKey') or '').startswith(old_prefix):
+                    changed['thumbnailKey'] = new_key(photo['thumbnailKey'])
+                for field in ('image', 'thumbnail'):
+                    if photo.get(field) and new_url(photo[field]) != photo[field]:
+                        changed[field] = new_url(photo[field])
+                if changed:
+                    batch.put_item(Item={**photo, **changed, 'lastModified': now})
+                    updated += 1
+        return updated
+    
+    started = state.get('copyStartedAt') or datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+    # Allow for clock skew between the Lambda and S3
+    copy_started_at = datetime.fromisoformat(started.replace('Z', '+00:00')) - timedelta(minutes=5)
+    
+    if phase == 'copy':
+        copied_after = state.get('copiedAfter')
+        params = {'Bucket': BUCKET_NAME, 'Prefix': old_prefix}
+        if copied_after:
+            params['StartAfter'] = copied_after
+        with ContextThreadPoolExecutor(max_workers=MOVE_WORKERS) as pool:
+            for page in s3_client.get_paginator('list_objects_v2').paginate(**params):
+                objects = page.get('Contents', [])
+                if not objects:
+                    continue
+                if should_stop():
+                    return result
+                copied, errors = copy_keys(
+                    s3_bulk_client, BUCKET_NAME, [(obj['Key'], new_key(obj['Key']), obj.get('Size')) for obj in objects], pool
+                )
+                result['copied'] += len(copied)
+                if errors:
+                    result['errors'].extend(errors)
+                    return result
+                checkpoint.save(phase='copy', copiedAfter=objects[-1]['Key'], oldPrefix=old_prefix,
+                                copyStartedAt=started)
+        phase = 'switch'
+        checkpoint.save(phase=phase, oldPrefix=old_prefix, copyStartedAt=started)
+    
+    if phase == 'switch':
+        result['photosUpdated'] += switch_records()
+        update_expr = "SET storageLayout = :layout, s3Prefix = :prefix, updatedAt = :now"
+        expr_vals = {':layout': 'id', ':prefix': new_prefix, ':now': datetime.utcnow().isoformat() + 'Z'}
+        if gallery.get('coverPhotoURL') and new_url(gallery['coverPhotoURL']) != gallery['coverPhotoURL']:
+            update_expr += ", coverPhotoURL = :cpid"
+            expr_vals[':cpid'] = new_url(gallery['coverPhotoURL'])
+        tbl_galleries.update_item(Key={'galleryId': str(gallery_id)}, UpdateExpression=update_expr,
+                                  ExpressionAttributeValues=expr_vals)
+        register_gallery_path(new_prefix, gallery_id)
+        unregister_gallery_path(old_prefix, gallery_id)
+        phase = 'cleanup'
+        checkpoint.save(phase=phase, oldPrefix=old_prefix, copyStartedAt=started)
+    
+    if phase == 'cleanup':
+        # Copying again before deleting keeps anything uploaded to the old folder during the migration
+        move = move_prefix(s3_bulk_client, BUCKET_NAME, old_prefix, new_prefix, workers=MOVE_WORKERS,
+                           should_stop=should_stop, new_key=cleanup_target)
+        result['deleted'] += move['deleted']
+        result['errors'].extend(move['errors'])
+        if not move['complete'] or move['errors']:
+            return result
+        result['photosUpdated'] += switch_records()
+        checkpoint.clear()
+        result['complete'] = True
+    
+    logger.info(f"Migrated gallery {gallery_id} to {new_prefix}: {json.dumps(result, default=str)}")
+    return result
 
 
 def upload_photos(gallery_id, upload_data):
@@ -706,6 +1347,8 @@ def upload_photos(gallery_id, upload_data):
     Upload photos to a gallery (DynamoDB + S3)
     """
     try:
+        # Pillow is only needed here; importing it lazily keeps it out of every other cold start
+        from PIL import Image
         logger.info(f"Starting photo upload for gallery ID: {gallery_id}")
         
         # Get gallery information from DynamoDB
@@ -713,8 +1356,10 @@ def upload_photos(gallery_id, upload_data):
         if 'Item' not in dg:
             return create_response(404, {'error': 'Gallery not found'})
         gallery = dg['Item']
+        if gallery.get('deletionStatus'):
+            return create_response(409, {'error': 'Gallery is being deleted'})
 
-        gallery_path = f"galleries/{gallery['continent']}/{gallery['country']}/{gallery['name']}"
+        gallery_path = gallery_storage_prefix(gallery).rstrip('/')
         
         # Check upload data
         photos_data = upload_data.get('photos', [])
@@ -744,6 +1389,8 @@ def upload_photos(gallery_id, upload_data):
         current_photo_count = len(existing_photos.get('Items', []))
         
         uploaded_photos = []
+        duplicate_photos = []
+        seen_hashes = {}
         
         for photo_index, photo_data in enumerate(photos_data):
             filename = photo_data.get('filename')
@@ -757,14 +1404,28 @@ def upload_photos(gallery_id, upload_data):
             file_extension = filename.split('.')[-1].lower()
             if file_extension not in ['jpg', 'jpeg', 'png', 'webp', 'avif']:
                 continue
+
+            import base64
+            image_bytes = base64.b64decode(image_data.split(',')[1] if ',' in image_data else image_data)
+
+            # Skip bytes that are already stored in this gallery (re-upload or client retry)
+            content_hash = compute_content_hash(image_bytes)
+            existing_photo = seen_hashes.get(content_hash) or find_photo_by_content_hash(gallery_id, content_hash)
+            if existing_photo:
+                logger.info(f"Skipping duplicate photo {filename}: same content as {existing_photo.get('photoId')}")
+                duplicate_photos.append({
+                    **existing_photo,
+                    'id': existing_photo.get('photoId'),
+                    'duplicate': True,
+                    'filename': filename
+                })
+                continue
                 
             # Generate unique filename
             unique_id = str(uuid.uuid4())
             s3_key = f'{gallery_path}/{unique_id}.{file_extension}'
 
             # Upload original image
-            import base64
-            image_bytes = base64.b64decode(image_data.split(',')[1] if ',' in image_data else image_data)
             s3_client.put_object(
                 Bucket=BUCKET_NAME,
                 Key=s3_key,
@@ -772,7 +1433,8 @@ def upload_photos(gallery_id, upload_data):
                 ContentType=content_type,
                 Metadata={
                     'original-filename': filename,
-                    'uploaded-at': datetime.utcnow().isoformat()
+                    'uploaded-at': datetime.utcnow().isoformat(),
+                    'content-sha256': content_hash
                 }
             )
                 
@@ -809,6 +1471,7 @@ def upload_photos(gallery_id, upload_data):
                 'uploadedAt': datetime.utcnow().isoformat() + 'Z',   
                 'format': file_extension.upper(),
                 'lastModified': datetime.utcnow().isoformat() + 'Z',
+                'contentHash': content_hash,
                 'sortOrder': current_photo_count + photo_index + 1  # Add sort order based on existing photos + upload order
             }
                 
@@ -823,6 +1486,7 @@ def upload_photos(gallery_id, upload_data):
                 
             # Store to DynamoDB
             tbl_gallery_photos.put_item(Item=photo_metadata)
+            seen_hashes[content_hash] = photo_metadata
 
             # Frontend response structure
             uploaded_photos.append({
@@ -831,6 +1495,13 @@ def upload_photos(gallery_id, upload_data):
             })
         
         if not uploaded_photos:
+            if duplicate_photos:
+                return create_response(200, {
+                    'message': f'All {len(duplicate_photos)} photos already exist in this gallery',
+                    'uploaded_photos': [],
+                    'duplicate_photos': duplicate_photos,
+                    'gallery_id': gallery_id
+                })
             return create_response(400, {'error': 'No photos were successfully uploaded'})
         
         # Update gallery information - use actual photo count from database
@@ -872,7 +1543,7 @@ def upload_photos(gallery_id, upload_data):
                     ExpressionAttributeValues=expr_vals,
                     ReturnValues='UPDATED_NEW'
                 )
-                logger.info(f"Fallback update response: {fallback_response}")
+                verbose(logger, "Fallback update response: %s", summary(fallback_response.get('Attributes')))
                 logger.info(f"Used fallback method to update photo count for gallery {gallery_id}")
             except Exception as fallback_error:
                 logger.error(f"Fallback method also failed: {str(fallback_error)}")
@@ -897,6 +1568,7 @@ def upload_photos(gallery_id, upload_data):
         return create_response(200, {
             'message': f'Successfully uploaded {len(uploaded_photos)} photos',
             'uploaded_photos': uploaded_photos,
+            'duplicate_photos': duplicate_photos,
             'gallery_id': gallery_id
         })
         
@@ -915,19 +1587,13 @@ def delete_photo(gallery_id: str, payload: dict):
         photo_number = payload.get('photoNumber')
         s3_key = payload.get('s3Key')
 
-        # Find record from DynamoDB
-        from boto3.dynamodb.conditions import Key
+        # Find record from DynamoDB: photoId is the sort key, s3Key goes through its GSI
         item = None
 
-        if photo_number:
-            resp = tbl_gallery_photos.get_item(Key={'galleryId': str(gallery_id), 'photoId': str(photo_number)})
-            item = resp.get('Item')
-        elif photo_id or s3_key:
-            q = tbl_gallery_photos.query(KeyConditionExpression=Key('galleryId').eq(str(gallery_id)))
-            for it in q.get('Items', []):
-                if it.get('photoId') == photo_id or it.get('s3Key') == s3_key:
-                    item = it
-                    break
+        if photo_number or photo_id:
+            item = get_gallery_photo(gallery_id, photo_number or photo_id)
+        if not item and s3_key:
+            item = find_photo_by_s3_key(gallery_id, s3_key)
 
         if not item:
             return create_response(404, {'error': 'Photo not found'})
@@ -992,7 +1658,7 @@ def delete_photo(gallery_id: str, payload: dict):
                     ExpressionAttributeValues={':z': 0, ':one': 1, ':now': now_ts},
                     ReturnValues='UPDATED_NEW'
                 )
-                logger.info(f"Fallback deletion update response: {fallback_response}")
+                verbose(logger, "Fallback deletion update response: %s", summary(fallback_response.get('Attributes')))
                 logger.info(f"Used fallback method to update photo count after deletion")
             except Exception as fallback_error:
                 logger.error(f"Fallback method also failed after deletion: {str(fallback_error)}")
@@ -1018,6 +1684,100 @@ def delete_photo(gallery_id: str, payload: dict):
         return create_response(500, {'error': str(e)})
 
 
+def delete_photos(gallery_id: str, payload: dict):
+    """
+    Delete several photos of a gallery in one request.
+    Accepts payload with photoIds. Originals and thumbnails are removed with batched
+    delete_objects calls and records with batch_writer; photoCount and the cover
+    are adjusted once for the whole batch.
+    """
+    try:
+        photo_ids = payload.get('photoIds')
+        if not isinstance(photo_ids, list) or not photo_ids:
+            return create_response(400, {'error': 'photoIds must be a non-empty list'})
+        photo_ids = list(dict.fromkeys(str(photo_id) for photo_id in photo_ids))
+        if len(photo_ids) > MAX_BULK_DELETE_PHOTOS:
+            return create_response(400, {'error': f'At most {MAX_BULK_DELETE_PHOTOS} photos can be deleted per request'})
+
+        gallery = tbl_galleries.get_item(Key={'galleryId': str(gallery_id)}).get('Item')
+        if not gallery:
+            return create_response(404, {'error': 'Gallery not found'})
+
+        photos = batch_get_keys(
+            GALLERY_PHOTOS_TABLE_NAME,
+            [{'galleryId': str(gallery_id), 'photoId': photo_id} for photo_id in photo_ids]
+        )
+        photos_by_id = {str(photo['photoId']): photo for photo in photos}
+        not_found = [photo_id for photo_id in photo_ids if photo_id not in photos_by_id]
+
+        # Original and thumbnail of every photo, deleted together in batches of 1,000
+        keys_by_photo = {}
+        for photo_id, photo in photos_by_id.items():
+            keys = [photo.get('s3Key'), photo.get('thumbnailKey') or s3_key_from_url(photo.get('thumbnail'))]
+            keys_by_photo[photo_id] = [key for key in dict.fromkeys(keys) if key and not key.endswith('/')]
+        all_keys = [key for keys in keys_by_photo.values() for key in keys]
+        failed_keys = []
+        deleted_objects, errors = delete_keys(s3_bulk_client, BUCKET_NAME, all_keys, failed_keys=failed_keys)
+
+        # Records are only removed once their objects are gone, so a failed photo can be retried
+        failed_keys = set(failed_keys)
+        deleted_ids = [photo_id for photo_id, keys in keys_by_photo.items() if not failed_keys.intersection(keys)]
+        with tbl_gallery_photos.batch_writer() as batch:
+            for photo_id in deleted_ids:
+                batch.delete_item(Key={'galleryId': str(gallery_id), 'photoId': photo_id})
+        logger.info(f"Deleted {len(deleted_ids)} photos ({deleted_objects} objects) from gallery {gallery_id}")
+
+        update_expr = "SET photoCount = if_not_exists(photoCount, :z) - :n, updatedAt = :now"
+        expr_vals = {':z': 0, ':n': len(deleted_ids), ':now': datetime.utcnow().isoformat() + 'Z'}
+        cover_url = gallery.get('coverPhotoURL')
+        deleted_urls = {photos_by_id[photo_id].get(field) for photo_id in deleted_ids for field in ('thumbnail', 'image')}
+        if cover_url and cover_url in deleted_urls:
+            # Promote the first remaining photo in gallery order (sortOrder, then photoId), as get_gallery
+            # does for a gallery without a cover, or drop the cover if none is left. Photos of this
+            # request whose objects failed to delete are on their way out too.
+            requested = set(photo_ids)
+            remaining = [photo for photo in query_gallery_photos(gallery_id, ConsistentRead=True,
+                                                                 ProjectionExpression='photoId, sortOrder, thumbnail')
+                         if str(photo['photoId']) not in requested and photo.get('thumbnail')]
+            if remaining:
+                first = min(remaining, key=lambda x: (x.get('sortOrder', float('inf')), x.get('photoId', '')))
+                update_expr += ", coverPhotoURL = :cover"
+                expr_vals[':cover'] = first['thumbnail']
+            else:
+                update_expr += " REMOVE coverPhotoURL"
+        updated = tbl_galleries.update_item(
+            Key={'galleryId': str(gallery_id)},
+            UpdateExpression=update_expr,
+            ExpressionAttributeValues=expr_vals,
+            ReturnValues='UPDATED_NEW'
+        ).get('Attributes', {})
+
+        return create_response(200, {
+            'message': f'{len(deleted_ids)} photos deleted',
+            'deleted': deleted_ids,
+            'notFound': not_found,
+            'failed': [photo_id for photo_id in photos_by_id if photo_id not in deleted_ids],
+            'deletedObjects': deleted_objects,
+            'photoCount': updated.get('photoCount'),
+            'coverPhotoURL': updated.get('coverPhotoURL', cover_url if cover_url not in deleted_urls else None),
+            'errors': errors
+        })
+
+    except Exception as e:
+        logger.error(f"Error deleting photos from gallery {gallery_id}: {e}")
+        return create_response(500, {'error': 'Failed to delete photos', 'details': str(e)})
+
+
+def s3_key_from_url(url):
+    """
+    Return the object key of a bucket URL, or None for other URLs
+    """
+    base_url = f"https://{BUCKET_NAME}.s3.eu-north-1.amazonaws.com/"
+    if url and url.startswith(base_url):
+        return url[len(base_url):] or None
+    return None
+
+
 def format_file_size(bytes_size):
     """
     Format file size in human readable format
@@ -1028,23 +1788,157 @@ def format_file_size(bytes_size):
         bytes_size /= 1024.0
     return f"{bytes_size:.2f} TB"
 
-def _convert_decimals(value):
-    if isinstance(value, list):
-        return [_convert_decimals(v) for v in value]
-    if isinstance(value, dict):
-        return {k: _convert_decimals(v) for k, v in value.items()}
-    if isinstance(value, Decimal):
-        try:
-            # Cast to int if no fractional part
-            return int(value) if value % 1 == 0 else float(value)
-        except Exception:
-            return float(value)
-    return value
-
-
-def create_response(status_code, body):
+def query_gallery_photos(gallery_id, **kwargs):
     """
-    Create a standardized HTTP response
+    Return every GalleryPhotos item of a gallery, following query pagination
+    """
+    from boto3.dynamodb.conditions import Key
+    items = []
+    params = {'KeyConditionExpression': Key('galleryId').eq(str(gallery_id)), **kwargs}
+    while True:
+        resp = tbl_gallery_photos.query(**params)
+        items.extend(resp.get('Items', []))
+        if 'LastEvaluatedKey' not in resp:
+            return items
+        params['ExclusiveStartKey'] = resp['LastEvaluatedKey']
+
+
+def compute_content_hash(data):
+    """
+    Return the sha256 hex digest used to identify identical photo bytes
+    """
+    import hashlib
+    return hashlib.sha256(data).hexdigest()
+
+
+def normalize_content_hash(value):
+    """
+    Validate a client-supplied sha256 hex digest, returning None if malformed
+    """
+    if not value or not isinstance(value, str):
+        return None
+    value = value.strip().lower()
+    if not re.fullmatch(r'[0-9a-f]{64}', value):
+        return None
+    return value
+
+
+def get_gallery_photo(gallery_id, photo_id):
+    """
+    Fetch one GalleryPhotos item by its key, or None
+    """
+    if photo_id is None or str(photo_id) == '':
+        return None
+    resp = tbl_gallery_photos.get_item(Key={'galleryId': str(gallery_id), 'photoId': str(photo_id)})
+    return resp.get('Item')
+
+
+def find_photo_by_s3_key(gallery_id, s3_key):
+    """
+    Find the photo of a gallery stored under an S3 key (s3Key GSI, keys only), or None
+    """
+    from boto3.dynamodb.conditions import Key
+    resp = tbl_gallery_photos.query(
+        IndexName=S3_KEY_INDEX,
+        KeyConditionExpression=Key('s3Key').eq(s3_key)
+    )
+    for entry in resp.get('Items', []):
+        if str(entry.get('galleryId')) == str(gallery_id):
+            return get_gallery_photo(gallery_id, entry['photoId'])
+    return None
+
+
+def photo_exists(photo_id, gallery_id=None):
+    """
+    Whether a photo exists: one keyed read when its gallery is known, else a photoId GSI query (keys only)
+    """
+    if gallery_id:
+        return get_gallery_photo(gallery_id, photo_id) is not None
+    from boto3.dynamodb.conditions import Key
+    resp = tbl_gallery_photos.query(
+        IndexName=PHOTO_ID_INDEX,
+        KeyConditionExpression=Key('photoId').eq(str(photo_id)),
+        Limit=1
+    )
+    return bool(resp.get('Items'))
+
+
+def rename_gallery_photos(gallery_id, photos):
+    """
+    Apply photo name changes ([{'id' or 'photoId', 'name'}]) with one BatchGetItem pass
+    and one batched write. Returns the number of photos renamed.
+    """
+    names = {}
+    for photo_data in photos:
+        photo_id = photo_data.get('id') or photo_data.get('photoId')
+        photo_name = photo_data.get('name')
+        if photo_id and photo_name is not None:
+            names[str(photo_id)] = str(photo_name).strip()
+    if not names:
+        return 0
+
+    items = batch_get_keys(
+        GALLERY_PHOTOS_TABLE_NAME,
+        [{'galleryId': str(gallery_id), 'photoId': photo_id} for photo_id in names]
+    )
+    missing = set(names) - {str(item['photoId']) for item in items}
+    if missing:
+        logger.warning(f"Photos not found in gallery {gallery_id}: {sorted(missing)}")
+
+    now_ts = datetime.utcnow().isoformat() + 'Z'
+    renamed = 0
+    with tbl_gallery_photos.batch_writer(overwrite_by_pkeys=['galleryId', 'photoId']) as batch:
+        for item in items:
+            photo_name = names[str(item['photoId'])]
+            if item.get('name') == photo_name:
+                continue
+            item['name'] = photo_name
+            item['lastModified'] = now_ts
+            batch.put_item(Item=item)
+            renamed += 1
+    logger.info(f"Renamed {renamed} photos in gallery {gallery_id}")
+    return renamed
+
+
+def find_photo_by_content_hash(gallery_id, content_hash):
+    """
+    Find an existing photo in a gallery with the same content hash (contentHash GSI)
+    """
+    if not content_hash:
+        return None
+    try:
+        from boto3.dynamodb.conditions import Key
+        resp = tbl_gallery_photos.query(
+            IndexName=CONTENT_HASH_INDEX,
+            KeyConditionExpression=Key('contentHash').eq(content_hash) & Key('galleryId').eq(str(gallery_id)),
+            Limit=1
+        )
+        items = resp.get('Items', [])
+        return items[0] if items else None
+    except ClientError as e:
+        # Throttling, a missing index or permissions - upload the photo as new, but say why
+        logger.warning(f"Content hash lookup failed for gallery {gallery_id} "
+                       f"({e.response['Error']['Code']}), treating the photo as new: {e}")
+        return None
+
+
+def _convert_decimals(value):
+    if isinstance(value, list):
+        return [_convert_decimals(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _convert_decimals(v) for k, v in value.items()}
+    if isinstance(value, Decimal):
+        try:
+            # Cast to int if no fractional part
+            return int(value) if value % 1 == 0 else float(value)
+        except Exception:
+            return float(value)
+    return value
+
+
+def create_response(status_code, body):
+    """
+    Create a standardized HTTP response
     """
     return {
         'statusCode': status_code,
@@ -1058,13 +1952,21 @@ def create_response(status_code, body):
         'body': json.dumps(_convert_decimals(body), ensure_ascii=False)
     }
 
-def update_galleries_metadata():
+def update_galleries_metadata(mode=None, continuation_token=None, context=None, inventory=None):
     """
     Scan S3 gallery folders directly and update DynamoDB Galleries table.
     This function scans S3 folder structure to find galleries and counts photos,
     then updates DynamoDB with only the information that can be derived from S3.
     Preserves existing DynamoDB data like coverPhotoURL, description, tags, etc.
+    With mode='incremental' only folders changed since the last checkpoint are reconciled;
+    with mode='inventory' the folders are read from an S3 Inventory report instead of listed.
     """
+    if mode == 'incremental':
+        return sync_galleries_incremental(continuation_token, context)
+    try:
+        objects = gallery_objects(mode, inventory)
+    except (InventoryError, ClientError, ValueError) as e:
+        return create_response(400, {'error': 'Invalid inventory report', 'details': str(e)})
     try:
         logger.info("Starting update_galleries_metadata - scanning S3 folder structure directly")
         
@@ -1074,156 +1976,59 @@ def update_galleries_metadata():
         errors = []
         total_folders_scanned = 0
         
-        paginator = s3_client.get_paginator('list_objects_v2')
+        total_objects_scanned = 0
+        geocode_pending = []
+        
+        def reconcile(folder, gallery_ref, existing_gallery):
+            return reconcile_gallery_folder(
+                folder,
+                existing_gallery=existing_gallery,
+                prefetched=True,
+                geocode_pending=geocode_pending,
+                table=thread_table(GALLERIES_TABLE_NAME),
+                gallery_ref=gallery_ref
+            )
         
-        # First, get all objects under galleries/ prefix
-        all_objects = []
-        for page in paginator.paginate(Bucket=BUCKET_NAME, Prefix='galleries/'):
-            all_objects.extend(page.get('Contents', []))
-        
-        # Group objects by gallery path
-        gallery_paths = {}
-        for obj in all_objects:
-            key = obj['Key']
-            # Skip folder placeholders and metadata files
-            if key.endswith('/') or key.endswith('.json'):
-                continue
-                
-            # Extract gallery path: galleries/continent/country/gallery_name/
-            path_parts = key.split('/')
-            if len(path_parts) < 4:  # galleries/continent/country/name/file
-                continue
-                
-            # Reconstruct gallery path
-            gallery_path = '/'.join(path_parts[:4]) + '/'  # galleries/continent/country/name/
-            if gallery_path not in gallery_paths:
-                gallery_paths[gallery_path] = {
-                    'continent': path_parts[1],
-                    'country': path_parts[2],
-                    'name': path_parts[3],
-                    'photo_count': 0,
-                    'files': [],
-                    'photos': []  # Store actual photo files (not thumbnails)
-                }
-            
-            # Count photos and store photo files (exclude thumbnails folder)
-            if '/thumbnails/' not in key:
-                gallery_paths[gallery_path]['photo_count'] += 1
-                # Store photo files for cover photo selection
-                if key.lower().endswith(('.jpg', '.jpeg', '.png', '.webp', '.avif', '.tiff', '.bmp')):
-                    gallery_paths[gallery_path]['photos'].append(key)
-            gallery_paths[gallery_path]['files'].append(key)
-        
-        total_folders_scanned = len(gallery_paths)
-        logger.info(f"Found {total_folders_scanned} gallery folders in S3")
-        
-        # Process each gallery
-        for gallery_path, gallery_info in gallery_paths.items():
-            try:
-                logger.info(f"Processing gallery: {gallery_path}")
-                logger.info(f"Gallery info: {json.dumps(gallery_info, default=str)}")
-                
-                # Generate a unique ID for this gallery based on path
-                # Use a hash of the path to ensure consistency
-                import hashlib
-                path_hash = hashlib.md5(gallery_path.encode()).hexdigest()
-                gallery_id = f"gallery-{path_hash[:8]}"
-                
-                # Check if gallery already exists in DynamoDB
-                existing_response = tbl_galleries.get_item(Key={'galleryId': gallery_id})
-                existing_gallery = existing_response.get('Item')
-                
-                now = datetime.utcnow().isoformat() + 'Z'
-                
-                # Determine cover photo thumbnail URL from first available photo
-                cover_photo_url = None
-                if gallery_info['photos']:
-                    # Get the first photo file and construct thumbnail URL
-                    first_photo_key = sorted(gallery_info['photos'])[0]  # Sort for consistency
-                    # Extract filename without extension
-                    filename = first_photo_key.split('/')[-1]
-                    photo_id = filename.rsplit('.', 1)[0]  # Remove extension
-                    
-                    # Get the original file extension
-                    original_extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else 'jpg'
-                    
-                    # Construct the full thumbnail URL - use the same extension as original
-                    base_url = f"https://{BUCKET_NAME}.s3.eu-north-1.amazonaws.com"
-                    gallery_path = f"galleries/{gallery_info['continent']}/{gallery_info['country']}/{gallery_info['name']}"
-                    cover_photo_url = f"{base_url}/{gallery_path}/thumbnails/{photo_id}.{original_extension}"
-                    
-                    logger.info(f"Selected cover photo for {gallery_info['name']}: {photo_id}")
-                    logger.info(f"Cover photo thumbnail URL: {cover_photo_url}")
-                
-                if existing_gallery:
-                    # Update existing gallery - only update fields we can derive from S3
-                    logger.info(f"Updating existing gallery: {gallery_info['name']} (ID: {gallery_id})")
-                    
-                    update_expr = "SET #n=:n, continent=:c, country=:co, photoCount=:pc, updatedAt=:now"
-                    expr_vals = {
-                        ':n': gallery_info['name'],
-                        ':c': gallery_info['continent'],
-                        ':co': gallery_info['country'],
-                        ':pc': gallery_info['photo_count'],
-                        ':now': now
-                    }
-                    expr_names = {'#n': 'name'}
-                    
-                    # Add cover photo update if we have photos and no existing cover
-                    if cover_photo_url and not existing_gallery.get('coverPhotoURL'):
-                        update_expr += ", coverPhotoURL = :cpid"
-                        expr_vals[':cpid'] = cover_photo_url
-                        logger.info(f"Setting cover photo URL for {gallery_info['name']}: {cover_photo_url}")
-                    
-                    # Only update if values have actually changed
-                    if (existing_gallery.get('name') != gallery_info['name'] or
-                        existing_gallery.get('continent') != gallery_info['continent'] or
-                        existing_gallery.get('country') != gallery_info['country'] or
-                        existing_gallery.get('photoCount') != gallery_info['photo_count'] or
-                        (cover_photo_url and not existing_gallery.get('coverPhotoURL'))):
-                        
-                        tbl_galleries.update_item(
-                            Key={'galleryId': gallery_id},
-                            UpdateExpression=update_expr,
-                            ExpressionAttributeValues=expr_vals,
-                            ExpressionAttributeNames=expr_names
-                        )
+        def reconcile_chunk(pool, chunk):
+            # Resolve the chunk's gallery IDs from the path index and prefetch their items,
+            # one BatchGetItem each, then reconcile on the pool
+            nonlocal galleries_created, galleries_updated
+            gallery_refs = resolve_gallery_ids([folder.gallery_path for folder in chunk])
+            existing_galleries = batch_get_galleries([ref[0] for ref in gallery_refs.values()])
+            futures = {
+                pool.submit(reconcile, folder, gallery_refs[folder.gallery_path],
+                            existing_galleries.get(gallery_refs[folder.gallery_path][0])): folder
+                for folder in chunk
+            }
+            for future in as_completed(futures):
+                gallery_path = futures[future].gallery_path
+                try:
+                    outcome = future.result()
+                    if outcome == 'created':
+                        galleries_created += 1
+                    elif outcome == 'updated':
                         galleries_updated += 1
-                        logger.info(f"Updated gallery: {gallery_info['name']}")
-                    else:
-                        logger.info(f"No changes needed for gallery: {gallery_info['name']}")
-                else:
-                    # Create new gallery with minimal required fields
-                    logger.info(f"Creating new gallery: {gallery_info['name']} (ID: {gallery_id})")
-                    
-                    latlon = geocode_place(gallery_info['name'], gallery_info.get('country'))
-                    logger.info(f"Geocoded coordinates for {gallery_info['name']}: {latlon}")  
-                    gallery_data = {
-                        'galleryId': gallery_id,
-                        'name': gallery_info['name'],
-                        'continent': gallery_info['continent'],
-                        'country': gallery_info['country'],
-                        'photoCount': gallery_info['photo_count'],
-                        'latitude': latlon[0],
-                        'longitude': latlon[1],
-                        'createdAt': now,
-                        'updatedAt': now
-                    }
-                    
-                    # Add cover photo if available
-                    if cover_photo_url:
-                        gallery_data['coverPhotoURL'] = cover_photo_url
-                        logger.info(f"Created gallery with cover photo URL: {gallery_info['name']} -> {cover_photo_url}")
-                    
-                    tbl_galleries.put_item(Item=gallery_data)
-                    galleries_created += 1
-                    logger.info(f"Created gallery: {gallery_info['name']}")
-                        
-            except Exception as e:
-                error_msg = f"Error processing gallery {gallery_path}: {str(e)}"
-                logger.error(error_msg)
-                errors.append(error_msg)
-                continue
+                except Exception as e:
+                    error_msg = f"Error processing gallery {gallery_path}: {str(e)}"
+                    logger.error(error_msg)
+                    errors.append(error_msg)
+        
+        # Stream the listing: each gallery folder is reduced to a slotted summary as soon as its
+        # run of keys ends, and summaries are reconciled in chunks, so nothing grows with the bucket
+        chunk = []
+        with ContextThreadPoolExecutor(max_workers=RECONCILE_WORKERS) as pool:
+            for gallery_path, run in iter_gallery_runs(objects):
+                total_objects_scanned += len(run)
+                total_folders_scanned += 1
+                chunk.append(summarize_gallery_run(gallery_path, run))
+                if len(chunk) >= RECONCILE_CHUNK_SIZE:
+                    reconcile_chunk(pool, chunk)
+                    chunk = []
+            if chunk:
+                reconcile_chunk(pool, chunk)
+        
+        logger.info(f"Scanned {total_folders_scanned} gallery folders ({total_objects_scanned} objects) in S3")
+        geocode_result = queue_geocoding(geocode_pending, context)
         
         total_processed = galleries_updated + galleries_created
         
@@ -1241,6 +2046,9 @@ def update_galleries_metadata():
             'galleries_created': galleries_created,
             'total_processed': total_processed,
             'total_folders_scanned': total_folders_scanned,
+            'total_objects_scanned': total_objects_scanned,
+            'source': 'inventory' if mode == 'inventory' else 'listing',
+            'geocoding': geocode_result,
             'errors': errors if errors else []
         })
         
@@ -1249,7 +2057,514 @@ def update_galleries_metadata():
         return create_response(500, {'error': 'Failed to update galleries metadata', 'details': str(e)})
 
 
-def update_GalleryPhotos(request_body=None):
+def gallery_objects(mode=None, inventory=None, prefixes=(GALLERY_PREFIX,)):
+    """
+    Object stream of the gallery prefixes for a full scan: the live listing, or with
+    mode='inventory' the rows of an S3 Inventory report (s3:// manifest URI or local directory)
+    """
+    if mode == 'inventory':
+        source = inventory or INVENTORY_MANIFEST
+        if not source:
+            raise InventoryError("No inventory report given and INVENTORY_MANIFEST is not set")
+        return iter_inventory_objects(source, s3_client=s3_client, prefix=tuple(prefixes))
+    return itertools.chain.from_iterable(iter_s3_objects(s3_client, BUCKET_NAME, prefix=prefix) for prefix in prefixes)
+
+
+def gallery_storage_prefix(gallery):
+    """
+    S3 folder holding a gallery's objects: gallery-data/<galleryId>/ for the ID layout,
+    galleries/continent/country/name/ for legacy galleries
+    """
+    if gallery.get('storageLayout') == 'id':
+        return gallery.get('s3Prefix') or f"{ID_LAYOUT_PREFIX}{gallery['galleryId']}/"
+    return gallery_s3_prefix(gallery['continent'], gallery['country'], gallery['name'])
+
+
+def photo_object_keys(gallery, photo_id, filename, thumbnail_filename):
+    """
+    (original key, thumbnail key) for a new upload. The ID layout names objects after the
+    immutable photoId; legacy galleries keep the uploaded filenames.
+    """
+    prefix = gallery_storage_prefix(gallery)
+    if gallery.get('storageLayout') == 'id':
+        extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else 'webp'
+        thumbnail_extension = thumbnail_filename.rsplit('.', 1)[-1].lower() if '.' in thumbnail_filename else extension
+        return f"{prefix}{photo_id}.{extension}", f"{prefix}thumbnails/{photo_id}.{thumbnail_extension}"
+    return f"{prefix}{filename}", f"{prefix}thumbnails/{thumbnail_filename}"
+
+
+def gallery_id_for_path(gallery_path):
+    """
+    Derive the legacy reconciliation gallery ID from its S3 folder (galleries/continent/country/name/).
+    Only used for folders that are not in the GalleryPaths index yet.
+    """
+    import hashlib
+    path_hash = hashlib.md5(gallery_path.encode()).hexdigest()
+    return f"gallery-{path_hash[:8]}"
+
+
+def gallery_s3_prefix(continent, country, name):
+    """
+    S3 folder of a gallery: galleries/continent/country/name/
+    """
+    return f"galleries/{continent}/{country}/{name}/"
+
+
+def register_gallery_path(gallery_prefix, gallery_id, table=None):
+    """
+    Point an S3 gallery folder at its galleryId in the GalleryPaths index
+    """
+    (table or tbl_gallery_paths).put_item(Item={
+        's3Prefix': gallery_prefix,
+        'galleryId': str(gallery_id),
+        'updatedAt': datetime.utcnow().isoformat() + 'Z'
+    })
+
+
+def unregister_gallery_path(gallery_prefix, gallery_id):
+    """
+    Remove an S3 folder from the index, unless it has since been claimed by another gallery
+    """
+    try:
+        tbl_gallery_paths.delete_item(
+            Key={'s3Prefix': gallery_prefix},
+            ConditionExpression='galleryId = :gid',
+            ExpressionAttributeValues={':gid': str(gallery_id)}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+
+
+def resolve_gallery_id(gallery_prefix, table=None):
+    """
+    Look up the galleryId of an S3 folder with one keyed read.
+    Returns (gallery_id, indexed); unindexed folders fall back to the legacy path-hash ID.
+    """
+    item = (table or tbl_gallery_paths).get_item(Key={'s3Prefix': gallery_prefix}).get('Item')
+    if item:
+        return item['galleryId'], True
+    return gallery_id_for_path(gallery_prefix), False
+
+
+def resolve_gallery_ids(gallery_prefixes):
+    """
+    Batch version of resolve_gallery_id, returning {s3Prefix: (gallery_id, indexed)}
+    """
+    indexed = batch_get_items(GALLERY_PATHS_TABLE_NAME, 's3Prefix', gallery_prefixes)
+    return {
+        prefix: (indexed[prefix]['galleryId'], True) if prefix in indexed else (gallery_id_for_path(prefix), False)
+        for prefix in gallery_prefixes
+    }
+
+
+def rebuild_gallery_path_index():
+    """
+    Backfill the GalleryPaths index from the Galleries table.
+    When several galleries claim the same folder, the one created through the UI (uuid ID) wins
+    over a legacy path-hash duplicate; the conflicts are reported, not deleted.
+    ID-layout galleries are left out: their folder is named after the gallery and never looked up here.
+    """
+    try:
+        by_prefix = {}
+        params = {'ProjectionExpression': 'galleryId, continent, country, #n, createdAt, storageLayout',
+                  'ExpressionAttributeNames': {'#n': 'name'}}
+        while True:
+            resp = tbl_galleries.scan(**params)
+            for item in resp.get('Items', []):
+                if item.get('storageLayout') == 'id':
+                    continue
+                if item.get('continent') and item.get('country') and item.get('name'):
+                    by_prefix.setdefault(gallery_storage_prefix(item), []).append(item)
+            if 'LastEvaluatedKey' not in resp:
+                break
+            params['ExclusiveStartKey'] = resp['LastEvaluatedKey']
+        
+        conflicts = []
+        with tbl_gallery_paths.batch_writer() as batch:
+            for prefix, items in by_prefix.items():
+                items.sort(key=lambda it: (it['galleryId'] == gallery_id_for_path(prefix), it.get('createdAt', '')))
+                batch.put_item(Item={
+                    's3Prefix': prefix,
+                    'galleryId': items[0]['galleryId'],
+                    'updatedAt': datetime.utcnow().isoformat() + 'Z'
+                })
+                if len(items) > 1:
+                    conflicts.append({'s3Prefix': prefix, 'galleryIds': [it['galleryId'] for it in items]})
+        
+        logger.info(f"Rebuilt gallery path index: {len(by_prefix)} folders, {len(conflicts)} conflicts")
+        return create_response(200, {
+            'message': 'Gallery path index rebuilt',
+            'paths_indexed': len(by_prefix),
+            'conflicts': conflicts
+        })
+    except Exception as e:
+        logger.error(f"Error rebuilding gallery path index: {str(e)}")
+        return create_response(500, {'error': 'Failed to rebuild gallery path index', 'details': str(e)})
+
+
+def reconcile_gallery_folder(folder, existing_gallery=None, prefetched=False, geocode_pending=None, table=None,
+                             gallery_ref=None):
+    """
+    Create or update the Galleries item of one S3 folder from its GalleryFolderSummary.
+    Returns 'created', 'updated' or 'unchanged'.
+    Pass prefetched=True with the existing item (or None) to skip the get_item, and gallery_ref
+    (the resolve_gallery_id result) to skip the index lookup. New galleries that need network
+    geocoding are marked pending and their IDs appended to geocode_pending.
+    """
+    logger.info(f"Processing gallery: {folder!r}")
+    
+    table = table or tbl_galleries
+    paths_table = thread_table(GALLERY_PATHS_TABLE_NAME)
+    gallery_id, indexed = gallery_ref or resolve_gallery_id(folder.gallery_path, table=paths_table)
+    if not indexed:
+        # Index the folder on first sight so later lookups are keyed reads
+        register_gallery_path(folder.gallery_path, gallery_id, table=paths_table)
+    
+    # Check if gallery already exists in DynamoDB
+    if not prefetched:
+        existing_response = table.get_item(Key={'galleryId': gallery_id})
+        existing_gallery = existing_response.get('Item')
+    
+    now = datetime.utcnow().isoformat() + 'Z'
+    
+    # Determine cover photo thumbnail URL from first available photo
+    cover_photo_url = None
+    if folder.cover_key:
+        # First photo file in key order, with the thumbnail resolved from the listing
+        photo_id = folder.cover_key.split('/')[-1].rsplit('.', 1)[0]  # Filename without extension
+        
+        base_url = f"https://{BUCKET_NAME}.s3.eu-north-1.amazonaws.com"
+        cover_photo_url = f"{base_url}/{folder.cover_thumbnail_key or folder.cover_key}"
+        
+        logger.info(f"Selected cover photo for {folder.name}: {photo_id}")
+        logger.info(f"Cover photo thumbnail URL: {cover_photo_url}")
+    
+    if existing_gallery:
+        # Update existing gallery - only update fields we can derive from S3
+        logger.info(f"Updating existing gallery: {folder.name} (ID: {gallery_id})")
+        
+        update_expr = "SET #n=:n, continent=:c, country=:co, photoCount=:pc, updatedAt=:now"
+        expr_vals = {
+            ':n': folder.name,
+            ':c': folder.continent,
+            ':co': folder.country,
+            ':pc': folder.photo_count,
+            ':now': now
+        }
+        expr_names = {'#n': 'name'}
+        
+        # Add cover photo update if we have photos and no existing cover
+        if cover_photo_url and not existing_gallery.get('coverPhotoURL'):
+            update_expr += ", coverPhotoURL = :cpid"
+            expr_vals[':cpid'] = cover_photo_url
+            logger.info(f"Setting cover photo URL for {folder.name}: {cover_photo_url}")
+        
+        # Only update if values have actually changed
+        if (existing_gallery.get('name') != folder.name or
+            existing_gallery.get('continent') != folder.continent or
+            existing_gallery.get('country') != folder.country or
+            existing_gallery.get('photoCount') != folder.photo_count or
+            (cover_photo_url and not existing_gallery.get('coverPhotoURL'))):
+            
+            table.update_item(
+                Key={'galleryId': gallery_id},
+                UpdateExpression=update_expr,
+                ExpressionAttributeValues=expr_vals,
+                ExpressionAttributeNames=expr_names
+            )
+            logger.info(f"Updated gallery: {folder.name}")
+            return 'updated'
+        logger.info(f"No changes needed for gallery: {folder.name}")
+        return 'unchanged'
+    
+    # Create new gallery with minimal required fields
+    logger.info(f"Creating new gallery: {folder.name} (ID: {gallery_id})")
+    
+    gallery_data = {
+        'galleryId': gallery_id,
+        'name': folder.name,
+        'continent': folder.continent,
+        'country': folder.country,
+        'photoCount': folder.photo_count,
+        'createdAt': now,
+        'updatedAt': now
+    }
+    
+    gallery_data.update(gallery_facets.list_index_fields(gallery_data))
+    gallery_data.update(offline_geocode_fields(folder.name, folder.country, now))
+    if gallery_data.get('geocodeStatus') == 'pending' and geocode_pending is not None:
+        geocode_pending.append(gallery_id)
+    
+    # Add cover photo if available
+    if cover_photo_url:
+        gallery_data['coverPhotoURL'] = cover_photo_url
+        logger.info(f"Created gallery with cover photo URL: {folder.name} -> {cover_photo_url}")
+    
+    table.put_item(Item=gallery_data)
+    update_gallery_years(gallery_id, [], gallery_years(gallery_data), table=thread_table(GALLERY_YEARS_TABLE_NAME))
+    logger.info(f"Created gallery: {folder.name}")
+    return 'created'
+
+
+def thread_table(table_name):
+    """
+    DynamoDB Table bound to a resource owned by the calling thread
+    """
+    if threading.current_thread() is threading.main_thread():
+        return dynamodb.Table(table_name)
+    tables = getattr(_thread_local, 'tables', None)
+    if tables is None:
+        _thread_local.resource = instrument_client(aws_clients.thread_resource('dynamodb'))
+        tables = _thread_local.tables = {}
+    if table_name not in tables:
+        tables[table_name] = _thread_local.resource.Table(table_name)
+    return tables[table_name]
+
+
+def batch_get_keys(table_name, keys, attributes=None):
+    """
+    Fetch the items of full primary keys with BatchGetItem (100 keys per request),
+    retrying unprocessed keys with backoff. Missing items are simply absent from the result.
+    Pass attributes to read only those attribute names.
+    """
+    spec = {}
+    if attributes:
+        names = {f"#a{i}": name for i, name in enumerate(attributes)}
+        spec = {'ProjectionExpression': ', '.join(names), 'ExpressionAttributeNames': names}
+    items = []
+    for i in range(0, len(keys), 100):
+        request = {table_name: {'Keys': keys[i:i + 100], **spec}}
+        attempt = 0
+        while request:
+            resp = dynamodb.batch_get_item(RequestItems=request)
+            items.extend(resp.get('Responses', {}).get(table_name, []))
+            request = resp.get('UnprocessedKeys') or None
+            if request:
+                attempt += 1
+                time.sleep(min(0.05 * (2 ** attempt), 2))
+    return items
+
+
+def batch_get_items(table_name, key_name, key_values):
+    """
+    Fetch items of a single-key table with BatchGetItem, returning {key: item}
+    """
+    unique_values = list(dict.fromkeys(str(value) for value in key_values))
+    items = batch_get_keys(table_name, [{key_name: value} for value in unique_values])
+    return {item[key_name]: item for item in items}
+
+
+def batch_get_galleries(gallery_ids):
+    """
+    Fetch Galleries items with BatchGetItem, returning {galleryId: item}
+    """
+    return batch_get_items(GALLERIES_TABLE_NAME, 'galleryId', gallery_ids)
+
+
+def queue_geocoding(gallery_ids, context=None):
+    """
+    Hand galleries marked geocodeStatus=pending to the background geocoding worker
+    """
+    if not gallery_ids:
+        return {'pending': []}
+    return {'pending': gallery_ids, 'workerStarted': start_background_job({'job': 'geocode_galleries'}, context)}
+
+
+def offline_geocode_fields(name, country, now):
+    """
+    Coordinates for a new gallery if the geocoder can answer without the network,
+    otherwise the geocodeStatus=pending marker the geocoding worker picks up
+    """
+    try:
+        latlon = get_geocoder().geocode(name, country, network=False)
+    except GeocodeUnavailable:
+        return {'geocodeStatus': 'pending', 'geocodeAttempts': 0, 'geocodeNextAttemptAt': now}
+    except Exception as e:
+        logger.warning(f"Offline geocoding failed for '{name}': {e}")
+        return {'geocodeStatus': 'pending', 'geocodeAttempts': 0, 'geocodeNextAttemptAt': now}
+    if latlon is None:
+        logger.info(f"No coordinates known for gallery {name} ({country})")
+        return {'geocodeStatus': 'not_found'}
+    logger.info(f"Geocoded gallery {name} from cache: {latlon[0]}, {latlon[1]}")
+    return {'latitude': latlon[0], 'longitude': latlon[1]}
+
+
+def iter_geocode_due(now):
+    """
+    Yield galleries with geocodeStatus=pending whose next attempt is due, a page at a time
+    """
+    from boto3.dynamodb.conditions import Key, Attr
+    params = {
+        'IndexName': GEOCODE_STATUS_INDEX,
+        'KeyConditionExpression': Key('geocodeStatus').eq('pending') & Key('geocodeNextAttemptAt').lte(now),
+        'Limit': GEOCODE_BATCH_SIZE
+    }
+    try:
+        resp = tbl_galleries.query(**params)
+    except ClientError as e:
+        # Index not created yet - fall back to a filtered scan
+        logger.warning(f"Geocode status index unavailable, scanning: {e}")
+        params = {
+            'FilterExpression': Attr('geocodeStatus').eq('pending') & Attr('geocodeNextAttemptAt').lte(now),
+            'Limit': GEOCODE_BATCH_SIZE
+        }
+        resp = tbl_galleries.scan(**params)
+        query = tbl_galleries.scan
+    else:
+        query = tbl_galleries.query
+    while True:
+        yield from resp.get('Items', [])
+        if 'LastEvaluatedKey' not in resp:
+            return
+        params['ExclusiveStartKey'] = resp['LastEvaluatedKey']
+        resp = query(**params)
+
+
+def acquire_geocode_lease(context=None):
+    """
+    Take the single geocoding worker lease in SyncState, so concurrent workers never exceed
+    the Nominatim rate limit. Returns False if another worker holds it.
+    """
+    remaining_s = context.get_remaining_time_in_millis() / 1000 if context is not None else 900
+    now_s = int(time.time())
+    try:
+        tbl_sync_state.put_item(
+            Item={'syncId': 'geocode', 'scope': '#lease', 'leaseUntil': now_s + int(remaining_s),
+                  'updatedAt': datetime.utcnow().isoformat() + 'Z'},
+            ConditionExpression='attribute_not_exists(syncId) OR leaseUntil < :now',
+            ExpressionAttributeValues={':now': now_s}
+        )
+        return True
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException':
+            return False
+        raise
+
+
+def release_geocode_lease():
+    tbl_sync_state.delete_item(Key={'syncId': 'geocode', 'scope': '#lease'})
+
+
+def geocode_gallery(gallery):
+    """
+    Geocode one pending gallery and record the outcome on it:
+    coordinates, geocodeStatus=not_found, a retry with exponential backoff, or geocodeStatus=failed
+    after GEOCODE_MAX_ATTEMPTS. Returns 'geocoded', 'not_found', 'retrying', 'failed' or 'skipped'.
+    """
+    gallery_id = gallery['galleryId']
+    now = datetime.utcnow()
+    now_ts = now.isoformat() + 'Z'
+    try:
+        latlon = get_geocoder().geocode(gallery.get('name'), gallery.get('country'))
+        error = None
+    except Exception as e:
+        latlon, error = None, str(e)
+
+    if latlon:
+        outcome = 'geocoded'
+        update_expr = ("SET latitude = :lat, longitude = :lon, geocodedAt = :now "
+                       "REMOVE geocodeStatus, geocodeAttempts, geocodeNextAttemptAt, geocodeError")
+        expr_vals = {':lat': latlon[0], ':lon': latlon[1], ':now': now_ts}
+    elif error is None:
+        outcome = 'not_found'
+        update_expr = "SET geocodeStatus = :status, geocodedAt = :now REMOVE geocodeNextAttemptAt, geocodeError"
+        expr_vals = {':status': 'not_found', ':now': now_ts}
+    else:
+        attempts = int(gallery.get('geocodeAttempts', 0)) + 1
+        if attempts >= GEOCODE_MAX_ATTEMPTS:
+            outcome = 'failed'
+            update_expr = ("SET geocodeStatus = :status, geocodeAttempts = :attempts, geocodeError = :error "
+                           "REMOVE geocodeNextAttemptAt")
+            expr_vals = {':status': 'failed', ':attempts': attempts, ':error': error[:500]}
+        else:
+            outcome = 'retrying'
+            delay = min(GEOCODE_RETRY_BASE_SECONDS * (2 ** (attempts - 1)), GEOCODE_RETRY_MAX_SECONDS)
+            update_expr = "SET geocodeAttempts = :attempts, geocodeNextAttemptAt = :next, geocodeError = :error"
+            expr_vals = {':attempts': attempts, ':error': error[:500],
+                         ':next': (now + timedelta(seconds=delay)).isoformat() + 'Z'}
+        logger.warning(f"Geocoding gallery {gallery_id} failed (attempt {attempts}): {error}")
+
+    expr_vals[':pending'] = 'pending'
+    try:
+        tbl_galleries.update_item(
+            Key={'galleryId': gallery_id},
+            UpdateExpression=update_expr,
+            ConditionExpression='geocodeStatus = :pending',
+            ExpressionAttributeValues=expr_vals
+        )
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException':
+            # Deleted, or geocoded by someone else in the meantime
+            return 'skipped'
+        raise
+    return outcome
+
+
+def run_geocode_worker(context=None, continue_async=False):
+    """
+    Drain galleries marked geocodeStatus=pending whose next attempt is due, one page at a time.
+    Nominatim requests are rate-limited by the geocoder and a lease keeps this to one worker.
+    Stops before the Lambda timeout; with continue_async the rest goes to a fresh invocation.
+    """
+    result = {'geocoded': 0, 'not_found': 0, 'retrying': 0, 'failed': 0, 'skipped': 0, 'complete': True}
+    if not acquire_geocode_lease(context):
+        logger.info("Another geocoding worker holds the lease, nothing to do")
+        result['leaseHeld'] = True
+        return result
+    try:
+        now_ts = datetime.utcnow().isoformat() + 'Z'
+        for gallery in iter_geocode_due(now_ts):
+            if context is not None and context.get_remaining_time_in_millis() < SYNC_TIME_BUFFER_MS:
+                result['complete'] = False
+                break
+            result[geocode_gallery(gallery)] += 1
+    finally:
+        release_geocode_lease()
+    result['stats'] = dict(get_geocoder().stats)
+    logger.info(f"Geocoding worker result: {json.dumps(result, default=str)}")
+    progressed = result['geocoded'] + result['not_found'] + result['retrying'] + result['failed'] > 0
+    if continue_async and not result['complete'] and progressed:
+        start_background_job({'job': 'geocode_galleries'}, context)
+    return result
+
+
+def sync_galleries_incremental(continuation_token=None, context=None):
+    """
+    Reconcile only the gallery folders whose objects changed since the last checkpoint.
+    Like the full scan this walks galleries/ only: ID-layout galleries are created by the API and
+    their folders carry no name or location to reconcile; their photos are synced per photo.
+    """
+    def apply_diff(diff):
+        if not diff.objects:
+            # Folder removed from S3 - like the full scan, leave the gallery record alone
+            return {}
+        folder = summarize_gallery_run(diff.gallery_path, diff.objects)
+        outcome = reconcile_gallery_folder(folder, geocode_pending=geocode_pending)
+        return {f'galleries_{outcome}': 1}
+
+    try:
+        logger.info("Starting incremental update_galleries_metadata")
+        geocode_pending = []
+        result = run_incremental_sync(
+            SyncCheckpoint(tbl_sync_state, 'galleries'), s3_client, BUCKET_NAME, apply_diff,
+            continuation_token=continuation_token, context=context, time_buffer_ms=SYNC_TIME_BUFFER_MS,
+            prefixes=(GALLERY_PREFIX,)
+        )
+        result['geocoding'] = queue_geocoding(geocode_pending, context)
+        logger.info(f"Incremental galleries sync result: {json.dumps(result, default=str)}")
+        return create_response(200, {
+            'message': 'Galleries metadata synced incrementally from S3' if result['complete']
+                       else 'Galleries metadata sync paused before timeout, call again with continuationToken',
+            'mode': 'incremental',
+            **result
+        })
+    except Exception as e:
+        logger.error(f"Error in incremental update_galleries_metadata: {str(e)}")
+        return create_response(500, {'error': 'Failed to sync galleries metadata', 'details': str(e)})
+
+
+def update_GalleryPhotos(request_body=None, mode=None, continuation_token=None, context=None, inventory=None):
     """
     Update DynamoDB GalleryPhotos table with uploaded photo information.
     This function can either scan S3 for all photos (when called without body)
@@ -1262,7 +2577,12 @@ def update_GalleryPhotos(request_body=None):
             return process_new_uploads(request_body)
         else:
             logger.info("Starting update_GalleryPhotos - scanning S3 for all photos")
-            return scan_s3_for_photos()
+            return scan_s3_for_photos(
+                mode=mode or (request_body or {}).get('mode'),
+                continuation_token=continuation_token or (request_body or {}).get('continuationToken'),
+                context=context,
+                inventory=inventory or (request_body or {}).get('inventory')
+            )
         
     except Exception as e:
         logger.error(f"Error in update_GalleryPhotos: {str(e)}")
@@ -1276,7 +2596,7 @@ def process_new_uploads(request_data):
     Process new photo uploads and add them to DynamoDB GalleryPhotos table
     """
     try:
-        logger.info(f"Processing new uploads with data: {request_data}")
+        verbose(logger, "Processing new uploads with data: %s", summary(request_data))
         
         gallery_id = request_data['galleryId']
         photos_data = request_data['photos']
@@ -1293,12 +2613,23 @@ def process_new_uploads(request_data):
         
         # Process each photo
         photos_created = 0
+        duplicates_skipped = 0
+        seen_hashes = set()
         errors = []
         
         for photo in photos_data:
             try:
-                # Generate unique photo ID
-                photo_id = str(uuid.uuid4())
+                # Skip records for bytes already stored in this gallery (e.g. a retried request)
+                content_hash = normalize_content_hash(photo.get('contentHash'))
+                if content_hash:
+                    if content_hash in seen_hashes or find_photo_by_content_hash(gallery_id, content_hash):
+                        logger.info(f"Skipping duplicate photo record: {photo['filename']}")
+                        duplicates_skipped += 1
+                        continue
+                    seen_hashes.add(content_hash)
+
+                # Keep the photo ID the upload URLs were issued for (ID-layout keys embed it)
+                photo_id = str(photo.get('photoId') or uuid.uuid4())
                 
                 # Build URLs
                 base_url = f"https://{BUCKET_NAME}.s3.eu-north-1.amazonaws.com"
@@ -1322,9 +2653,21 @@ def process_new_uploads(request_data):
                     'thumbnailSize': format_file_size(photo.get('thumbnailSize', 0))
                 }
                 
-                # Add dimensions if available
-                if 'width' in photo and 'height' in photo:
+                if content_hash:
+                    photo_data['contentHash'] = content_hash
+                
+                # Add dimensions if available, otherwise read them from the uploaded object's headers
+                if photo.get('width') and photo.get('height'):
                     photo_data['dimensions'] = f"{photo['width']}x{photo['height']}"
+                else:
+                    try:
+                        probe = probe_s3_object(s3_client, BUCKET_NAME, photo['s3Key'], size=photo.get('fileSize') or None)
+                        photo_data['dimensions'] = f"{probe['width']}x{probe['height']}"
+                        taken_at = exif_taken_at(probe['exif']) if probe['has_exif'] else None
+                        if taken_at:
+                            photo_data['takenAt'] = taken_at
+                    except Exception as e:
+                        logger.warning(f"Could not probe dimensions for {photo['s3Key']}: {e}")
                 
                 # Create new photo in DynamoDB
                 logger.info(f"Creating new photo: {photo['filename']}")
@@ -1362,6 +2705,7 @@ def process_new_uploads(request_data):
                     'success': True,
                     'message': f'Partially processed photo uploads: {photos_created} successful, {len(errors)} failed',
                     'photos_created': photos_created,
+                    'duplicates_skipped': duplicates_skipped,
                     'errors': errors,
                     'partial_success': True
                 })
@@ -1369,7 +2713,8 @@ def process_new_uploads(request_data):
             return create_response(200, {
                 'success': True,
                 'message': f'Successfully processed {photos_created} photo uploads',
-                'photos_created': photos_created
+                'photos_created': photos_created,
+                'duplicates_skipped': duplicates_skipped
             })
             
     except Exception as e:
@@ -1379,240 +2724,54 @@ def process_new_uploads(request_data):
         })
 
 
-def scan_s3_for_photos():
+def scan_s3_for_photos(mode=None, continuation_token=None, context=None, inventory=None):
     """
     Scan S3 for all photos and update DynamoDB GalleryPhotos table.
     This function scans S3 folder structure to find all photos, extracts metadata,
     and upserts them to DynamoDB GalleryPhotos table.
+    With mode='incremental' only objects changed since the last checkpoint are processed;
+    with mode='inventory' the objects are read from an S3 Inventory report instead of listed.
     """
+    if mode == 'incremental':
+        return sync_photos_incremental(continuation_token, context)
+    try:
+        objects = gallery_objects(mode, inventory, prefixes=(ID_LAYOUT_PREFIX, GALLERY_PREFIX))
+    except (InventoryError, ClientError, ValueError) as e:
+        return create_response(400, {'error': 'Invalid inventory report', 'details': str(e)})
     try:
         # Scan S3 for all photos
         photos_updated = 0
         photos_created = 0
+        photos_unchanged = 0
         errors = []
         total_files_scanned = 0
         
-        paginator = s3_client.get_paginator('list_objects_v2')
-        
-        # First, get all objects under galleries/ prefix
-        all_objects = []
-        for page in paginator.paginate(Bucket=BUCKET_NAME, Prefix='galleries/'):
-            all_objects.extend(page.get('Contents', []))
-        
-        # Group photos by gallery and extract metadata
-        gallery_photos = {}
+        galleries_found = 0
         
-        for obj in all_objects:
-            key = obj['Key']
-            total_files_scanned += 1
-            
-            # Skip folder placeholders, metadata files, and thumbnails
-            if (key.endswith('/') or 
-                key.endswith('.json') or 
-                '/thumbnails/' in key):
-                continue
-            
-            # Check if it's an image file
-            if not key.lower().endswith(('.jpg', '.jpeg', '.png', '.webp', '.avif', '.tiff', '.bmp')):
+        # Stream the listing one gallery folder at a time; only the current folder's photos and
+        # thumbnails are held in memory while it is reconciled
+        for gallery_path, run in iter_gallery_runs(objects):
+            total_files_scanned += len(run)
+            photos = [info for info in (photo_info_from_object(obj) for obj in run) if info]
+            if not photos:
                 continue
-            
-            # Extract gallery path: galleries/continent/country/gallery_name/
-            path_parts = key.split('/')
-            if len(path_parts) < 5:  # galleries/continent/country/name/file
-                continue
-            
-            # Reconstruct gallery path and photo info
-            gallery_path = '/'.join(path_parts[:4]) + '/'  # galleries/continent/country/name/
-            filename = path_parts[-1]
-            file_extension = filename.split('.')[-1].lower()
-            
-            if gallery_path not in gallery_photos:
-                gallery_photos[gallery_path] = {
-                    'continent': path_parts[1],
-                    'country': path_parts[2],
-                    'name': path_parts[3],
-                    'photos': []
-                }
-            
-            # Extract photo metadata
-            photo_info = {
-                'filename': filename,
-                's3Key': key,
-                'file_extension': file_extension,
-                'file_size': obj.get('Size', 0),
-                'last_modified': obj.get('LastModified'),
-                'path_parts': path_parts
-            }
-            
-            gallery_photos[gallery_path]['photos'].append(photo_info)
-        
-        logger.info(f"Found {len(gallery_photos)} galleries with photos")
-        
-        # Process each gallery's photos
-        for gallery_path, gallery_info in gallery_photos.items():
+            galleries_found += 1
             try:
                 logger.info(f"Processing photos for gallery: {gallery_path}")
-                logger.info(f"Found {len(gallery_info['photos'])} photos")
-                
-                # Generate gallery ID (same logic as update_galleries_metadata)
-                import hashlib
-                path_hash = hashlib.md5(gallery_path.encode()).hexdigest()
-                gallery_id = f"gallery-{path_hash[:8]}"
+                logger.info(f"Found {len(photos)} photos")
                 
-                # Check if gallery exists in DynamoDB
-                gallery_response = tbl_galleries.get_item(Key={'galleryId': gallery_id})
-                if 'Item' not in gallery_response:
-                    logger.warning(f"Gallery {gallery_id} not found in DynamoDB, skipping photos")
+                # Resolve the gallery of this folder (same index as update_galleries_metadata)
+                gallery_id = find_gallery_for_path(gallery_path)
+                if not gallery_id:
+                    logger.warning(f"No gallery found in DynamoDB for {gallery_path}, skipping photos")
                     continue
                 
-                # Process each photo
-                for photo_info in gallery_info['photos']:
-                    try:
-                        # Generate unique photo ID
-                        photo_id = str(uuid.uuid4())
-                        
-                        # Build URLs
-                        base_url = f"https://{BUCKET_NAME}.s3.eu-north-1.amazonaws.com"
-                        image_url = f"{base_url}/{photo_info['s3Key']}"
-                        
-                        # Check for thumbnail - look in thumbnails folder
-                        # Original path: galleries/continent/country/gallery_name/filename.ext
-                        # Thumbnail path: galleries/continent/country/gallery_name/thumbnails/filename.ext
-                        path_parts = photo_info['s3Key'].split('/')
-                        if len(path_parts) >= 4:
-                            # Insert 'thumbnails' before the filename
-                            thumbnail_parts = path_parts[:-1] + ['thumbnails'] + [path_parts[-1]]
-                            thumbnail_key = '/'.join(thumbnail_parts)
-                        else:
-                            thumbnail_key = photo_info['s3Key']
-                        
-                        thumbnail_url = None
-                        try:
-                            s3_client.head_object(Bucket=BUCKET_NAME, Key=thumbnail_key)
-                            thumbnail_url = f"{base_url}/{thumbnail_key}"
-                            logger.info(f"Found thumbnail: {thumbnail_key}")
-                        except:
-                            # No thumbnail found, use image as thumbnail
-                            thumbnail_url = image_url
-                            logger.info(f"No thumbnail found for {photo_info['filename']}, using original image")
-                        
-                        # Prepare photo data for DynamoDB
-                        now = datetime.utcnow().isoformat() + 'Z'
-                        photo_data = {
-                            'galleryId': gallery_id,
-                            'photoId': photo_id,
-                            'name': photo_info['filename'].rsplit('.', 1)[0],  # filename without extension
-                            's3Key': photo_info['s3Key'],
-                            'image': image_url,
-                            'thumbnail': thumbnail_url,
-                            'uploadedAt': now,
-                            'format': photo_info['file_extension'].upper(),
-                            'lastModified': now,
-                            'fileSize': format_file_size(photo_info['file_size'])
-                        }
-                        
-                        # Try to extract image dimensions and metadata
-                        try:
-                            # Get image from S3
-                            response = s3_client.get_object(Bucket=BUCKET_NAME, Key=photo_info['s3Key'])
-                            image_content = response['Body'].read()
-                            
-                            # Open image with PIL
-                            image = Image.open(io.BytesIO(image_content))
-                            
-                            # Get dimensions and add dimensions field
-                            photo_data['dimensions'] = f"{image.width}x{image.height}"
-                            
-                            # Extract EXIF data
-                            exif_data = {}
-                            if hasattr(image, 'getexif'):
-                                exif = image.getexif()
-                                if exif:
-                                    for tag_id, value in exif.items():
-                                        tag = TAGS.get(tag_id, tag_id)
-                                        try:
-                                            if isinstance(value, bytes):
-                                                value = value.decode('utf-8', errors='ignore')
-                                            exif_data[tag] = value
-                                        except:
-                                            continue
-                            
-                            if exif_data:
-                                photo_data['hasExif'] = True
-                                
-                                # Try to get date taken
-                                date_taken = exif_data.get('DateTime') or exif_data.get('DateTimeOriginal')
-                                if date_taken:
-                                    try:
-                                        taken_at = datetime.strptime(str(date_taken), '%Y:%m:%d %H:%M:%S').isoformat() + 'Z'
-                                        photo_data['takenAt'] = taken_at
-                                    except:
-                                        pass
-                            
-                        except Exception as e:
-                            logger.warning(f"Could not extract metadata for {photo_info['filename']}: {e}")
-                            photo_data['hasExif'] = False
-                        
-                        # Check if photo already exists in DynamoDB
-                        # Use s3Key to find existing photo
-                        from boto3.dynamodb.conditions import Key
-                        existing_photos = tbl_gallery_photos.query(
-                            KeyConditionExpression=Key('galleryId').eq(gallery_id)
-                        )
-                        
-                        existing_photo = None
-                        for existing in existing_photos.get('Items', []):
-                            if existing.get('s3Key') == photo_info['s3Key']:
-                                existing_photo = existing
-                                break
-                        
-                        if existing_photo:
-                            # Update existing photo
-                            logger.info(f"Updating existing photo: {photo_info['filename']}")
-                            
-                            update_expr = "SET #n=:n, s3Key=:sk, image=:img, thumbnail=:th, format=:fmt, lastModified=:now, fileSize=:fs"
-                            expr_vals = {
-                                ':n': photo_data['name'],
-                                ':sk': photo_data['s3Key'],
-                                ':img': photo_data['image'],
-                                ':th': photo_data['thumbnail'],
-                                ':fmt': photo_data['format'],
-                                ':now': photo_data['lastModified'],
-                                ':fs': photo_data['fileSize']
-                            }
-                            expr_names = {'#n': 'name'}
-                            
-                            # Add optional fields if they exist
-                            if 'dimensions' in photo_data:
-                                update_expr += ", dimensions=:dim"
-                                expr_vals[':dim'] = photo_data['dimensions']
-                            
-                            if 'hasExif' in photo_data:
-                                update_expr += ", hasExif=:exif"
-                                expr_vals[':exif'] = photo_data['hasExif']
-                            
-                            if 'takenAt' in photo_data:
-                                update_expr += ", takenAt=:ta"
-                                expr_vals[':ta'] = photo_data['takenAt']
-                            
-                            tbl_gallery_photos.update_item(
-                                Key={'galleryId': gallery_id, 'photoId': existing_photo['photoId']},
-                                UpdateExpression=update_expr,
-                                ExpressionAttributeValues=expr_vals,
-                                ExpressionAttributeNames=expr_names
-                            )
-                            photos_updated += 1
-                        else:
-                            # Create new photo
-                            logger.info(f"Creating new photo: {photo_info['filename']}")
-                            tbl_gallery_photos.put_item(Item=photo_data)
-                            photos_created += 1
-                            
-                    except Exception as e:
-                        error_msg = f"Error processing photo {photo_info['filename']}: {str(e)}"
-                        logger.error(error_msg)
-                        errors.append(error_msg)
-                        continue
+                # Thumbnails are matched to originals from the listing without extra S3 requests
+                counts = reconcile_gallery_photos(gallery_id, photos, index_thumbnails(run))
+                photos_created += counts['photos_created']
+                photos_updated += counts['photos_updated']
+                photos_unchanged += counts['photos_unchanged']
+                errors.extend(counts['errors'])
                         
             except Exception as e:
                 error_msg = f"Error processing gallery {gallery_path}: {str(e)}"
@@ -1624,9 +2783,10 @@ def scan_s3_for_photos():
         
         logger.info(f"=== UPDATE GALLERY PHOTOS SUMMARY ===")
         logger.info(f"Total files scanned in S3: {total_files_scanned}")
-        logger.info(f"Galleries with photos found: {len(gallery_photos)}")
+        logger.info(f"Galleries with photos found: {galleries_found}")
         logger.info(f"Photos updated: {photos_updated}")
         logger.info(f"Photos created: {photos_created}")
+        logger.info(f"Photos unchanged: {photos_unchanged}")
         logger.info(f"Total processed: {total_processed}")
         logger.info(f"Errors: {len(errors)}")
         logger.info(f"=====================================")
@@ -1635,9 +2795,11 @@ def scan_s3_for_photos():
             'message': 'Gallery photos metadata updated successfully from S3',
             'photos_updated': photos_updated,
             'photos_created': photos_created,
+            'photos_unchanged': photos_unchanged,
             'total_processed': total_processed,
             'total_files_scanned': total_files_scanned,
-            'galleries_found': len(gallery_photos),
+            'galleries_found': galleries_found,
+            'source': 'inventory' if mode == 'inventory' else 'listing',
             'errors': errors if errors else []
         })
         
@@ -1646,6 +2808,205 @@ def scan_s3_for_photos():
         return create_response(500, {'error': 'Failed to update gallery photos metadata', 'details': str(e)})
 
 
+def find_gallery_for_path(gallery_path):
+    """
+    galleryId of the gallery that owns an S3 folder, or None when there is none.
+    Indexed folders cost one keyed read; unindexed ones are checked under their legacy ID.
+    """
+    if gallery_path.startswith(ID_LAYOUT_PREFIX):
+        # ID-layout folders are named after their gallery
+        gallery_id = gallery_path[len(ID_LAYOUT_PREFIX):].rstrip('/')
+        return gallery_id if tbl_galleries.get_item(Key={'galleryId': gallery_id}).get('Item') else None
+    gallery_id, indexed = resolve_gallery_id(gallery_path)
+    if indexed:
+        return gallery_id
+    if tbl_galleries.get_item(Key={'galleryId': gallery_id}).get('Item'):
+        return gallery_id
+    return None
+
+
+def photo_info_from_object(obj):
+    """
+    Build the photo_info record for a listed original, or None for non-photo keys
+    """
+    key = obj['Key']
+    # Skip folder placeholders, metadata files, and thumbnails
+    if (key.endswith('/') or 
+        key.endswith('.json') or 
+        '/thumbnails/' in key):
+        return None
+    
+    # Check if it's an image file
+    if not key.lower().endswith(('.jpg', '.jpeg', '.png', '.webp', '.avif', '.tiff', '.bmp')):
+        return None
+    
+    # Gallery folder: galleries/continent/country/gallery_name/ or gallery-data/<galleryId>/
+    gallery_path = gallery_path_of(key)
+    if not gallery_path:
+        return None
+    
+    filename = key.split('/')[-1]
+    return {
+        'gallery_path': gallery_path,
+        'filename': filename,
+        's3Key': key,
+        'file_extension': filename.split('.')[-1].lower(),
+        'file_size': obj.get('Size', 0),
+        'last_modified': obj.get('LastModified')
+    }
+
+
+def reconcile_gallery_photos(gallery_id, photos, thumbnails_by_stem, deleted_keys=()):
+    """
+    Diff listed photos of one gallery against its GalleryPhotos items and write only what changed.
+    Records whose s3Key is in deleted_keys are removed.
+    Returns counters and per-photo errors.
+    """
+    # Load the gallery's existing photos once and index them by s3Key
+    existing_by_key = {}
+    for existing in query_gallery_photos(gallery_id):
+        if existing.get('s3Key'):
+            existing_by_key[existing['s3Key']] = existing
+    
+    base_url = f"https://{BUCKET_NAME}.s3.eu-north-1.amazonaws.com"
+    items_to_write = []
+    keys_to_delete = []
+    counts = {'photos_created': 0, 'photos_updated': 0, 'photos_unchanged': 0, 'photos_deleted': 0, 'errors': []}
+    
+    # Diff the S3 listing against the index
+    for photo_info in photos:
+        try:
+            existing_photo = existing_by_key.get(photo_info['s3Key'])
+            image_url = f"{base_url}/{photo_info['s3Key']}"
+            
+            # Resolve the thumbnail from the listing (thumbnails/<stem>.<ext>, <stem>_thumb.webp, ...)
+            # falling back to the original image when none was listed
+            thumbnail_key = resolve_thumbnail_key(photo_info['s3Key'], thumbnails_by_stem)
+            thumbnail_url = f"{base_url}/{thumbnail_key}" if thumbnail_key else image_url
+            
+            # Fields derived from the S3 listing
+            derived = {
+                's3Key': photo_info['s3Key'],
+                'image': image_url,
+                'thumbnail': thumbnail_url,
+                'format': photo_info['file_extension'].upper(),
+                'fileSize': format_file_size(photo_info['file_size'])
+            }
+            
+            # Only probe the object when the bytes are new or changed
+            needs_probe = (not existing_photo or
+                           not existing_photo.get('dimensions') or
+                           existing_photo.get('fileSize') != derived['fileSize'])
+            if needs_probe:
+                try:
+                    probe = probe_s3_object(s3_client, BUCKET_NAME, photo_info['s3Key'], size=photo_info['file_size'])
+                    derived['dimensions'] = f"{probe['width']}x{probe['height']}"
+                    derived['hasExif'] = bool(probe['has_exif'])
+                    taken_at = exif_taken_at(probe['exif']) if probe['has_exif'] else None
+                    if taken_at:
+                        derived['takenAt'] = taken_at
+                except Exception as e:
+                    logger.warning(f"Could not extract metadata for {photo_info['filename']}: {e}")
+                    derived['hasExif'] = False
+            
+            now = datetime.utcnow().isoformat() + 'Z'
+            if existing_photo:
+                changed = {k: v for k, v in derived.items() if existing_photo.get(k) != v}
+                if not changed:
+                    counts['photos_unchanged'] += 1
+                    continue
+                # Keep user-edited fields (name, sortOrder, ...) and overwrite only what S3 dictates
+                logger.info(f"Updating existing photo: {photo_info['filename']} ({', '.join(sorted(changed))})")
+                items_to_write.append({**existing_photo, **changed, 'lastModified': now})
+                counts['photos_updated'] += 1
+            else:
+                logger.info(f"Creating new photo: {photo_info['filename']}")
+                items_to_write.append({
+                    'galleryId': gallery_id,
+                    # ID-layout objects are named after their photoId, so a record written by the upload
+                    # meanwhile is the same item; only legacy named paths need a new ID
+                    'photoId': id_layout_photo_id(photo_info['s3Key']) or str(uuid.uuid4()),
+                    'name': photo_info['filename'].rsplit('.', 1)[0],  # filename without extension
+                    'uploadedAt': now,
+                    'lastModified': now,
+                    **derived
+                })
+                counts['photos_created'] += 1
+                
+        except Exception as e:
+            error_msg = f"Error processing photo {photo_info['filename']}: {str(e)}"
+            logger.error(error_msg)
+            counts['errors'].append(error_msg)
+            continue
+    
+    for key in deleted_keys:
+        existing_photo = existing_by_key.get(key)
+        if existing_photo:
+            keys_to_delete.append({'galleryId': gallery_id, 'photoId': existing_photo['photoId']})
+    
+    # Write only the creates, updates and deletes that are actually needed, in batches
+    if items_to_write or keys_to_delete:
+        with tbl_gallery_photos.batch_writer(overwrite_by_pkeys=['galleryId', 'photoId']) as batch:
+            for item in items_to_write:
+                batch.put_item(Item=item)
+            for key in keys_to_delete:
+                batch.delete_item(Key=key)
+    counts['photos_deleted'] = len(keys_to_delete)
+    logger.info(f"Gallery {gallery_id}: {counts['photos_created']} created, {counts['photos_updated']} updated, "
+                f"{counts['photos_unchanged']} unchanged, {counts['photos_deleted']} deleted")
+    return counts
+
+
+def sync_photos_incremental(continuation_token=None, context=None):
+    """
+    Process only the photos added, changed or deleted in S3 since the last checkpoint,
+    in both the legacy galleries/ and the gallery-data/ layouts
+    """
+    def apply_diff(diff):
+        changed_keys = diff.changed_keys
+        thumbnails_by_stem = index_thumbnails(diff.objects)
+        # A new or removed thumbnail changes the record of the original it belongs to
+        changed_stems = {thumbnail_stem(key.split('/')[-1]) for key in changed_keys if '/thumbnails/' in key}
+        
+        photos = []
+        for obj in diff.objects:
+            photo_info = photo_info_from_object(obj)
+            if photo_info and (obj['Key'] in changed_keys or
+                               thumbnail_stem(photo_info['filename']) in changed_stems):
+                photos.append(photo_info)
+        deleted_keys = [key for key in diff.deleted if '/thumbnails/' not in key]
+        if not photos and not deleted_keys:
+            return {}
+        
+        gallery_id = find_gallery_for_path(diff.gallery_path)
+        if not gallery_id:
+            # Leave the folder's ETags unsaved so its photos are imported once the gallery exists
+            raise GalleryNotReady(f"No gallery found in DynamoDB for {diff.gallery_path}",
+                                  counts={'galleries_missing': 1})
+        
+        counts = reconcile_gallery_photos(gallery_id, photos, thumbnails_by_stem, deleted_keys=deleted_keys)
+        if counts['photos_created'] or counts['photos_deleted']:
+            update_gallery_photo_count(gallery_id)
+        return counts
+
+    try:
+        logger.info("Starting incremental update_GalleryPhotos")
+        result = run_incremental_sync(
+            SyncCheckpoint(tbl_sync_state, 'photos'), s3_client, BUCKET_NAME, apply_diff,
+            continuation_token=continuation_token, context=context, time_buffer_ms=SYNC_TIME_BUFFER_MS
+        )
+        logger.info(f"Incremental photos sync result: {json.dumps(result, default=str)}")
+        return create_response(200, {
+            'message': 'Gallery photos synced incrementally from S3' if result['complete']
+                       else 'Gallery photos sync paused before timeout, call again with continuationToken',
+            'mode': 'incremental',
+            **result
+        })
+    except Exception as e:
+        logger.error(f"Error in incremental update_GalleryPhotos: {str(e)}")
+        return create_response(500, {'error': 'Failed to sync gallery photos', 'details': str(e)})
+
+
 def rate_photo(body):
     """
     Rate a photo with 0-5 stars
@@ -1667,13 +3028,7 @@ def rate_photo(body):
         
         # Check if photo exists
         try:
-            # Query GalleryPhotos table to find the photo
-            from boto3.dynamodb.conditions import Key
-            response = tbl_gallery_photos.scan(
-                FilterExpression=Key('photoId').eq(photo_id)
-            )
-            
-            if not response.get('Items'):
+            if not photo_exists(photo_id, body.get('galleryId')):
                 return create_response(404, {'error': 'Photo not found'})
         except Exception as e:
             logger.error(f"Error checking photo existence: {e}")
@@ -1810,51 +3165,37 @@ def get_photo_rating(query_params):
         logger.error(f"Error in get_photo_rating: {str(e)}")
         return create_response(500, {'error': 'Failed to get photo rating', 'details': str(e)})
 
-def geocode_place(gallery_name, country=None):
-    global _last_geocode_ts
-    name = (gallery_name or "").strip()
-    ctry = (country or "").strip()
-    if not name:
-        return None
-
-    cache_key = (name.lower(), ctry.lower())
-    if cache_key in _geocode_cache:
-        return _geocode_cache[cache_key]
-
-    q = f"{name}, {ctry}" if ctry else name
-
-    elapsed = time.time() - _last_geocode_ts
-    if elapsed < 1:
-        time.sleep(1 - elapsed)
-
-    url = "https://nominatim.openstreetmap.org/search?" + urllib.parse.urlencode({
-        "q": q, "format": "json", "limit": 1
-    })
-    req = urllib.request.Request(url, headers={
-        "User-Agent": "my-photo-app/1.0 (contact@example.com)"
-    })
 
-    try:
-        with urllib.request.urlopen(req, timeout=10) as resp:
-            _last_geocode_ts = time.time()
-            data = json.loads(resp.read().decode("utf-8"))
-            if data:
-                lat = Decimal(data[0]["lat"])
-                lon = Decimal(data[0]["lon"])
-                _geocode_cache[cache_key] = (lat, lon)
-                return lat, lon
-    except Exception as e:
-        print(f"Geocode failed for '{q}': {e}")
+def get_geocoder():
+    """
+    Geocoder of this container, built on first use (the gazetteer is loaded once per container).
+    Geocode workers call this concurrently, so only the first of them builds it.
+    """
+    global _geocoder
+    if _geocoder is None:
+        with _geocoder_lock:
+            if _geocoder is None:
+                gazetteer = None
+                if GAZETTEER_SOURCE:
+                    try:
+                        gazetteer = Gazetteer.load(GAZETTEER_SOURCE, s3_client=s3_client)
+                    except Exception as e:
+                        logger.warning(f"Could not load gazetteer {GAZETTEER_SOURCE}, using the network only: {e}")
+                _geocoder = Geocoder(
+                    cache_size=GEOCODE_LRU_SIZE,
+                    cache_table=GeocodeCacheTable(lambda: thread_table(GEOCODE_CACHE_TABLE_NAME)),
+                    gazetteer=gazetteer,
+                    nominatim=NominatimClient()
+                )
+    return _geocoder
 
-    _geocode_cache[cache_key] = None
-    return None
 
 def update_gallery_sort_order(request_data):
     """
     Update the sort order (sequence) for multiple galleries
     """
     try:
-        logger.info(f"Updating gallery sort order with data: {request_data}")
+        verbose(logger, "Updating gallery sort order with data: %s", summary(request_data))
         
         # Validate request data
         if 'galleries' not in request_data:
@@ -1873,6 +3214,11 @@ def update_gallery_sort_order(request_data):
             if not isinstance(gallery['sortOrder'], (int, float)) or gallery['sortOrder'] < 1:
                 return create_response(400, {'error': 'sortOrder must be a positive number'})
         
+        # createdAt of each gallery, for its listOrder-index key
+        created = {item['galleryId']: item.get('createdAt', '') for item in batch_get_keys(
+            GALLERIES_TABLE_NAME, [{'galleryId': gid} for gid in dict.fromkeys(g['galleryId'] for g in galleries_data)],
+            attributes=['galleryId', 'createdAt'])}
+        
         # Update each gallery's sort order in DynamoDB
         updated_count = 0
         errors = []
@@ -1881,13 +3227,16 @@ def update_gallery_sort_order(request_data):
             try:
                 gallery_id = gallery['galleryId']
                 sort_order = int(gallery['sortOrder'])
+                list_key = gallery_facets.list_key({'galleryId': gallery_id, 'sortOrder': sort_order,
+                                                    'createdAt': created.get(gallery_id, '')})
                 
                 # Update the gallery with new sort order
                 response = tbl_galleries.update_item(
                     Key={'galleryId': gallery_id},
-                    UpdateExpression='SET sortOrder = :sort_order, updatedAt = :updated_at',
+                    UpdateExpression='SET sortOrder = :sort_order, listKey = :list_key, updatedAt = :updated_at',
                     ExpressionAttributeValues={
                         ':sort_order': sort_order,
+                        ':list_key': list_key,
                         ':updated_at': datetime.utcnow().isoformat() + 'Z'
                     },
                     ConditionExpression='attribute_exists(galleryId)',
@@ -1950,7 +3299,7 @@ def update_photo_sort_order(request_data):
     Update the sort order (sequence) for photos within a gallery
     """
     try:
-        logger.info(f"Updating photo sort order with data: {request_data}")
+        verbose(logger, "Updating photo sort order with data: %s", summary(request_data))
         
         # Validate request data
         if 'galleryId' not in request_data:
@@ -2060,13 +3409,10 @@ def get_upload_urls(gallery_id, request_data):
                 return create_response(400, {'error': f'Gallery {gallery_id} not found'})
             
             gallery = gallery_response['Item']
-            continent = gallery.get('continent', 'unknown')
-            country = gallery.get('country', 'unknown')
-            name = gallery.get('name', 'unknown')
-            
-            # Build the correct gallery path: galleries/continent/country/name/
-            gallery_path = f"galleries/{continent}/{country}/{name}"
-            logger.info(f"Gallery path: {gallery_path}")
+            gallery.setdefault('continent', 'unknown')
+            gallery.setdefault('country', 'unknown')
+            gallery.setdefault('name', 'unknown')
+            logger.info(f"Gallery path: {gallery_storage_prefix(gallery)}")
             
         except Exception as e:
             logger.error(f"Error getting gallery info: {str(e)}")
@@ -2089,17 +3435,38 @@ def get_upload_urls(gallery_id, request_data):
         
         # Generate presigned URLs for each photo
         upload_urls = []
+        seen_hashes = {}
+        duplicates = 0
         
         for photo in photos_data:
             try:
+                # Photos whose bytes are already stored get a reference instead of upload URLs
+                content_hash = normalize_content_hash(photo.get('contentHash'))
+                existing_photo = None
+                if content_hash:
+                    existing_photo = find_photo_by_content_hash(gallery_id, content_hash)
+                    if not existing_photo and content_hash in seen_hashes:
+                        existing_photo = seen_hashes[content_hash]
+                if existing_photo:
+                    upload_urls.append({
+                        'photo_id': existing_photo.get('photoId'),
+                        'duplicate': True,
+                        'content_hash': content_hash,
+                        'existing_photo': existing_photo
+                    })
+                    duplicates += 1
+                    logger.info(f"Photo {photo['filename']} already stored as {existing_photo.get('photoId')}, skipping upload")
+                    continue
+
                 # Generate unique photo ID
                 photo_id = str(uuid.uuid4())
                 
-                # Create S3 keys using the correct gallery path
-                # Original: galleries/continent/country/gallery_name/filename.webp
-                # Thumbnail: galleries/continent/country/gallery_name/thumbnails/filename_thumb.webp
-                original_key = f"{gallery_path}/{photo['filename']}"
-                thumbnail_key = f"{gallery_path}/thumbnails/{photo['thumbnailFilename']}"
+                # Create S3 keys in the gallery's layout
+                # ID layout: gallery-data/<galleryId>/<photoId>.webp, thumbnails/<photoId>.webp
+                # Legacy: galleries/continent/country/gallery_name/filename.webp, thumbnails/filename_thumb.webp
+                original_key, thumbnail_key = photo_object_keys(
+                    gallery, photo_id, photo['filename'], photo['thumbnailFilename']
+                )
                 
                 # Generate presigned URLs for PUT operations
                 original_url = s3_client.generate_presigned_url(
@@ -2124,11 +3491,16 @@ def get_upload_urls(gallery_id, request_data):
                 
                 upload_urls.append({
                     'photo_id': photo_id,
+                    'duplicate': False,
+                    'content_hash': content_hash,
                     'original_url': original_url,
                     'thumbnail_url': thumbnail_url,
                     'original_key': original_key,
                     'thumbnail_key': thumbnail_key
                 })
+                if content_hash:
+                    # A repeated file within the same request points at the first copy
+                    seen_hashes[content_hash] = {'photoId': photo_id, 's3Key': original_key, 'thumbnailKey': thumbnail_key}
                 
                 logger.info(f"Generated presigned URLs for photo {photo_id}")
                 
@@ -2138,12 +3510,13 @@ def get_upload_urls(gallery_id, request_data):
                     'error': f'Failed to generate presigned URLs: {str(e)}'
                 })
         
-        logger.info(f"Successfully generated {len(upload_urls)} presigned URLs")
+        logger.info(f"Successfully generated {len(upload_urls) - duplicates} presigned URLs ({duplicates} duplicates skipped)")
         
         return create_response(200, {
             'success': True,
             'upload_urls': upload_urls,
-            'message': f'Generated {len(upload_urls)} presigned URLs'
+            'duplicates': duplicates,
+            'message': f'Generated {len(upload_urls) - duplicates} presigned URLs'
         })
         
     except Exception as e:
@@ -2166,9 +3539,6 @@ def update_gallery_photo_count(gallery_id):
             KeyConditionExpression=Key('galleryId').eq(str(gallery_id))
         )
         
-        # Log the response for debugging
-        logger.info(f"Query response for gallery {gallery_id}: {photos_resp}")
-        
         photo_count = len(photos_resp.get('Items', []))
         logger.info(f"Counted {photo_count} photos for gallery {gallery_id}")
         
@@ -2184,7 +3554,7 @@ def update_gallery_photo_count(gallery_id):
             ReturnValues='UPDATED_NEW'
         )
         
-        logger.info(f"Update response for gallery {gallery_id}: {update_response}")
+        verbose(logger, "Update response for gallery %s: %s", gallery_id, summary(update_response.get('Attributes')))
         logger.info(f"Successfully updated photoCount for gallery {gallery_id} to {photo_count}")
         return photo_count
         
@@ -0,0 +1,58 @@
+"""
+Lazily created AWS clients, resources and tables.
+
+Creating a boto3 client or resource loads and parses its service model, which
+is a large part of a cold start; binding tables on top of a DynamoDB resource
+forces that for every entry point, even one that only ever reads a gallery.
+A Lazy proxy stands in for the object at module level and builds it on first
+attribute access, so call sites keep using `s3_client.get_object(...)` and
+`tbl_galleries.query(...)` unchanged and only pay for what a request touches.
+
+Time spent building each object is recorded in INIT_TIMINGS for the
+init benchmark.
+"""
+import threading
+import time
+
+# name -> seconds spent building the object
+INIT_TIMINGS = {}
+
+
+class Lazy:
+    """
+    Proxy that calls factory() on first use and forwards attribute access to the result
+    """
+    __slots__ = ('_name', '_factory', '_target', '_lock')
+
+    def __init__(self, name, factory):
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_factory', factory)
+        object.__setattr__(self, '_target', None)
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    def resolve(self):
+        """The underlying object, built on the first call"""
+        target = self._target
+        if target is None:
+            with self._lock:
+                target = self._target
+                if target is None:
+                    started = time.perf_counter()
+                    target = self._factory()
+                    INIT_TIMINGS[self._name] = time.perf_counter() - started
+                    object.__setattr__(self, '_target', target)
+        return target
+
+    @property
+    def initialized(self):
+        return self._target is not None
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.resolve(), name, value)
+
+    def __repr__(self):
+        state = 'initialized' if self._target is not None else 'not initialized'
+        return f"<Lazy {self._name} ({state})>"
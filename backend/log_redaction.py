@@ -0,0 +1,121 @@
+"""
+Bounded, redacted log payloads for the Lambda handlers.
+
+Request events and bodies used to be logged whole with f-strings, so an
+upload_photos call formatted and shipped every base64 image into CloudWatch.
+summary(value) wraps a payload for a %s log argument: nothing is formatted
+unless the record is actually emitted, and when it is, image payloads and
+credentials are replaced by their size, e-mail addresses are masked, long
+strings are cut to LOG_FIELD_MAX characters and long lists to LOG_ITEMS_MAX
+items.
+
+Verbose per-request logs go through verbose(), which emits them at INFO for a
+LOG_SAMPLE_RATE fraction of requests (chosen by start_request()) and at DEBUG
+otherwise, so LOG_LEVEL=DEBUG still shows all of them.
+
+    LOG_LEVEL        logger level of the handlers (default INFO)
+    LOG_FIELD_MAX    characters kept of any string (default 256)
+    LOG_ITEMS_MAX    items kept of any list, and keys of any dict (default 20)
+    LOG_SAMPLE_RATE  fraction of requests whose verbose logs are emitted at INFO (default 0.05)
+"""
+import contextvars
+import json
+import logging
+import os
+import random
+import re
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FIELD_MAX = int(os.getenv('LOG_FIELD_MAX', '256'))
+LOG_ITEMS_MAX = int(os.getenv('LOG_ITEMS_MAX', '20'))
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '0.05'))
+
+# Keys (case-insensitive) whose values are replaced by their size
+REDACTED_KEYS = {'image', 'imagedata', 'thumbnaildata', 'data', 'password', 'token',
+                 'authorization', 'cookie', 'x-api-key'}
+
+_EMAIL_RE = re.compile(r'([A-Za-z0-9._%+-])[A-Za-z0-9._%+-]*@([A-Za-z0-9.-]+\.[A-Za-z]{2,})')
+_DATA_URL_RE = re.compile(r'data:[\w/+.-]+;base64,', re.IGNORECASE)
+
+# Per request context, so concurrent requests in one process sample independently
+_sampled = contextvars.ContextVar('log_sampled', default=False)
+
+
+def mask_email(text):
+    """Mask the local part of every e-mail address in text: jane@example.com -> j***@example.com"""
+    return _EMAIL_RE.sub(r'\1***@\2', text)
+
+
+def _size(value):
+    if isinstance(value, (str, bytes)):
+        return f"<redacted {len(value)} chars>"
+    return f"<redacted {type(value).__name__}>"
+
+
+def redact(value, max_field=None, max_items=None):
+    """Return a JSON-serialisable, redacted and size-capped copy of value"""
+    max_field = LOG_FIELD_MAX if max_field is None else max_field
+    max_items = LOG_ITEMS_MAX if max_items is None else max_items
+
+    if isinstance(value, dict):
+        result = {}
+        for i, (key, item) in enumerate(value.items()):
+            if i >= max_items:
+                result['...'] = f"+{len(value) - max_items} keys"
+                break
+            if str(key).lower() in REDACTED_KEYS and item:
+                result[key] = _size(item)
+            else:
+                result[key] = redact(item, max_field, max_items)
+        return result
+    if isinstance(value, (list, tuple, set)):
+        items = list(value)
+        result = [redact(item, max_field, max_items) for item in items[:max_items]]
+        if len(items) > max_items:
+            result.append(f"... +{len(items) - max_items} items")
+        return result
+    if isinstance(value, bytes):
+        return _size(value)
+    if isinstance(value, str):
+        if _DATA_URL_RE.match(value):
+            return _size(value)
+        text = value if len(value) <= max_field else f"{value[:max_field]}...(+{len(value) - max_field} chars)"
+        return mask_email(text)
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return redact(str(value), max_field, max_items)
+
+
+class summary:
+    """
+    Log argument that renders a redacted, size-capped JSON summary of value, only when emitted:
+
+        logger.info("Body: %s", summary(body))
+    """
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return json.dumps(redact(self.value), default=str)
+
+    __repr__ = __str__
+
+
+def configure(logger):
+    """Apply LOG_LEVEL to a handler's logger"""
+    logger.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+    return logger
+
+
+def start_request():
+    """Decide whether this request's verbose logs are sampled; returns the decision"""
+    sampled = LOG_SAMPLE_RATE > 0 and random.random() < LOG_SAMPLE_RATE
+    _sampled.set(sampled)
+    return sampled
+
+
+def verbose(logger, msg, *args):
+    """Log at INFO for sampled requests and at DEBUG otherwise"""
+    logger.log(logging.INFO if _sampled.get() else logging.DEBUG, msg, *args)
@@ -0,0 +1,134 @@
+"""
+Move every object under one S3 prefix to another (gallery renames).
+
+Objects are moved a listing page (up to 1,000 keys) at a time: the page is
+copied server-side on a thread pool, then its originals are removed with one
+delete_objects call. Because moved keys disappear from the old prefix, the next
+listing always starts with what is left, so an interrupted move resumes simply
+by running again; copies are idempotent, so a page interrupted between its
+copies and its delete is safe to redo.
+"""
+import logging
+from concurrent.futures import as_completed
+
+from boto3.s3.transfer import TransferConfig
+
+from worker_pools import ContextThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# copy_object is limited to 5 GB; larger objects are copied in parts
+MULTIPART_COPY_THRESHOLD = 5 * 1024 ** 3
+MULTIPART_COPY_CHUNK_SIZE = 512 * 1024 ** 2
+DELETE_BATCH_SIZE = 1000  # delete_objects limit
+
+
+def copy_object_any_size(s3_client, bucket, key, new_key, size):
+    """
+    Server-side copy of one object, using a multipart copy above 5 GB
+    """
+    if size is not None and size > MULTIPART_COPY_THRESHOLD:
+        s3_client.copy(
+            {'Bucket': bucket, 'Key': key}, bucket, new_key,
+            Config=TransferConfig(multipart_threshold=MULTIPART_COPY_THRESHOLD,
+                                  multipart_chunksize=MULTIPART_COPY_CHUNK_SIZE)
+        )
+    else:
+        s3_client.copy_object(Bucket=bucket, Key=new_key, CopySource={'Bucket': bucket, 'Key': key})
+
+
+def delete_keys(s3_client, bucket, keys, failed_keys=None):
+    """
+    Delete keys in delete_objects batches of 1,000. Returns the number deleted and per-key errors;
+    the keys that could not be deleted are also appended to failed_keys when a list is given.
+    """
+    deleted = 0
+    errors = []
+    for i in range(0, len(keys), DELETE_BATCH_SIZE):
+        batch = keys[i:i + DELETE_BATCH_SIZE]
+        resp = s3_client.delete_objects(
+            Bucket=bucket,
+            Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+        )
+        failed = resp.get('Errors', [])
+        deleted += len(batch) - len(failed)
+        if failed_keys is not None:
+            failed_keys.extend(err.get('Key') for err in failed)
+        errors.extend(f"Delete failed for {err.get('Key')}: {err.get('Code')} {err.get('Message', '')}".strip()
+                      for err in failed)
+    return deleted, errors
+
+
+def copy_keys(s3_client, bucket, pairs, pool):
+    """
+    Copy (key, new_key, size) triples concurrently on pool.
+    Returns the keys copied and per-key errors.
+    """
+    futures = {
+        pool.submit(copy_object_any_size, s3_client, bucket, key, new_key, size): key
+        for key, new_key, size in pairs
+    }
+    copied = []
+    errors = []
+    for future in as_completed(futures):
+        key = futures[future]
+        try:
+            future.result()
+            copied.append(key)
+        except Exception as e:
+            errors.append(f"Copy failed for {key}: {e}")
+    return copied, errors
+
+
+def move_prefix(s3_client, bucket, old_prefix, new_prefix, workers=16, should_stop=None, on_progress=None,
+                new_key=None):
+    """
+    Move all objects from old_prefix to new_prefix.
+    should_stop() is checked between pages so the caller can stop before a timeout;
+    on_progress(result) is called after every page, e.g. to checkpoint the counters.
+    new_key(obj) can map a listed object to another destination key than its path relative to
+    the prefix, or to None when it only needs deleting (e.g. it was copied earlier).
+    Returns {'copied', 'deleted', 'errors', 'complete'}.
+    """
+    if not old_prefix.endswith('/') or not new_prefix.endswith('/'):
+        raise ValueError("Prefixes must end with '/'")
+    if new_prefix.startswith(old_prefix) or old_prefix.startswith(new_prefix):
+        raise ValueError(f"Cannot move {old_prefix} into {new_prefix}")
+
+    if new_key is None:
+        def new_key(obj):
+            return new_prefix + obj['Key'][len(old_prefix):]
+
+    result = {'copied': 0, 'deleted': 0, 'errors': [], 'complete': False}
+    with ContextThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            page = s3_client.list_objects_v2(Bucket=bucket, Prefix=old_prefix, MaxKeys=DELETE_BATCH_SIZE)
+            objects = page.get('Contents', [])
+            if not objects:
+                result['complete'] = True
+                break
+            if should_stop is not None and should_stop():
+                break
+
+            targets = [(obj['Key'], new_key(obj), obj.get('Size')) for obj in objects]
+            moved_keys, copy_errors = copy_keys(
+                s3_client, bucket, [target for target in targets if target[1]], pool
+            )
+            result['copied'] += len(moved_keys)
+            result['errors'].extend(copy_errors)
+            moved_keys.extend(key for key, target, _ in targets if not target)
+
+            # Only originals whose copy succeeded are deleted
+            deleted, delete_errors = delete_keys(s3_client, bucket, moved_keys)
+            result['deleted'] += deleted
+            result['errors'].extend(delete_errors)
+            if on_progress is not None:
+                on_progress(result)
+            if result['errors']:
+                # Failed keys would come back on the next listing; stop and let the caller retry
+                logger.error(f"Stopping move of {old_prefix} after {len(result['errors'])} errors")
+                break
+
+    logger.info(f"Moved {old_prefix} -> {new_prefix}: {result['copied']} copied, {result['deleted']} deleted, "
+                f"complete={result['complete']}")
+    return result
@@ -0,0 +1,67 @@
+"""
+Read-only entry point for the public gallery pages.
+
+Serves GET /galleries (list), GET /galleries?continent=&country=&year= (filtered
+pages), GET /galleries?id= (one gallery), GET /galleries?action=gallery_facets,
+GET /galleries?action=gallery_map and GET /galleries?action=get_photo_rating
+with the gallery manager's own handlers, but routes nothing else, so the
+function can be deployed without the Pillow layer and with read-only IAM
+permissions. Clients and tables are created
+lazily by the manager module, so a list request only builds the DynamoDB
+resource and the Galleries table.
+"""
+import importlib
+import logging
+
+import log_redaction
+from request_metrics import observe_request
+
+logger = log_redaction.configure(logging.getLogger())
+
+
+def _load_gallery_api():
+    # Deployed as lambda_gallery_manager.py, kept in the repo as lambda.py
+    for name in ('lambda_gallery_manager', 'lambda'):
+        try:
+            return importlib.import_module(name)
+        except ModuleNotFoundError as e:
+            if e.name != name:
+                raise
+    raise ImportError("Gallery manager module not found (lambda_gallery_manager.py or lambda.py)")
+
+
+gallery_api = _load_gallery_api()
+
+READ_ACTIONS = ('get_photo_rating', 'gallery_facets', 'gallery_map')
+
+
+def lambda_handler(event, context):
+    """
+    Read-only Lambda handler for gallery and rating lookups
+    """
+    log_redaction.start_request()
+    http_method = event.get('httpMethod', 'GET')
+    path = event.get('path', '')
+    query_params = event.get('queryStringParameters') or {}
+
+    if http_method == 'OPTIONS':
+        return gallery_api.create_response(200, {'ok': True})
+    if http_method != 'GET' or '/galleries' not in path:
+        return gallery_api.create_response(405, {'error': 'This endpoint only serves gallery reads'})
+
+    action_param = query_params.get('action')
+    if action_param == 'get_photo_rating':
+        return observe_request('GET get_photo_rating', gallery_api.get_photo_rating, query_params)
+    if action_param == 'gallery_facets':
+        return observe_request('GET gallery_facets', gallery_api.get_gallery_facets)
+    if action_param == 'gallery_map':
+        return observe_request('GET gallery_map', gallery_api.get_gallery_map)
+    if action_param:
+        return gallery_api.create_response(400, {'error': f'Unsupported read action: {action_param}'})
+
+    gallery_id = query_params.get('id')
+    if gallery_id:
+        return observe_request('GET gallery', gallery_api.get_gallery, gallery_id)
+    if gallery_api.gallery_facets.is_filtered(query_params):
+        return observe_request('GET default', gallery_api.filter_galleries, query_params)
+    return observe_request('GET default', gallery_api.list_galleries)
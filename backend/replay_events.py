@@ -0,0 +1,330 @@
+"""
+Replay recorded API Gateway traffic against the gallery manager handler.
+
+Reads the {"recordedEvent": ...} lines event_recorder.py writes to the
+function's log and replays them through lambda_handler at the requested
+concurrency. Any export format works as long as each record's JSON is intact:
+timestamps, request IDs or tabs around it are skipped, and a JSON array of log
+messages is accepted too. For example:
+
+    aws logs filter-log-events --log-group-name /aws/lambda/gallery-manager \\
+        --filter-pattern '{ $.recordedEvent.v = 1 }' --query 'events[].message' > traffic.json
+
+Targets:
+    fakes   (default) the in-memory AWS fakes with a synthetic catalog (handler_benchmark.py);
+            recorded gallery and photo IDs are mapped onto catalog ones, recorded image sizes
+            onto generated JPEGs of about that size
+    local   real clients pointed at a local stand-in (DynamoDB Local, MinIO, LocalStack) with
+            --endpoint-url; recorded IDs are used as they are
+
+The report gives per action the request count, 4xx, errors (5xx or exceptions)
+and p50 / p95 / p99 latency, plus overall throughput.
+
+    python replay_events.py traffic.json [--concurrency 8] [--repeat 3] [--paced --speed 10]
+                            [--target fakes|local] [--endpoint-url http://localhost:4566] [--json]
+"""
+import argparse
+import base64
+import contextvars
+import hashlib
+import importlib
+import json
+import os
+import re
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+_IMAGE_RE = re.compile(r'^<image:(\d+)>$')
+_MARKER = '{"recordedEvent"'
+
+
+def load_records(paths):
+    """recordedEvent dicts found in the given files, in file order"""
+    decoder = json.JSONDecoder()
+    records = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+        stripped = text.lstrip()
+        if stripped.startswith('['):
+            # A JSON array of log messages (or of already parsed records)
+            messages = json.loads(stripped)
+            text = '\n'.join(m if isinstance(m, str) else json.dumps(m) for m in messages)
+        index = text.find(_MARKER)
+        while index != -1:
+            try:
+                obj, end = decoder.raw_decode(text, index)
+                records.append(obj['recordedEvent'])
+            except (ValueError, KeyError):
+                end = index + len(_MARKER)
+            index = text.find(_MARKER, end)
+    return records
+
+
+def action_of(record):
+    """Report bucket of a record, named like the handler's routes: 'POST upload_photos', 'GET default'"""
+    action = (record.get('query') or {}).get('action')
+    return f"{record.get('method', 'GET')} {action or 'default'}"
+
+
+def _stable_pick(value, choices):
+    digest = hashlib.sha1(str(value).encode('utf-8')).hexdigest()
+    return choices[int(digest, 16) % len(choices)]
+
+
+class IdMapper:
+    """Maps recorded gallery and photo IDs onto IDs of the fake catalog, the same way every time"""
+
+    def __init__(self, fake, galleries_table, photos_table):
+        self._galleries = sorted(str(key[0]) for key in fake.dynamodb.tables[galleries_table].items)
+        self._photos = fake.dynamodb.tables[photos_table]
+        self._gallery_ids = {}
+        self._photo_ids = {}
+        self._lock = threading.Lock()
+
+    def gallery(self, recorded_id):
+        with self._lock:
+            if recorded_id not in self._gallery_ids and self._galleries:
+                self._gallery_ids[recorded_id] = _stable_pick(recorded_id, self._galleries)
+            return self._gallery_ids.get(recorded_id, recorded_id)
+
+    def photo(self, recorded_id, gallery_id=None):
+        with self._lock:
+            key = (recorded_id, gallery_id)
+            if key not in self._photo_ids:
+                photos = sorted(str(item['photoId']) for item in self._photos.partition(None, gallery_id)) \
+                    if gallery_id else []
+                if not photos:
+                    photos = sorted(str(pk[1]) for pk in list(self._photos.items)[:1000])
+                self._photo_ids[key] = _stable_pick(recorded_id, photos) if photos else recorded_id
+            return self._photo_ids[key]
+
+    def remap(self, record):
+        """(query, body) of a record with catalog IDs in place of the recorded ones"""
+        query = dict(record.get('query') or {})
+        body = record.get('body')
+        recorded_gallery = query.get('id') or (body.get('id') or body.get('galleryId')
+                                               if isinstance(body, dict) else None)
+        gallery = self.gallery(recorded_gallery) if recorded_gallery else None
+        if 'id' in query:
+            query['id'] = gallery
+
+        def walk(value, parent=None):
+            if isinstance(value, list):
+                return [walk(v, parent) for v in value]
+            if not isinstance(value, dict):
+                return value
+            mapped = {}
+            for key, item in value.items():
+                if key == 'galleryId' or (key == 'id' and parent is None):
+                    mapped[key] = self.gallery(item)
+                elif key == 'photoId' or (key == 'id' and parent == 'photos'):
+                    mapped[key] = self.photo(item, gallery)
+                elif key == 'photoIds' and isinstance(item, list):
+                    mapped[key] = [self.photo(photo_id, gallery) for photo_id in item]
+                else:
+                    mapped[key] = walk(item, key)
+            return mapped
+
+        return query, walk(body)
+
+
+class ImageFactory:
+    """Synthetic JPEG data URLs of about a requested size, cached by size bucket"""
+
+    def __init__(self):
+        self._cache = {}
+        self._bytes_per_pixel = None
+        self._lock = threading.Lock()
+
+    def data_url(self, size):
+        from handler_benchmark import _jpeg
+        bucket = max(1024, int(round(size, -3)))
+        with self._lock:
+            if bucket not in self._cache:
+                if self._bytes_per_pixel is None:
+                    self._bytes_per_pixel = len(_jpeg(256, 256)) / (256 * 256)
+                pixels = bucket / self._bytes_per_pixel
+                width = max(16, min(6000, int((pixels * 4 / 3) ** 0.5)))
+                height = max(16, min(4500, int(width * 3 / 4)))
+                data = _jpeg(width, height, seed=bucket)
+                self._cache[bucket] = 'data:image/jpeg;base64,' + base64.b64encode(data).decode('ascii')
+            return self._cache[bucket]
+
+    def fill(self, value):
+        if isinstance(value, dict):
+            return {k: self.fill(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.fill(v) for v in value]
+        if isinstance(value, str):
+            match = _IMAGE_RE.match(value)
+            if match:
+                return self.data_url(int(match.group(1)))
+        return value
+
+
+def to_event(record, query=None, body=None, images=None):
+    """API Gateway event of a record"""
+    query = record.get('query') if query is None else query
+    body = record.get('body') if body is None else body
+    if images is not None:
+        body = images.fill(body)
+    if body is not None:
+        raw = json.dumps(body)
+    else:
+        raw = record.get('rawBody')
+    return {'httpMethod': record.get('method', 'GET'), 'path': record.get('path') or '/galleries',
+            'queryStringParameters': query or None, 'body': raw}
+
+
+def _offset_seconds(record, first):
+    try:
+        at = datetime.fromisoformat(record['at'].replace('Z', '+00:00'))
+        return max(0.0, (at - first).total_seconds())
+    except (KeyError, ValueError, TypeError):
+        return 0.0
+
+
+def replay(records, handler, prepare, context_factory, concurrency=4, repeat=1, paced=False, speed=1.0):
+    """
+    Send every record through handler repeat times on concurrency threads.
+    With paced=True records are sent at their recorded offsets divided by speed.
+    Returns [(action, latency_ms, status or None, error or None)] and the wall time.
+    """
+    results = []
+    lock = threading.Lock()
+
+    def call(record):
+        event = prepare(record)
+        started = time.perf_counter()
+        status, error = None, None
+        try:
+            response = handler(event, context_factory())
+            status = response.get('statusCode') if isinstance(response, dict) else None
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        latency_ms = (time.perf_counter() - started) * 1000
+        with lock:
+            results.append((action_of(record), latency_ms, status, error))
+
+    first = None
+    if paced and records:
+        first = datetime.fromisoformat(records[0]['at'].replace('Z', '+00:00'))
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for round_index in range(repeat):
+            round_started = time.perf_counter()
+            futures = []
+            for record in records:
+                if first is not None:
+                    delay = _offset_seconds(record, first) / speed - (time.perf_counter() - round_started)
+                    if delay > 0:
+                        time.sleep(delay)
+                # Each request in a fresh context: metrics, trace and log sampling are per request
+                futures.append(pool.submit(contextvars.Context().run, call, record))
+            for future in futures:
+                future.result()
+    return results, time.perf_counter() - started
+
+
+def _percentile(ordered, fraction):
+    # Nearest rank
+    return ordered[max(0, min(len(ordered) - 1, int(-(-fraction * len(ordered) // 1)) - 1))]
+
+
+def summarize(results, wall_seconds):
+    actions = {}
+    for action, latency_ms, status, error in results:
+        actions.setdefault(action, []).append((latency_ms, status, error))
+    report = {}
+    for action, calls in sorted(actions.items()):
+        latencies = sorted(latency for latency, _, _ in calls)
+        errors = [error or f"HTTP {status}" for _, status, error in calls if error or (status or 0) >= 500]
+        report[action] = {
+            'count': len(calls),
+            'client_errors': sum(1 for _, status, error in calls if not error and 400 <= (status or 0) < 500),
+            'errors': len(errors),
+            'p50_ms': _percentile(latencies, 0.50),
+            'p95_ms': _percentile(latencies, 0.95),
+            'p99_ms': _percentile(latencies, 0.99),
+            'mean_ms': statistics.fmean(latencies),
+            'sample_errors': sorted(set(errors))[:3],
+        }
+    return {'requests': len(results), 'wall_s': wall_seconds,
+            'throughput_rps': len(results) / wall_seconds if wall_seconds else 0.0, 'actions': report}
+
+
+def setup_target(target, endpoint_url=None, galleries=500, photos=50000, latency=None):
+    """(lambda_handler, prepare(record) -> event) for the chosen target"""
+    if target == 'local':
+        if endpoint_url:
+            os.environ['AWS_ENDPOINT_URL'] = endpoint_url
+        os.environ.setdefault('METRICS_SINK', 'off')
+        os.environ.setdefault('LOG_LEVEL', 'WARNING')
+        module = importlib.import_module('lambda')
+        return module.lambda_handler, to_event
+
+    import handler_benchmark
+    import request_metrics
+    module, fake, _ = handler_benchmark.setup(galleries, photos, latency)
+    # Replays can be long; keep no per-request records in memory
+    request_metrics.sink = request_metrics.NullSink()
+    mapper = IdMapper(fake, module.GALLERIES_TABLE_NAME, module.GALLERY_PHOTOS_TABLE_NAME)
+    images = ImageFactory()
+
+    def prepare(record):
+        query, body = mapper.remap(record)
+        return to_event(record, query, body, images)
+    return module.lambda_handler, prepare
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('files', nargs='+', help='exported logs containing recordedEvent lines')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=1, help='replay the recording this many times')
+    parser.add_argument('--paced', action='store_true', help='keep the recorded spacing between requests')
+    parser.add_argument('--speed', type=float, default=1.0, help='with --paced, replay this many times faster')
+    parser.add_argument('--target', choices=('fakes', 'local'), default='fakes')
+    parser.add_argument('--endpoint-url', help='endpoint of the local stand-in for --target local')
+    parser.add_argument('--galleries', type=int, default=500, help='fake catalog size')
+    parser.add_argument('--photos', type=int, default=50000, help='fake catalog size')
+    parser.add_argument('--latency', default='', help="fake per-call latency in ms, e.g. 'dynamodb=4,s3=15'")
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    records = load_records(args.files)
+    if not records:
+        print('No recordedEvent lines found', file=sys.stderr)
+        return 1
+    records.sort(key=lambda record: record.get('at', ''))
+
+    from handler_benchmark import FakeContext, parse_latency
+    handler, prepare = setup_target(args.target, args.endpoint_url, args.galleries, args.photos,
+                                    parse_latency(args.latency))
+    results, wall = replay(records, handler, prepare, FakeContext, args.concurrency, args.repeat,
+                           args.paced, args.speed)
+    report = summarize(results, wall)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+    print(f"{report['requests']} requests in {report['wall_s']:.1f} s ({report['throughput_rps']:.1f}/s), "
+          f"concurrency {args.concurrency}, target {args.target}")
+    print(f"{'action':<32} {'count':>6} {'4xx':>5} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for action, entry in report['actions'].items():
+        print(f"{action:<32} {entry['count']:>6} {entry['client_errors']:>5} {entry['errors']:>6} "
+              f"{entry['p50_ms']:>8.1f} {entry['p95_ms']:>8.1f} {entry['p99_ms']:>8.1f}")
+        for error in entry['sample_errors']:
+            print(f"{'':<32} {error}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,225 @@
+"""
+Per-request latency and AWS-call metrics, emitted as CloudWatch Embedded Metric Format.
+
+instrument_client() hooks a boto3 client's event system so every API call made
+while a request is being observed is counted by service and operation, and
+DynamoDB calls are sent with ReturnConsumedCapacity=TOTAL so the capacity they
+consume can be summed into read and write units. observe_request() wraps one
+route: it times the handler, counts the response bytes and writes a single
+EMF record to a sink. With TRACE_AWS_CALLS=1 the same clients also record a
+span per call (call_tracing.py) for the request being observed.
+
+Sinks:
+    StdoutSink   one JSON line per request on stdout, which CloudWatch Logs turns into metrics
+    MemorySink   keeps the records in a list, for tests and local runs
+
+METRICS_SINK=stdout (default) | memory | off selects the default sink.
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+
+import call_tracing
+
+logger = logging.getLogger(__name__)
+
+METRICS_NAMESPACE = os.getenv('METRICS_NAMESPACE', 'HaoExplore/GalleryApi')
+
+_READ_OPERATIONS = {'GetItem', 'BatchGetItem', 'Query', 'Scan', 'TransactGetItems'}
+
+# Metric name -> EMF unit
+METRICS = {
+    'Latency': 'Milliseconds',
+    'DynamoDBCalls': 'Count',
+    'S3Calls': 'Count',
+    'OtherAWSCalls': 'Count',
+    'ConsumedReadCapacity': 'Count',
+    'ConsumedWriteCapacity': 'Count',
+    'ResponseBytes': 'Bytes',
+    'Errors': 'Count',
+}
+
+
+class StdoutSink:
+    """Print each record as one JSON line (EMF must not carry a log prefix)"""
+
+    def emit(self, record):
+        print(json.dumps(record, separators=(',', ':'), default=str), flush=True)
+
+
+class MemorySink:
+    """Collect records in memory"""
+
+    def __init__(self):
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def clear(self):
+        self.records.clear()
+
+
+class NullSink:
+    def emit(self, record):
+        pass
+
+
+def default_sink():
+    kind = os.getenv('METRICS_SINK', 'stdout').lower()
+    if kind == 'memory':
+        return MemorySink()
+    if kind == 'off':
+        return NullSink()
+    return StdoutSink()
+
+
+sink = default_sink()
+
+
+class RequestMetrics:
+    """
+    Counters of one request. AWS calls made on worker threads are counted too.
+    """
+
+    def __init__(self, route):
+        self.route = route
+        self.calls = {}              # 'service.Operation' -> count
+        self.read_capacity = 0.0
+        self.write_capacity = 0.0
+        self._lock = threading.Lock()
+
+    def count_call(self, service, operation):
+        with self._lock:
+            key = f"{service}.{operation}"
+            self.calls[key] = self.calls.get(key, 0) + 1
+
+    def add_capacity(self, operation, consumed):
+        if not consumed:
+            return
+        entries = consumed if isinstance(consumed, list) else [consumed]
+        units = sum(float(entry.get('CapacityUnits', 0) or 0) for entry in entries)
+        with self._lock:
+            if operation in _READ_OPERATIONS:
+                self.read_capacity += units
+            else:
+                self.write_capacity += units
+
+    def service_calls(self, service):
+        return sum(count for key, count in self.calls.items() if key.split('.', 1)[0] == service)
+
+
+# A context variable, not a global, so concurrent requests in one process keep their own metrics;
+# worker pools pass it on to their threads (worker_pools.py)
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+def current_metrics():
+    """RequestMetrics of the request being observed, or None"""
+    return _current.get()
+
+
+def _add_consumed_capacity(params, model, **kwargs):
+    if 'ReturnConsumedCapacity' in model.input_shape.members and _current.get() is not None:
+        params.setdefault('ReturnConsumedCapacity', 'TOTAL')
+
+
+def _count_call(model, **kwargs):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.count_call(model.service_model.endpoint_prefix, model.name)
+
+
+def _record_capacity(parsed, model, **kwargs):
+    metrics = _current.get()
+    if metrics is not None and isinstance(parsed, dict):
+        metrics.add_capacity(model.name, parsed.get('ConsumedCapacity'))
+
+
+def instrument_client(client):
+    """
+    Count the calls of a boto3 client (or resource) into the current request's metrics,
+    and trace them when tracing is on. Returns what it was given so it can wrap client creation.
+    """
+    low_level = getattr(getattr(client, 'meta', None), 'client', None) or client
+    call_tracing.instrument_client(low_level)
+    events = low_level.meta.events
+    if getattr(low_level, '_request_metrics_instrumented', False):
+        return client
+    service = low_level.meta.service_model.service_name
+    # before-parameter-build fires once per API call, even when a stub answers it
+    events.register(f'before-parameter-build.{service}', _count_call, unique_id='request-metrics-count')
+    if service == 'dynamodb':
+        # provide-client-params handlers may return a copy; before-parameter-build sees the final dict
+        events.register('before-parameter-build.dynamodb', _add_consumed_capacity,
+                        unique_id='request-metrics-capacity-param')
+        events.register('after-call.dynamodb', _record_capacity, unique_id='request-metrics-capacity')
+    low_level._request_metrics_instrumented = True
+    return client
+
+
+def emf_record(metrics, latency_ms, status_code, response_bytes):
+    """Build the EMF record of one request"""
+    values = {
+        'Latency': round(latency_ms, 3),
+        'DynamoDBCalls': metrics.service_calls('dynamodb'),
+        'S3Calls': metrics.service_calls('s3'),
+        'OtherAWSCalls': sum(metrics.calls.values()) - metrics.service_calls('dynamodb') - metrics.service_calls('s3'),
+        'ConsumedReadCapacity': round(metrics.read_capacity, 3),
+        'ConsumedWriteCapacity': round(metrics.write_capacity, 3),
+        'ResponseBytes': response_bytes,
+        'Errors': 1 if status_code >= 500 else 0,
+    }
+    return {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [['Route']],
+                'Metrics': [{'Name': name, 'Unit': unit} for name, unit in METRICS.items()]
+            }]
+        },
+        'Route': metrics.route,
+        'StatusCode': status_code,
+        'AWSCalls': dict(metrics.calls),
+        **values
+    }
+
+
+def observe_request(route, handler, *args, error_response=None, **kwargs):
+    """
+    Run handler(*args, **kwargs) as one observed request and emit its metrics.
+    An unhandled exception becomes error_response(exc) when given, otherwise it is re-raised
+    after the metrics are written.
+    """
+    metrics = RequestMetrics(route)
+    token = _current.set(metrics)
+    call_tracing.start_trace(route)
+    started = time.perf_counter()
+    status_code = 500
+    response = None
+    try:
+        try:
+            response = handler(*args, **kwargs)
+        except Exception as e:
+            if error_response is None:
+                raise
+            response = error_response(e)
+        if isinstance(response, dict):
+            status_code = int(response.get('statusCode', 200))
+        else:
+            status_code = 200
+        return response
+    finally:
+        _current.reset(token)
+        call_tracing.finish_trace()
+        latency_ms = (time.perf_counter() - started) * 1000
+        body = response.get('body') if isinstance(response, dict) else None
+        response_bytes = len(body.encode('utf-8')) if isinstance(body, str) else 0
+        try:
+            sink.emit(emf_record(metrics, latency_ms, status_code, response_bytes))
+        except Exception as e:
+            logger.warning(f"Could not emit metrics for {route}: {e}")
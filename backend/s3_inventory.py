@@ -0,0 +1,213 @@
+"""
+S3 Inventory as an object source for the full reconciliation scans.
+
+An inventory report is a manifest.json plus a handful of large CSV (gzip) or
+Parquet data files. Reading those sequentially is far cheaper than paging
+list_objects_v2 over a big bucket. Rows are turned into the same dicts
+list_objects_v2 returns (Key, Size, LastModified, ETag) so they feed the
+gallery_listing pipeline unchanged.
+
+The source is either an s3://bucket/path/manifest.json URI or a local
+directory holding a manifest.json (or just the data files), which is handy for
+testing against a downloaded report.
+
+Each data file is read as a stream. The files are merged on the gallery folder
+of every key, so each gallery still comes out as one contiguous run as long as
+every data file lists its keys in order, which S3 Inventory does.
+"""
+import csv
+import gzip
+import heapq
+import io
+import json
+import logging
+import os
+import tempfile
+import urllib.parse
+from datetime import datetime
+
+from gallery_listing import GALLERY_PREFIX, gallery_path_of
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CSV_SCHEMA = 'Bucket, Key, Size, LastModifiedDate, ETag'
+# Parquet inventories use snake_case column names
+PARQUET_COLUMNS = {
+    'bucket': 'Bucket',
+    'key': 'Key',
+    'size': 'Size',
+    'last_modified_date': 'LastModifiedDate',
+    'e_tag': 'ETag',
+    'is_latest': 'IsLatest',
+    'is_delete_marker': 'IsDeleteMarker',
+}
+
+
+class InventoryError(Exception):
+    """Raised when an inventory report is missing, malformed or not ordered as expected"""
+
+
+def parse_s3_uri(uri):
+    """Split s3://bucket/key into (bucket, key)"""
+    parsed = urllib.parse.urlparse(uri)
+    if parsed.scheme != 's3' or not parsed.netloc:
+        raise InventoryError(f"Not an s3:// URI: {uri}")
+    return parsed.netloc, parsed.path.lstrip('/')
+
+
+class InventoryReport:
+    """
+    Manifest of one inventory report and access to its data files, on S3 or on local disk
+    """
+
+    def __init__(self, source, s3_client=None):
+        self.source = source
+        self.s3_client = s3_client
+        self.is_s3 = source.startswith('s3://')
+        if self.is_s3:
+            if s3_client is None:
+                raise InventoryError("An S3 client is needed to read an inventory from S3")
+            bucket, key = parse_s3_uri(source)
+            body = s3_client.get_object(Bucket=bucket, Key=key)['Body'].read()
+            self.manifest = json.loads(body)
+            self.bucket = bucket
+        else:
+            self.manifest = self._load_local_manifest(source)
+            self.bucket = None
+        self.file_format = (self.manifest.get('fileFormat') or 'CSV').upper()
+        if self.file_format not in ('CSV', 'PARQUET'):
+            raise InventoryError(f"Unsupported inventory format: {self.file_format}")
+        self.schema = [name.strip() for name in (self.manifest.get('fileSchema') or DEFAULT_CSV_SCHEMA).split(',')]
+        self.source_bucket = self.manifest.get('sourceBucket')
+
+    @staticmethod
+    def _load_local_manifest(directory):
+        manifest_path = directory if directory.endswith('.json') else os.path.join(directory, 'manifest.json')
+        if os.path.isfile(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        if not os.path.isdir(directory):
+            raise InventoryError(f"Inventory directory not found: {directory}")
+        # No manifest: treat every data file in the directory as part of the report
+        names = sorted(name for name in os.listdir(directory)
+                       if name.endswith(('.csv', '.csv.gz', '.parquet')))
+        if not names:
+            raise InventoryError(f"No inventory data files in {directory}")
+        file_format = 'PARQUET' if all(name.endswith('.parquet') for name in names) else 'CSV'
+        return {'fileFormat': file_format, 'files': [{'key': name} for name in names]}
+
+    @property
+    def data_files(self):
+        return [entry['key'] for entry in self.manifest.get('files', [])]
+
+    def _local_path(self, key):
+        base = self.source if os.path.isdir(self.source) else os.path.dirname(self.source)
+        for candidate in (os.path.join(base, key),
+                          os.path.join(base, 'data', os.path.basename(key)),
+                          os.path.join(base, os.path.basename(key))):
+            if os.path.isfile(candidate):
+                return candidate
+        raise InventoryError(f"Inventory data file not found locally: {key}")
+
+    def _destination_bucket(self):
+        destination = self.manifest.get('destinationBucket') or self.bucket
+        return destination.split(':::')[-1]
+
+    def open_binary(self, key):
+        """Open a data file as a binary stream"""
+        if self.is_s3:
+            return self.s3_client.get_object(Bucket=self._destination_bucket(), Key=key)['Body']
+        return open(self._local_path(key), 'rb')
+
+    def iter_rows(self, key):
+        """Yield the rows of one data file as dicts keyed by the CSV schema names"""
+        if self.file_format == 'PARQUET':
+            yield from self._iter_parquet_rows(key)
+        else:
+            yield from self._iter_csv_rows(key)
+
+    def _iter_csv_rows(self, key):
+        stream = self.open_binary(key)
+        try:
+            raw = gzip.GzipFile(fileobj=stream) if key.endswith('.gz') else stream
+            for values in csv.reader(io.TextIOWrapper(raw, encoding='utf-8', newline='')):
+                row = dict(zip(self.schema, values))
+                # CSV inventories URL-encode object keys
+                if 'Key' in row:
+                    row['Key'] = urllib.parse.unquote_plus(row['Key'])
+                yield row
+        finally:
+            stream.close()
+
+    def _iter_parquet_rows(self, key):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise InventoryError("Reading Parquet inventories requires pyarrow")
+        # Parquet needs random access; S3 data files are spooled to /tmp first
+        with tempfile.TemporaryFile() if self.is_s3 else open(self._local_path(key), 'rb') as f:
+            if self.is_s3:
+                self.s3_client.download_fileobj(self._destination_bucket(), key, f)
+                f.seek(0)
+            parquet = pq.ParquetFile(f)
+            columns = [name for name in parquet.schema_arrow.names if name in PARQUET_COLUMNS]
+            for batch in parquet.iter_batches(columns=columns):
+                for record in batch.to_pylist():
+                    yield {PARQUET_COLUMNS[name]: value for name, value in record.items()}
+
+
+def _parse_timestamp(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return value
+
+
+def _is_current(row):
+    """Skip delete markers and non-current versions of versioned inventories"""
+    if str(row.get('IsDeleteMarker', 'false')).lower() == 'true':
+        return False
+    return str(row.get('IsLatest', 'true')).lower() != 'false'
+
+
+def row_to_object(row):
+    """Convert an inventory row to the dict shape of a list_objects_v2 entry"""
+    size = row.get('Size')
+    etag = row.get('ETag') or ''
+    return {
+        'Key': row['Key'],
+        'Size': int(size) if size not in (None, '') else 0,
+        'LastModified': _parse_timestamp(row.get('LastModifiedDate')),
+        'ETag': etag if etag.startswith('"') else f'"{etag}"'
+    }
+
+
+def _iter_file_objects(report, data_key, prefix):
+    """Objects of one data file under prefix, checking that gallery folders come out in order"""
+    previous_path = None
+    for row in report.iter_rows(data_key):
+        if not row.get('Key', '').startswith(prefix) or not _is_current(row):
+            continue
+        if report.source_bucket and row.get('Bucket') and row['Bucket'] != report.source_bucket:
+            continue
+        path = gallery_path_of(row['Key'])
+        if path is None:
+            continue
+        if previous_path is not None and path < previous_path:
+            raise InventoryError(f"Inventory data file {data_key} is not ordered by key "
+                                 f"({path} after {previous_path})")
+        previous_path = path
+        yield row_to_object(row)
+
+
+def iter_inventory_objects(source, s3_client=None, prefix=GALLERY_PREFIX):
+    """
+    Stream the gallery objects of an inventory report in gallery-folder order, ready for
+    gallery_listing.iter_gallery_runs
+    """
+    report = InventoryReport(source, s3_client=s3_client)
+    logger.info(f"Reading {report.file_format} inventory {source}: {len(report.data_files)} data files")
+    streams = [_iter_file_objects(report, data_key, prefix) for data_key in report.data_files]
+    return heapq.merge(*streams, key=lambda obj: gallery_path_of(obj['Key']))
@@ -0,0 +1,117 @@
+"""
+Behaviour checks of the S3 -> DynamoDB sync against the in-memory AWS fakes.
+
+Each check builds a small handler_benchmark catalog, drives lambda_handler with
+API Gateway events and asserts on the resulting tables, the way call_budgets.py
+asserts on AWS calls. It needs no AWS account and exits non-zero when any check
+fails, so it can gate CI next to the call budgets:
+
+    python sync_checks.py [--galleries 8] [--photos 80] [--only missing_gallery_retried] [--json]
+"""
+import argparse
+import json
+import os
+import sys
+import uuid
+
+import handler_benchmark
+from handler_benchmark import BUCKET, FakeContext, _event, _jpeg
+
+
+class CheckFailed(AssertionError):
+    """A sync check saw the wrong result"""
+
+
+def _expect(condition, message):
+    if not condition:
+        raise CheckFailed(message)
+
+
+def _sync_photos(module):
+    response = module.lambda_handler(_event('POST', {'action': 'update_GalleryPhotos', 'mode': 'incremental'}),
+                                     FakeContext())
+    _expect(response['statusCode'] == 200, f"incremental photo sync returned {response['statusCode']}")
+    return json.loads(response['body'])
+
+
+def check_missing_gallery_retried(module, fake, catalog):
+    """A folder synced before its gallery record exists is imported by the next run"""
+    t_galleries = fake.dynamodb.tables[os.getenv('GALLERIES_TABLE', 'Galleries')]
+    t_photos = fake.dynamodb.tables[os.getenv('GALLERY_PHOTOS_TABLE', 'GalleryPhotos')]
+    gallery_id, photo_id = str(uuid.uuid4()), str(uuid.uuid4())
+    prefix = f"gallery-data/{gallery_id}/"
+    fake.s3.put(BUCKET, f"{prefix}{photo_id}.jpg", _jpeg(64, 48), 'image/jpeg')
+    fake.s3.put(BUCKET, f"{prefix}thumbnails/{photo_id}.jpg", _jpeg(32, 24, seed=1), 'image/jpeg')
+
+    first = _sync_photos(module)
+    _expect(first.get('galleries_missing') == 1, f"first run: galleries_missing {first.get('galleries_missing')}")
+    _expect(not t_photos.partition(None, gallery_id), 'first run wrote photos of a missing gallery')
+
+    t_galleries.put({'galleryId': gallery_id, 'name': 'Late gallery', 'continent': 'Europe', 'country': 'Iceland',
+                     'storageLayout': 'id', 's3Prefix': prefix, 'photoCount': 0,
+                     'createdAt': '2024-06-02T00:00:00Z', 'updatedAt': '2024-06-02T00:00:00Z'})
+    second = _sync_photos(module)
+    _expect(not second.get('galleries_missing'), f"second run: galleries_missing {second.get('galleries_missing')}")
+    _expect(len(t_photos.partition(None, gallery_id)) == 1,
+            f"second run: {len(t_photos.partition(None, gallery_id))} photos imported, expected 1")
+
+
+def check_id_layout_photo_ids(module, fake, catalog):
+    """A synced ID-layout original gets the photoId its key names, so it never duplicates the upload's record"""
+    t_photos = fake.dynamodb.tables[os.getenv('GALLERY_PHOTOS_TABLE', 'GalleryPhotos')]
+    target = catalog['id_layout']
+    photo_id = str(uuid.uuid4())
+    fake.s3.put(BUCKET, f"{target['prefix']}{photo_id}.jpg", _jpeg(64, 48), 'image/jpeg')
+    fake.s3.put(BUCKET, f"{target['prefix']}thumbnails/{photo_id}.jpg", _jpeg(32, 24, seed=1), 'image/jpeg')
+
+    _sync_photos(module)
+    created = [item for item in t_photos.partition(None, target['galleryId'])
+               if item['s3Key'] == f"{target['prefix']}{photo_id}.jpg"]
+    _expect([item['photoId'] for item in created] == [photo_id],
+            f"records of the new object: {[item['photoId'] for item in created]}, expected [{photo_id}]")
+
+
+CHECKS = {
+    'missing_gallery_retried': check_missing_gallery_retried,
+    'id_layout_photo_ids': check_id_layout_photo_ids,
+}
+
+
+def run(galleries=8, photos=80, only=None):
+    """{check name: None when it passed, else the failure message}; the store is reset before every check"""
+    module, fake, catalog = handler_benchmark.setup(galleries, photos)
+    snapshot = fake.snapshot()
+    results = {}
+    for name, check in CHECKS.items():
+        if only and name not in only:
+            continue
+        fake.restore(snapshot)
+        try:
+            check(module, fake, catalog)
+            results[name] = None
+        except CheckFailed as e:
+            results[name] = str(e)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--galleries', type=int, default=8)
+    parser.add_argument('--photos', type=int, default=80)
+    parser.add_argument('--only', default='', help=f"comma-separated checks ({', '.join(CHECKS)})")
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    results = run(args.galleries, args.photos, set(filter(None, args.only.split(','))) or None)
+    failed = [name for name, failure in results.items() if failure]
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name, failure in results.items():
+            print(f"{name:<28} {'FAILED' if failure else 'ok'}" + (f"  {failure}" if failure else ''))
+        print(f"{len(results) - len(failed)} of {len(results)} checks passed")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,19 +1,20 @@
 import json
-import boto3
 import uuid
 from datetime import datetime
 from botocore.exceptions import ClientError
 import logging
 import os
 import re
+import aws_clients
+import log_redaction
+from log_redaction import summary, verbose, mask_email
 
 # Configure logging
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+logger = log_redaction.configure(logging.getLogger())
 logger.info("==== User Lambda START ====")
 
-# Initialize DynamoDB
-dynamodb = boto3.resource('dynamodb')
+# Initialize DynamoDB (shared, tuned client reused across warm invocations; aws_clients.py)
+dynamodb = aws_clients.resource('dynamodb')
 SUBSCRIPTIONS_TABLE_NAME = os.getenv('SUBSCRIPTIONS_TABLE', 'Subscriptions')
 tbl_subscriptions = dynamodb.Table(SUBSCRIPTIONS_TABLE_NAME)
 
@@ -21,7 +22,8 @@ def lambda_handler(event, context):
     """
     Main Lambda handler for user-facing operations
     """
-    logger.info(f"Received event: {event}")
+    log_redaction.start_request()
+    verbose(logger, "Received event: %s", summary(event))
     
     # Parse the HTTP method and path
     http_method = event.get('httpMethod', 'GET')
@@ -35,8 +37,8 @@ def lambda_handler(event, context):
     # Parse query parameters
     query_params = event.get('queryStringParameters') or {}
     
-    logger.info(f"Body: {body}")
-    logger.info(f"Query params: {query_params}")
+    verbose(logger, "Body: %s", summary(body))
+    logger.info("Query params: %s", summary(query_params))
     
     # CORS preflight support
     if http_method == 'OPTIONS':
@@ -53,7 +55,7 @@ def subscribe_user(subscription_data):
     Subscribe a user to receive notifications when new galleries are added
     """
     try:
-        logger.info(f"Processing subscription request: {subscription_data}")
+        logger.info("Processing subscription request: %s", summary(subscription_data))
         
         # Validate required fields
         if 'email' not in subscription_data:
@@ -83,14 +85,14 @@ def subscribe_user(subscription_data):
                             ':now': current_time
                         }
                     )
-                    logger.info(f"Reactivated subscription for {email}")
+                    logger.info(f"Reactivated subscription for {mask_email(email)}")
                     return create_response(200, {
                         'message': 'Subscription reactivated successfully',
                         'email': email,
                         'status': 'active'
                     })
                 else:
-                    logger.info(f"User {email} is already subscribed")
+                    logger.info(f"User {mask_email(email)} is already subscribed")
                     return create_response(200, {
                         'message': 'You are already subscribed',
                         'email': email,
@@ -106,7 +108,7 @@ def subscribe_user(subscription_data):
                 }
                 
                 tbl_subscriptions.put_item(Item=subscription_item)
-                logger.info(f"Created new subscription for {email}")
+                logger.info(f"Created new subscription for {mask_email(email)}")
                 
                 return create_response(201, {
                     'message': 'Successfully subscribed! You will receive notifications when new galleries are added.',
@@ -115,7 +117,7 @@ def subscribe_user(subscription_data):
                 })
                 
         except Exception as e:
-            logger.error(f"Error processing subscription for {email}: {str(e)}")
+            logger.error(f"Error processing subscription for {mask_email(email)}: {str(e)}")
             return create_response(500, {'error': 'Failed to process subscription', 'details': str(e)})
             
     except Exception as e:
@@ -0,0 +1,23 @@
+"""
+Thread pools that carry the submitting request's context.
+
+request_metrics, call_tracing and log_redaction keep the request being
+observed in contextvars, so requests handled concurrently in one process
+(replay_events.py, threaded tests) never see each other's metrics, trace or
+log sampling. A new thread starts with an empty context, so work handed to a
+plain ThreadPoolExecutor would run outside the request and its AWS calls would
+go uncounted and untraced. ContextThreadPoolExecutor runs every submitted
+callable in a copy of the submitter's context instead.
+
+Threads started by libraries on their own (the part threads of an s3transfer
+multipart copy) are not covered.
+"""
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor whose tasks run in a copy of the context they were submitted from"""
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
@@ -484,6 +484,8 @@ class GalleryPageApp {
     // Rating system methods
     async ratePhoto(photoId, rating) {
         console.log('ratePhoto called with photoId:', photoId, 'rating:', rating);
+        // Naming the gallery lets the server check the photo with a keyed read
+        const photo = this.currentGalleryPhotos.find(p => (p.photoId || p.id) === photoId);
         try {
             const response = await fetch(`${API_BASE_URL}/galleries?action=rate_photo`, {
                 method: 'POST',
@@ -492,6 +494,7 @@ class GalleryPageApp {
                 },
                 body: JSON.stringify({
                     photoId: photoId,
+                    galleryId: photo ? photo.galleryId : undefined,
                     deviceId: this.deviceId,
                     rating: rating
                 })
@@ -1,11 +1,19 @@
 // Gallery data - will be loaded from API
+// Every gallery, loaded when the map comes into view; the grid fetches filtered pages instead
 let galleries = [];
 
+const API_BASE_URL = 'https://5nuxhstp12.execute-api.eu-north-1.amazonaws.com/prod';
+
 // Main Application Class
 class PhotoGalleryApp {
     constructor() {
         this.currentFilteredGalleries = [];
         this.galleryMap = null;
+        this.facets = { years: [], continents: [], total: 0 };
+        this.filters = { year: '', continent: '' };
+        this.nextPageToken = null; // continuationToken of the next server page
+        this.totalFiltered = 0;
+        this.pageRequest = 0; // Lets a newer filter request supersede an older one
         this.currentDisplayCount = 10; // Initial display count
         this.itemsPerLoad = 10; // Items per load
         
@@ -24,11 +32,9 @@ class PhotoGalleryApp {
     async init() {
         console.log('Starting application initialization...');
         
-        // Load galleries from API
-        await this.loadGalleriesFromAPI();
-        
-        this.currentFilteredGalleries = [...galleries];
-        console.log('Initialized with galleries:', galleries.length, 'Filtered:', this.currentFilteredGalleries.length);
+        // Load the filter options and the first page of galleries from the API
+        await Promise.all([this.loadFacetsFromAPI(), this.fetchGalleryPage(true)]);
+        console.log('Initialized with galleries:', this.currentFilteredGalleries.length, 'of', this.totalFiltered);
         
         this.loadGalleries();
         this.setupFilters();
@@ -36,10 +42,8 @@ class PhotoGalleryApp {
         this.setupSmoothScrolling();
         this.setupSubscribeModal();
         
-        // Initialize map immediately if galleries exist
-        if (galleries.length > 0) {
-            this.initMap();
-        }
+        // Load every gallery for the map once the map section comes into view
+        this.setupLazyMap();
         
         // Add scroll event listeners
         window.addEventListener('scroll', () => {
@@ -59,29 +63,79 @@ class PhotoGalleryApp {
         this.setupLoadMoreButton();
     }
 
-    async loadGalleriesFromAPI() {
+    async loadFacetsFromAPI() {
         try {
-            console.log('Loading galleries from API...');
+            const response = await fetch(`${API_BASE_URL}/galleries?action=gallery_facets`);
+            
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+            }
+            
+            this.facets = await response.json();
+            console.log('Loaded gallery filters:', this.facets.years.length, 'years,', this.facets.continents.length, 'continents');
+            return true;
             
-            const API_BASE_URL = 'https://5nuxhstp12.execute-api.eu-north-1.amazonaws.com/prod';
-            const response = await fetch(`${API_BASE_URL}/galleries`);
+        } catch (error) {
+            console.error('Error loading gallery filters from API:', error);
+            this.facets = { years: [], continents: [], total: 0 };
+            return false;
+        }
+    }
+
+    async fetchGalleryPage(reset = false, limit = this.getInitialDisplayCount()) {
+        // The server filters by year and continent and returns one page in sort order
+        const request = ++this.pageRequest;
+        const params = new URLSearchParams({ limit: String(limit) });
+        if (this.filters.year) params.set('year', this.filters.year);
+        if (this.filters.continent) params.set('continent', this.filters.continent);
+        if (!reset && this.nextPageToken) params.set('continuationToken', this.nextPageToken);
+        
+        try {
+            const response = await fetch(`${API_BASE_URL}/galleries?${params}`);
             
             if (!response.ok) {
                 throw new Error(`HTTP ${response.status}: ${response.statusText}`);
             }
             
             const data = await response.json();
-            galleries = data.galleries || [];
+            if (request !== this.pageRequest) {
+                return null; // Superseded by a newer request
+            }
+            const page = data.galleries || [];
+            this.currentFilteredGalleries = reset ? page : this.currentFilteredGalleries.concat(page);
+            this.nextPageToken = data.continuationToken || null;
+            // Unfiltered pages leave the total to the facets
+            this.totalFiltered = data.total != null ? data.total : (this.facets.total || this.currentFilteredGalleries.length);
+            console.log('Loaded gallery page:', page.length, 'Loaded:', this.currentFilteredGalleries.length, 'of', this.totalFiltered);
+            return true;
             
-            // Sort galleries by sort order if available
-            if (galleries.length > 0) {
-                galleries.sort((a, b) => {
-                    const orderA = a.sortOrder || Number.MAX_SAFE_INTEGER;
-                    const orderB = b.sortOrder || Number.MAX_SAFE_INTEGER;
-                    return orderA - orderB;
-                });
-                console.log('Galleries sorted by sort order');
+        } catch (error) {
+            console.error('Error loading galleries from API:', error);
+            if (request !== this.pageRequest) {
+                return null;
+            }
+            if (reset) {
+                this.currentFilteredGalleries = [];
+                this.nextPageToken = null;
+                this.totalFiltered = 0;
             }
+            return false;
+        }
+    }
+
+    async loadAllGalleries() {
+        try {
+            console.log('Loading galleries from API...');
+            
+            // Only what the map shows, already in sort order
+            const response = await fetch(`${API_BASE_URL}/galleries?action=gallery_map`);
+            
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+            }
+            
+            const data = await response.json();
+            galleries = data.galleries || [];
             
             console.log('Successfully loaded galleries from API:', galleries.length);
             return true;
@@ -146,22 +200,30 @@ class PhotoGalleryApp {
     }
     
     updateLoadMoreButton() {
-        if (this.currentDisplayCount >= this.currentFilteredGalleries.length) {
+        if (this.currentDisplayCount >= this.currentFilteredGalleries.length && !this.nextPageToken) {
             this.galleryLoadMore.style.display = 'none';
         } else {
             this.galleryLoadMore.style.display = 'block';
         }
     }
     
-    loadMoreGalleries() {
+    async loadMoreGalleries() {
         // Add loading state
         this.loadMoreBtn.classList.add('loading');
         this.loadMoreBtn.innerHTML = '<i class="fas fa-spinner"></i><span>Loading...</span>';
         
-        // Simulate loading delay to show loading effect
-        setTimeout(() => {
+        try {
             const previousCount = this.currentDisplayCount;
-            this.currentDisplayCount += this.getItemsPerLoad();
+            const targetCount = previousCount + this.getItemsPerLoad();
+            
+            // Fetch the next page from the server once the loaded galleries run out
+            if (targetCount > this.currentFilteredGalleries.length && this.nextPageToken) {
+                const loaded = await this.fetchGalleryPage(false, targetCount - this.currentFilteredGalleries.length);
+                if (loaded === null) {
+                    return; // The filter changed meanwhile; its own render replaces this one
+                }
+            }
+            this.currentDisplayCount = targetCount;
             
             // Only add new galleries
             const newGalleries = this.currentFilteredGalleries.slice(previousCount, this.currentDisplayCount);
@@ -173,11 +235,11 @@ class PhotoGalleryApp {
             });
             
             this.updateLoadMoreButton();
-            
-            // Remove loading state
+        } finally {
+            // Remove loading state, also when the page was superseded or failed
             this.loadMoreBtn.classList.remove('loading');
             this.loadMoreBtn.innerHTML = '<i class="fas fa-arrow-down"></i><span>Load More</span>';
-        }, 300);
+        }
     }
     
     setupLoadMoreButton() {
@@ -368,21 +430,8 @@ class PhotoGalleryApp {
         this.yearFilter.innerHTML = '<option value="">All Years</option>';
         this.locationFilter.innerHTML = '<option value="">All Locations</option>';
         
-        // Populate year filter from years array
-        const allYears = [];
-        galleries.forEach(gallery => {
-            if (gallery.years && Array.isArray(gallery.years) && gallery.years.length > 0) {
-                gallery.years.forEach(year => {
-                    allYears.push(parseInt(year));
-                });
-            } else {
-                const fallbackYear = new Date(gallery.createdAt).getFullYear();
-                allYears.push(fallbackYear);
-            }
-        });
-        
-        // Remove duplicates and sort in descending order
-        const years = [...new Set(allYears)].sort((a, b) => b - a);
+        // Populate year filter from the server's facets (newest first)
+        const years = this.facets.years.map(entry => parseInt(entry.year));
         
         console.log('Available years for filter:', years);
         years.forEach(year => {
@@ -393,7 +442,7 @@ class PhotoGalleryApp {
         });
         
         // Populate location filter with continents
-        const locations = [...new Set(galleries.map(gallery => gallery.continent || gallery.country || 'Unknown'))].sort();
+        const locations = this.facets.continents.map(entry => entry.continent);
         console.log('Available locations for filter:', locations);
         locations.forEach(location => {
             const option = document.createElement('option');
@@ -416,45 +465,16 @@ class PhotoGalleryApp {
     clearFilters() {
         this.yearFilter.value = '';
         this.locationFilter.value = '';
-        this.currentFilteredGalleries = [...galleries];
-        
-        // Maintain sort order after clearing filters
-        this.currentFilteredGalleries.sort((a, b) => {
-            const orderA = a.sortOrder || Number.MAX_SAFE_INTEGER;
-            const orderB = b.sortOrder || Number.MAX_SAFE_INTEGER;
-            return orderA - orderB;
-        });
-        
-        this.loadGalleries();
+        this.filterGalleries();
     }
 
-    filterGalleries() {
-        const selectedYear = this.yearFilter.value;
-        const selectedLocation = this.locationFilter.value;
-        
-        this.currentFilteredGalleries = galleries.filter(gallery => {
-            // Check year from years array
-            let yearMatch = !selectedYear;
-            if (selectedYear) {
-                if (gallery.years && Array.isArray(gallery.years) && gallery.years.length > 0) {
-                    yearMatch = gallery.years.includes(selectedYear.toString());
-                } else {
-                    yearMatch = new Date(gallery.createdAt).getFullYear() == selectedYear;
-                }
-            }
-            
-            const locationMatch = !selectedLocation || (gallery.continent || gallery.country || 'Unknown') === selectedLocation;
-            return yearMatch && locationMatch;
-        });
-        
-        // Maintain sort order after filtering
-        this.currentFilteredGalleries.sort((a, b) => {
-            const orderA = a.sortOrder || Number.MAX_SAFE_INTEGER;
-            const orderB = b.sortOrder || Number.MAX_SAFE_INTEGER;
-            return orderA - orderB;
-        });
-        
-        this.loadGalleries();
+    async filterGalleries() {
+        // The server returns the first page of matching galleries, already in sort order
+        this.filters = { year: this.yearFilter.value, continent: this.locationFilter.value };
+        const loaded = await this.fetchGalleryPage(true);
+        if (loaded !== null) {
+            this.loadGalleries();
+        }
     }
 
     setupNavigation() {
@@ -529,6 +549,27 @@ class PhotoGalleryApp {
         }
     }
 
+    setupLazyMap() {
+        const mapSection = document.querySelector('.map-section');
+        const start = async () => {
+            if (await this.loadAllGalleries() && galleries.length > 0) {
+                this.initMap();
+            }
+        };
+        
+        if (!mapSection || !('IntersectionObserver' in window)) {
+            start();
+            return;
+        }
+        const observer = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                observer.disconnect();
+                start();
+            }
+        }, { rootMargin: '400px 0px' });
+        observer.observe(mapSection);
+    }
+
     initMap() {
         if (!this.galleryMap) {
             this.galleryMap = new GalleryMap({